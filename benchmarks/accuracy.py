@@ -0,0 +1,262 @@
+"""Accuracy against the ground-truth CSVs versus speed, over a sweep of pipeline settings.
+
+Run from the repository root:
+
+    python -m benchmarks.accuracy [--dpi 200 300 400] [--psm 4 6] [--segmentation blocks columns]
+                                  [--batching threads sequential] [--output accuracy.json]
+
+Every combination of the settings OCRs the PDFs of resources/test-entries/pdfs, parses them and scores the rows
+against resources/test-entries/csvs, column by column:
+
+    exact  the share of fields equal to the ground truth, ignoring surrounding spaces
+    fuzzy  the share at least 90% similar to it, so one misread letter in a long title still counts
+
+Each expected row is scored against the parsed row most like it by code and title, a row the parser missed scores
+nothing. The settings are:
+
+    dpi           the resolution pages are rasterized at, the segmentation kernel scales with it
+    psm           Tesseract's page segmentation mode
+    segmentation  blocks: the text blocks the pipeline finds, columns: each whole column, laid out by Tesseract
+    batching      threads: the pages of a PDF OCR'd at once, sequential: one after another
+
+The table lists every combination by runtime, a * marks those no other one beats on both runtime and fuzzy
+accuracy. The scores of every column are stored with the runtimes as JSON.
+"""
+import argparse
+import copy
+import glob
+import json
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from difflib import SequenceMatcher
+from itertools import product
+
+from benchmarks.corpus import load_expected_rows
+from src.core.image_processor import ImageProcessor
+from src.core.results import RegionResult
+from src.ocr import OCRProcessorNoGUI, ocr_pdf_page
+from src.utils.config import set_tesseract_path
+from src.utils.ocr_utils import columns, iter_parsed, year_from_filename
+from src.utils.profiles import get_profile
+
+PDF_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "resources", "test-entries", "pdfs")
+SCORED_COLUMNS = [column for column in columns if column != "year"]
+SEGMENTATIONS = ("blocks", "columns")
+BATCHING = ("threads", "sequential")
+FUZZY_SIMILARITY = 0.9
+MATCH_SIMILARITY = 0.5
+
+
+def similarity(a, b):
+    a, b = a.strip(), b.strip()
+    if a == b:
+        return 1.0
+    return SequenceMatcher(None, a, b, autojunk=False).ratio()
+
+
+def row_key(row):
+    return f"{row.get('code', '')} {row.get('title', '')}"
+
+
+def align_rows(expected, parsed):
+    """Pairs every expected row with the parsed row most like it by code and title, each parsed row used once.
+
+    :return: A list with, for every expected row, its parsed row or None, and the number of parsed rows left over.
+    """
+    unused = list(range(len(parsed)))
+    pairs = []
+    for row in expected:
+        best, best_similarity = None, MATCH_SIMILARITY
+        for i in unused:
+            row_similarity = similarity(row_key(row), row_key(parsed[i]))
+            if row_similarity > best_similarity:
+                best, best_similarity = i, row_similarity
+        if best is not None:
+            unused.remove(best)
+        pairs.append(parsed[best] if best is not None else None)
+    return pairs, len(unused)
+
+
+class Score:
+    """Counts the fields of every column that came out right."""
+
+    __slots__ = ("fields", "exact", "fuzzy", "rows", "missed_rows", "extra_rows")
+
+    def __init__(self):
+        self.fields = dict.fromkeys(SCORED_COLUMNS, 0)
+        self.exact = dict.fromkeys(SCORED_COLUMNS, 0)
+        self.fuzzy = dict.fromkeys(SCORED_COLUMNS, 0)
+        self.rows = 0
+        self.missed_rows = 0
+        self.extra_rows = 0
+
+    def add(self, expected, parsed):
+        """Scores the rows parsed from a file against its expected rows.
+
+        A field counts when the ground truth or the parsed row has a value for it, so values made up for empty
+        fields count against the score too.
+        """
+        pairs, extra_rows = align_rows(expected, parsed)
+        self.rows += len(expected)
+        self.extra_rows += extra_rows
+        for truth, row in zip(expected, pairs):
+            if row is None:
+                self.missed_rows += 1
+            for column in SCORED_COLUMNS:
+                want = (truth.get(column) or "").strip()
+                got = (row.get(column) or "").strip() if row is not None else ""
+                if not want and (row is None or not got):
+                    continue
+                self.fields[column] += 1
+                if row is None:
+                    continue
+                field_similarity = similarity(want, got)
+                self.exact[column] += field_similarity == 1.0
+                self.fuzzy[column] += field_similarity >= FUZZY_SIMILARITY
+
+    def accuracy(self, counts, column=None):
+        total = self.fields[column] if column else sum(self.fields.values())
+        right = counts[column] if column else sum(counts.values())
+        return right / total if total else 0.0
+
+    def to_dict(self):
+        return {
+            "rows": self.rows,
+            "missed_rows": self.missed_rows,
+            "extra_rows": self.extra_rows,
+            "exact": round(self.accuracy(self.exact), 4),
+            "fuzzy": round(self.accuracy(self.fuzzy), 4),
+            "columns": {
+                column: {
+                    "fields": self.fields[column],
+                    "exact": round(self.accuracy(self.exact, column), 4),
+                    "fuzzy": round(self.accuracy(self.fuzzy, column), 4),
+                }
+                for column in SCORED_COLUMNS
+            },
+        }
+
+
+def make_profile(dpi, psm, batching, base="balanced"):
+    """Derives a profile from base with another DPI and psm, its kernel and minimum height scaled to the DPI."""
+    profile = copy.copy(get_profile(base))
+    scale = dpi / profile.dpi
+    profile.name = f"{base}-{dpi}dpi-psm{psm}"
+    profile.dpi = dpi
+    profile.psm = psm
+    profile.kernel = tuple(max(1, round(size * scale)) for size in profile.kernel)
+    profile.min_height = max(1, round(profile.min_height * scale))
+    profile.max_workers = profile.max_workers if batching == "threads" else 1
+    profile._tess_config = None
+    return profile
+
+
+def ocr_columns(pdf_path, page_number, split, profile):
+    """OCRs each column of a page whole, leaving the layout to Tesseract's own segmentation."""
+    image = ImageProcessor.rasterize_page(pdf_path, page_number, dpi=profile.dpi)
+    processor = ImageProcessor(image, split=split, profile=profile)
+    halves = processor.split_page() if split else (image,)
+    regions = []
+    x_offset = 0
+    for column, half in enumerate(halves):
+        text, confidence = processor.ocr_region(half)
+        height, width = half.shape[:2]
+        regions.append(RegionResult(text, page_number, column, (x_offset, 0, width, height), confidence))
+        x_offset += width
+    return regions
+
+
+def evaluate(pdf_paths, expected, profile, segmentation):
+    """OCRs, parses and scores every PDF with one combination of settings.
+
+    :param expected: The ground-truth rows of every PDF, by file name without the extension.
+    :return: The Score, and the seconds and pages OCR'd.
+    """
+    ocr_page = ocr_pdf_page if segmentation == "blocks" else ocr_columns
+    no_split = OCRProcessorNoGUI(profile=profile).test_images_no_split
+    score = Score()
+    seconds = 0.0
+    pages = 0
+    for pdf_path in pdf_paths:
+        name = os.path.splitext(os.path.basename(pdf_path))[0]
+        split = os.path.basename(pdf_path) not in no_split
+        start = time.perf_counter()
+        page_count = ImageProcessor.count_pages(pdf_path)
+        with ThreadPoolExecutor(max_workers=profile.max_workers) as executor:
+            page_regions = list(executor.map(
+                lambda page_number: ocr_page(pdf_path, page_number, split, profile), range(1, page_count + 1)
+            ))
+        regions = [region for page in page_regions for region in page]
+        parsed = [row for row, _ in iter_parsed(regions, year_from_filename(pdf_path))]
+        seconds += time.perf_counter() - start
+        pages += page_count
+        score.add(expected.get(name, []), parsed)
+    return score, seconds, pages
+
+
+def pareto(results, cost="seconds", value="fuzzy"):
+    """:return: The indexes of the results no other one beats on both cost and value, ties included."""
+    front = []
+    for i, result in enumerate(results):
+        dominated = any(
+            other[cost] <= result[cost] and other[value] >= result[value]
+            and (other[cost] < result[cost] or other[value] > result[value])
+            for other in results
+        )
+        if not dominated:
+            front.append(i)
+    return front
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pdfs", default=PDF_DIR, help="The directory of PDFs to run. Default: the bundled ones.")
+    parser.add_argument("--dpi", type=int, nargs="+", default=[200, 300, 400], help="The DPIs to try.")
+    parser.add_argument("--psm", type=int, nargs="+", default=[6], help="The page segmentation modes to try.")
+    parser.add_argument("--segmentation", nargs="+", choices=SEGMENTATIONS, default=["blocks"],
+                        help="The segmentation to try.")
+    parser.add_argument("--batching", nargs="+", choices=BATCHING, default=["threads"], help="The batching to try.")
+    parser.add_argument("--output", default="accuracy.json", help="Where to store the scores and runtimes.")
+    args = parser.parse_args(argv)
+    logging.getLogger("profiles").setLevel(logging.ERROR)
+
+    expected = {os.path.splitext(name)[0]: rows for name, _, rows in load_expected_rows()}
+    pdf_paths = [path for path in sorted(glob.glob(os.path.join(args.pdfs, "*.pdf")))
+                 if os.path.splitext(os.path.basename(path))[0] in expected]
+    if not pdf_paths:
+        print(f"No PDF files with ground truth in {args.pdfs}", file=sys.stderr)
+        return 2
+    set_tesseract_path()
+
+    results = []
+    for dpi, psm, segmentation, batching in product(args.dpi, args.psm, args.segmentation, args.batching):
+        score, seconds, pages = evaluate(pdf_paths, expected, make_profile(dpi, psm, batching), segmentation)
+        results.append({
+            "dpi": dpi, "psm": psm, "segmentation": segmentation, "batching": batching,
+            "seconds": round(seconds, 3), "pages_per_second": round(pages / seconds, 3) if seconds else None,
+            **score.to_dict(),
+        })
+        print(f"{dpi}dpi psm {psm} {segmentation} {batching}: {results[-1]['fuzzy']:.1%} fuzzy in {seconds:.1f}s",
+              file=sys.stderr)
+
+    front = set(pareto(results))
+    print(f"  {'dpi':>4} {'psm':>4} {'segmentation':<13} {'batching':<11} {'seconds':>8} {'pages/s':>8} "
+          f"{'exact':>7} {'fuzzy':>7} {'missed':>7}")
+    for i in sorted(range(len(results)), key=lambda i: results[i]["seconds"]):
+        result = results[i]
+        print(f"{'*' if i in front else ' '} {result['dpi']:>4} {result['psm']:>4} {result['segmentation']:<13} "
+              f"{result['batching']:<11} {result['seconds']:>8.1f} {result['pages_per_second'] or 0:>8.2f} "
+              f"{result['exact']:>7.1%} {result['fuzzy']:>7.1%} {result['missed_rows']:>7}")
+    for i, result in enumerate(results):
+        result["pareto"] = i in front
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump({"pdfs": [os.path.basename(path) for path in pdf_paths], "results": results}, f, indent=2)
+    print(f"Results stored in {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,153 @@
+"""Builds directory-style entry text from the ground-truth CSVs in resources/test-entries.
+
+The real input to the parser is Tesseract output, which needs the OCR toolchain. These helpers render every expected row
+back into the layout the directories use, with the usual OCR noise (wrapped and hyphenated lines, stray tags, FAX and
+Telex numbers, mailing addresses, pointer entries), so the parser can be exercised on its own.
+"""
+import csv
+import glob
+import os
+import random
+import re
+import textwrap
+
+CSV_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "resources", "test-entries", "csvs")
+
+
+def load_expected_rows(csv_dir=CSV_DIR):
+    """Loads the ground-truth rows grouped by file.
+
+    :param csv_dir: The directory holding the expected CSVs.
+    :return: A list of (file name, year, rows) tuples, sorted by file name.
+    """
+    files = []
+    for path in sorted(glob.glob(os.path.join(csv_dir, "*.csv"))):
+        with open(path, newline="", encoding="utf-8") as f:
+            rows = list(csv.DictReader(f))
+        name = os.path.basename(path)
+        files.append((name, name.split("-")[0], rows))
+    return files
+
+
+def render_entry(row, rng):
+    """Renders one expected row as the text Tesseract would produce for it.
+
+    :param row: A row from an expected CSV.
+    :param rng: A random.Random used to pick the noise applied to the entry.
+    :return: The entry text.
+    """
+    if row.get("note") and not row.get("code"):
+        return f"{row['title']}\n{row['note']}"
+
+    head = f"{row['code']} {row['title']}"
+    if row.get("tag"):
+        tag = row["tag"].upper() if rng.random() < 0.1 else row["tag"]
+        head += f" ( {tag} )" if rng.random() < 0.1 else f" ({tag})"
+    if rng.random() < 0.05:
+        head += " (p)"
+
+    if rng.random() < 0.1 and row.get("zip"):
+        address = (
+            f"{row['street']}, {row['city']}, {row['state']} (Mailing add: PO Box {rng.randint(1, 9999)}, {row['zip']})."
+        )
+    else:
+        address = f"{row['street']}, {row['city']}, {row['state']} {row['zip']}."
+
+    parts = [f"{head}, {address}"]
+    if row.get("phone"):
+        parts.append(f"Tel: {row['phone']};" if rng.random() < 0.2 else f"Tel: {row['phone']}.")
+    if rng.random() < 0.2:
+        parts.append(f"FAX: {rng.randint(200, 999)}-{rng.randint(200, 999)}-{rng.randint(1000, 9999)}.")
+    if rng.random() < 0.1:
+        parts.append(f"Telex: {rng.randint(10000, 99999)}, {rng.randint(100, 999)}.")
+    if row.get("staff"):
+        parts.append(f"Professional Staff: {row['staff']};")
+    if row.get("doctorates"):
+        parts.append(f"Doctorates: {row['doctorates']};")
+    if row.get("numTechsAndAuxs"):
+        parts.append(f"Technicians & Auxiliaries: {row['numTechsAndAuxs']}.")
+    if row.get("fields"):
+        parts.append(f"Fields of R&D: {row['fields']}.")
+
+    return _wrap(" ".join(parts), rng)
+
+
+def _wrap(text, rng):
+    """Wraps text to a random column width, sometimes hyphenating a word across a line break."""
+    lines = textwrap.wrap(text, width=rng.choice([40, 55, 70]), break_on_hyphens=False)
+    if len(lines) > 2 and rng.random() < 0.3:
+        # Hyphenate a word across a line break the way the printed columns do
+        i = rng.randrange(len(lines) - 1)
+        word = lines[i].rsplit(" ", 1)[-1]
+        if len(word) > 4 and word.isalpha():
+            lines[i] = lines[i][: -len(word)] + word[:2] + "-"
+            lines[i + 1] = word[2:] + " " + lines[i + 1]
+    return "\n".join(lines)
+
+
+_PHONE_PARTS = re.compile(r"(\d{3})-(\d{3})-(\d{4})$")
+_MAIL_BOX = re.compile(r"(.*), (PO Box \d+)$")
+
+# The editions render_edition_entry can lay entries out like, see src/utils/editions.py
+EDITION_LAYOUTS = ("1975", "1977", "1979", "1982")
+
+
+def is_complete(row):
+    """Tells whether a row has everything the older layouts always print: code, address and a phone number."""
+    return bool(row.get("code") and row.get("street") and row.get("zip") and _PHONE_PARTS.match(row.get("phone", "")))
+
+
+def render_edition_entry(row, rng, edition):
+    """Renders one complete expected row in the layout of an edition.
+
+    :param row: A row from an expected CSV, see is_complete.
+    :param rng: A random.Random used to pick the noise applied to the entry.
+    :param edition: One of EDITION_LAYOUTS.
+    :return: The entry text.
+    """
+    if edition == "1982":
+        return render_entry(row, rng)
+
+    area, exchange, number = _PHONE_PARTS.match(row["phone"]).groups()
+    phone = f"({area}) {exchange}-{number}"
+    head = f"{row['code']} {row['title']}" + (f" ({row['tag']})" if row.get("tag") else "")
+    staff = f"Professional staff {row['staff']}: engineering, {row['staff']}; " if row.get("staff") else ""
+    techs = f"{row['numTechsAndAuxs']} technicians and auxiliaries. " if row.get("numTechsAndAuxs") else ""
+    fields = f"Field of R&D: {row['fields']}." if row.get("fields") else ""
+
+    if edition == "1975":
+        lines = [head, row["street"], f"{row['city']}, {row['state']} {row['zip']}", phone]
+        if rng.random() < 0.2:
+            lines.append(f"Telex: {rng.randint(10, 99)}-{rng.randint(100, 999)}")
+        rest = _wrap(staff + techs + fields, rng)
+        return "\n".join(lines) + ("\n" + rest if rest else "")
+
+    mail = _MAIL_BOX.match(row["street"]) if edition == "1977" else None
+    if mail:
+        address = f"{mail.group(1)}, {row['city']}, {row['state']} {row['zip']} (Mail: {mail.group(2)}, {row['city']}, " \
+                  f"{row['state']} {row['zip']})."
+    else:
+        address = f"{row['street']}, {row['city']}, {row['state']} {row['zip']}."
+    if edition == "1977":
+        phone = f"{phone}."
+    else:
+        phone = f"Tel: {phone}."
+        staff = f"Professional Staff: {row['staff']}; engineering {row['staff']}; " if row.get("staff") else ""
+        techs = f"Technicians & Auxiliaries {row['numTechsAndAuxs']}. " if row.get("numTechsAndAuxs") else ""
+    return _wrap(f"{head}, {address} {phone} {staff}{techs}{fields}", rng)
+
+
+def build_corpus(copies=1, seed=481):
+    """Renders every expected file as a page of entry text.
+
+    :param copies: How many times to repeat the corpus, each copy with fresh noise.
+    :param seed: Seed for the noise so runs are repeatable.
+    :return: A list of (file name, year, page text, entries) tuples.
+    """
+    rng = random.Random(seed)
+    corpus = []
+    for _ in range(copies):
+        for name, year, rows in load_expected_rows():
+            entries = [render_entry(row, rng) for row in rows]
+            corpus.append((name, year, f"{rng.randint(1, 999)} HEADER\n" + "\n\n".join(entries) + "\n", entries))
+    return corpus
@@ -0,0 +1,138 @@
+"""Dictionary correction of cities, states and fields: accuracy and throughput.
+
+Run from the repository root:
+
+    python -m benchmarks.correction [--copies N] [--extra-cities N] [--repeat N]
+
+The corpus is rendered with OCR letter misreads in the city, state and fields of its entries, then parsed with and
+without a Corrector whose vocabulary is mined from the ground truth. The extra cities are made-up names added to the
+vocabulary, to show lookups cost the same at the size of a real list of US places. Lookups are also timed against
+comparing every misread with every known term.
+"""
+import argparse
+import random
+import sys
+import time
+
+from benchmarks.corpus import load_expected_rows, render_entry
+from src.utils.correction import Corrector, edit_distance
+from src.utils.ocr_utils import parse_entry
+
+# Letters OCR confuses with other letters, digits would stop the address pattern from matching at all
+_MISREADS = {"e": "c", "h": "b", "i": "l", "u": "n", "o": "a", "n": "u", "a": "o", "r": "t"}
+_STATE_MISREADS = {"J": "I", "I": "L", "O": "Q", "D": "O", "M": "N", "N": "H", "A": "R", "C": "G"}
+CORRECTED = ("city", "state", "fields")
+
+
+def misread_word(word, rng, misreads):
+    positions = [i for i, char in enumerate(word) if char in misreads]
+    if not positions:
+        return word
+    i = rng.choice(positions)
+    return word[:i] + misreads[word[i]] + word[i + 1 :]
+
+
+def misread_row(row, rng):
+    """Misreads a letter of the city, state and a few field words of a row."""
+    misread = dict(row)
+    if len(row["city"]) >= 5:
+        misread["city"] = misread_word(row["city"], rng, _MISREADS)
+    if row["state"] and rng.random() < 0.5:
+        misread["state"] = misread_word(row["state"], rng, _STATE_MISREADS)
+    if row.get("fields"):
+        misread["fields"] = " ".join(
+            misread_word(word, rng, _MISREADS) if len(word) >= 6 and rng.random() < 0.3 else word
+            for word in row["fields"].split(" ")
+        )
+    return misread
+
+
+def build_jobs(copies, seed=481):
+    """:return: A list of (entry text, year, expected row) for every complete ground-truth row, misread."""
+    rng = random.Random(seed)
+    jobs = []
+    for _ in range(copies):
+        for _, year, rows in load_expected_rows():
+            for row in rows:
+                if row.get("code") and row.get("city"):
+                    row = {column: value or "" for column, value in row.items()}
+                    jobs.append((render_entry(misread_row(row, rng), rng), year, row))
+    return jobs
+
+
+def made_up_cities(count, seed=481):
+    rng = random.Random(seed)
+    return {
+        " ".join("".join(rng.choice("abcdefghiklmnoprstuvwy") for _ in range(rng.randint(4, 9))).title()
+                 for _ in range(rng.randint(1, 2))): 1
+        for _ in range(count)
+    }
+
+
+def accuracy(jobs, corrector=None):
+    right = dict.fromkeys(CORRECTED, 0)
+    for entry, year, expected in jobs:
+        row = parse_entry(entry, year, corrector=corrector)[0]
+        for column in CORRECTED:
+            right[column] += row[column].rstrip(".") == expected[column].rstrip(".")
+    return {column: right[column] / len(jobs) for column in CORRECTED}
+
+
+def best_time(repeat, fn):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--copies", type=int, default=50, help="How many misread copies of the corpus to parse.")
+    parser.add_argument("--extra-cities", type=int, default=30000, help="Made-up cities added to the vocabulary.")
+    parser.add_argument("--repeat", type=int, default=3, help="Timing runs, best is kept.")
+    args = parser.parse_args(argv)
+
+    truth = [row for _, _, rows in load_expected_rows() for row in rows]
+    vocabulary = Corrector.from_rows(truth, min_count=1).to_dict()
+    vocabulary["cities"].update(made_up_cities(args.extra_cities))
+    start = time.perf_counter()
+    corrector = Corrector(**vocabulary)
+    print(f"vocabulary: {len(corrector.cities):,} cities, {len(corrector.field_terms):,} field terms, "
+          f"indexed in {time.perf_counter() - start:.2f}s")
+
+    jobs = build_jobs(args.copies)
+    plain = best_time(args.repeat, lambda: [parse_entry(entry, year) for entry, year, _ in jobs])
+
+    # A fresh corrector per run, so the cache of corrected words doesn't carry over between runs
+    correctors = [Corrector(**vocabulary) for _ in range(args.repeat)]
+
+    def corrected_run():
+        run_corrector = correctors.pop()
+        for entry, year, _ in jobs:
+            parse_entry(entry, year, corrector=run_corrector)
+
+    corrected = best_time(args.repeat, corrected_run)
+    print(f"parse_entry:            {len(jobs) / plain:,.0f} entries/s")
+    print(f"parse_entry, corrected: {len(jobs) / corrected:,.0f} entries/s")
+
+    before, after = accuracy(jobs), accuracy(jobs, Corrector(**vocabulary))
+    for column in CORRECTED:
+        print(f"{column:<7} right: {before[column]:6.1%} -> {after[column]:6.1%}")
+
+    rng = random.Random(481)
+    cities = [city for city in corrector.cities.to_dict() if len(city) >= 5]
+    tokens = [misread_word(rng.choice(cities), rng, _MISREADS) for _ in range(2000)]
+    symspell = best_time(args.repeat, lambda: [corrector.cities.lookup(token, 1) for token in tokens])
+    brute_tokens = tokens[:100]
+    keys = list(corrector.cities.counts)
+    brute = best_time(1, lambda: [min(keys, key=lambda key: edit_distance(token.casefold(), key, 1))
+                                  for token in brute_tokens])
+    print(f"city lookups, index:       {len(tokens) / symspell:,.0f}/s")
+    print(f"city lookups, every term:  {len(brute_tokens) / brute:,.0f}/s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,73 @@
+"""Per-edition benchmark of the edition parser profiles against the single default cascade.
+
+Run from the repository root:
+
+    python -m benchmarks.editions [--copies N] [--repeat N]
+
+The complete ground-truth rows are rendered in the layout of every edition, then parsed with the edition's own profile
+and with DEFAULT_EDITION, the cascade every year used to go through. For each edition the best-of-N time and the share
+of printed fields that came out equal to the ground truth are reported.
+"""
+import argparse
+import random
+import sys
+import time
+
+from benchmarks.corpus import EDITION_LAYOUTS, is_complete, load_expected_rows, render_edition_entry
+from src.utils.editions import DEFAULT_EDITION, get_edition
+from src.utils.ocr_utils import parse_entry
+
+SCORED_COLUMNS = ("title", "street", "city", "state", "zip", "phone", "tag", "staff", "numTechsAndAuxs", "fields")
+
+
+def build_jobs(edition, copies, seed=481):
+    rng = random.Random(seed)
+    rows = [row for _, _, file_rows in load_expected_rows() for row in file_rows if is_complete(row)]
+    return [(render_edition_entry(row, rng, edition), row) for _ in range(copies) for row in rows]
+
+
+def accuracy(profile, year, jobs):
+    """:return: The share of non-empty expected fields parsed exactly, ignoring a trailing period."""
+    correct = total = 0
+    for entry, expected in jobs:
+        row = parse_entry(entry, year, edition=profile)[0]
+        for column in SCORED_COLUMNS:
+            if expected[column]:
+                total += 1
+                correct += row[column].strip().rstrip(".") == expected[column].strip().rstrip(".")
+    return correct / total if total else 1.0
+
+
+def best_time(profile, year, jobs, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for entry, _ in jobs:
+            parse_entry(entry, year, edition=profile)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--copies", type=int, default=50, help="How many noisy copies of the rows to parse.")
+    parser.add_argument("--repeat", type=int, default=5, help="Timing runs per profile, best is kept.")
+    args = parser.parse_args(argv)
+
+    print(f"{'edition':<8} {'entries':>7} {'default':>9} {'edition':>9} {'speedup':>8} {'default acc':>12} "
+          f"{'edition acc':>12}")
+    for year in EDITION_LAYOUTS:
+        profile = get_edition(year)
+        jobs = build_jobs(year, args.copies)
+        default_time = best_time(DEFAULT_EDITION, year, jobs, args.repeat)
+        edition_time = best_time(profile, year, jobs, args.repeat)
+        print(
+            f"{profile.name:<8} {len(jobs):>7} {default_time:>8.3f}s {edition_time:>8.3f}s "
+            f"{default_time / edition_time:>7.2f}x {accuracy(DEFAULT_EDITION, year, jobs):>12.1%} "
+            f"{accuracy(profile, year, jobs):>12.1%}"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
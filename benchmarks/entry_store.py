@@ -0,0 +1,60 @@
+"""Load, re-run, lookup and full-text search times of the SQLite entry store.
+
+Run from the repository root:
+
+    python -m benchmarks.entry_store [--copies N]
+
+Every copy of the rendered corpus is stored as its own set of source files. The corpus is then upserted a second time,
+which must change nothing, and a few indexed lookups and searches are timed.
+"""
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import time
+
+from benchmarks.corpus import build_corpus
+from src.utils.entry_store import EntryStore
+
+QUERIES = [
+    {"year": 1985, "state": "WI"},
+    {"state": "CA"},
+    {"code": "A15"},
+    {"zip": "48902"},
+    {"title_prefix": "ABRAMS"},
+]
+SEARCHES = ["laser*", "fields: radar OR sonar", "telecommunications navigation"]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--copies", type=int, default=200, help="How many noisy copies of the corpus to store.")
+    args = parser.parse_args(argv)
+    logging.getLogger("entry_store").setLevel(logging.WARNING)
+
+    files = [(f"{i}-{name}", year, page) for i, (name, year, page, _) in enumerate(build_corpus(args.copies))]
+    with tempfile.TemporaryDirectory() as temp_dir, EntryStore(os.path.join(temp_dir, "entries.sqlite")) as store:
+        for label in ("load", "re-run"):
+            start = time.perf_counter()
+            results = [store.upsert_text(name, page, year) for name, year, page in files]
+            seconds = time.perf_counter() - start
+            rows = sum(result.rows for result in results)
+            changed = sum(result.changed for result in results)
+            print(f"{label:<7} {len(files)} files, {rows:,} rows, {changed:,} changed in {seconds:.3f}s")
+
+        for query in QUERIES:
+            start = time.perf_counter()
+            found = store.find(**query)
+            print(f"find({', '.join(f'{k}={v!r}' for k, v in query.items())}): {len(found)} rows in "
+                  f"{(time.perf_counter() - start) * 1000:.2f}ms")
+
+        for query in SEARCHES:
+            start = time.perf_counter()
+            found = store.search(query, limit=100)
+            print(f"search({query!r}): {len(found)} rows in {(time.perf_counter() - start) * 1000:.2f}ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
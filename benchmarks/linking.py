@@ -0,0 +1,109 @@
+"""Cross-year entity linking: comparisons performed with blocking against the naive all-pairs baseline.
+
+Run from the repository root:
+
+    python -m benchmarks.linking [--editions N] [--copies N] [--naive-sample N]
+
+Every ground-truth row becomes a lab that appears in several editions, each time re-rendered with fresh noise and a
+few OCR misreads in its title, then parsed. link_rows is timed on all of them, and its links are checked against the
+known labs. The naive baseline compares every entry with every other one; it is timed on a sample and extrapolated.
+"""
+import argparse
+import logging
+import random
+import sys
+import time
+from itertools import combinations
+
+import pandas as pd
+
+from benchmarks.corpus import load_expected_rows, render_entry
+from src.utils.linking import link_rows, normalize_title, title_similarity, trigrams
+from src.utils.ocr_utils import parse_entry
+
+_MISREADS = {"O": "0", "I": "l", "E": "F", "B": "8", "S": "5", "C": "G"}
+EDITION_YEARS = [str(year) for year in range(1982, 1999)]
+
+
+def misread(title, rng):
+    """Swaps a letter or two of a title for what OCR often reads instead."""
+    chars = list(title)
+    for _ in range(rng.randint(0, 2)):
+        i = rng.randrange(len(chars))
+        chars[i] = _MISREADS.get(chars[i], chars[i])
+    return "".join(chars)
+
+
+def build_editions(editions, copies, seed=481):
+    """:return: The parsed rows that have a title and, for each, the lab it was rendered from."""
+    rng = random.Random(seed)
+    labs = [row for _, _, rows in load_expected_rows() for row in rows if row.get("code") and row.get("title")]
+    rows, truth = [], []
+    names, zips = {}, {}
+    for copy in range(1, copies):
+        for lab_number in range(len(labs)):
+            words = ["".join(rng.choice("ABCDEFGHIKLMNOPRSTUVWY") for _ in range(rng.randint(3, 9))) for _ in range(2)]
+            names[copy, lab_number] = " ".join(words + [rng.choice(["LABS", "CORPORATION", "INC", "RESEARCH CENTER"])])
+            zips[copy, lab_number] = f"{rng.randint(1000, 99999):05d}"
+    for copy in range(copies):
+        for lab_number, lab in enumerate(labs):
+            for year in rng.sample(EDITION_YEARS, editions):
+                rendered = dict(lab, title=misread(lab["title"], rng))
+                if copy:
+                    # Every copy is a different lab with the same kind of entry, somewhere else
+                    rendered["title"] = names[copy, lab_number]
+                    rendered["zip"] = zips[copy, lab_number]
+                row = parse_entry(render_entry(rendered, rng), year)[0]
+                # Entries the parser got no title from have nothing to link on
+                if row["title"]:
+                    rows.append(row)
+                    truth.append((copy, lab_number))
+    return rows, truth
+
+
+def naive_seconds(rows, sample):
+    titles = [trigrams(title) for title in normalize_title(pd.Series([row["title"] for row in rows[:sample]]))]
+    start = time.perf_counter()
+    for a, b in combinations(titles, 2):
+        title_similarity(a, b)
+    return time.perf_counter() - start
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--editions", type=int, default=6, help="How many editions every lab appears in.")
+    parser.add_argument("--copies", type=int, default=20, help="How many distinct sets of labs to make.")
+    parser.add_argument("--naive-sample", type=int, default=2000, help="Entries the naive baseline is timed on.")
+    args = parser.parse_args(argv)
+    logging.getLogger("linking").setLevel(logging.WARNING)
+
+    rows, truth = build_editions(args.editions, args.copies)
+
+    start = time.perf_counter()
+    linked, stats = link_rows(rows)
+    seconds = time.perf_counter() - start
+
+    sample = min(args.naive_sample, len(rows))
+    naive = naive_seconds(rows, sample) * stats.naive_comparisons / max(sample * (sample - 1) // 2, 1)
+
+    same_lab = {}
+    for i, lab in enumerate(truth):
+        same_lab.setdefault(lab, []).append(i)
+    true_pairs = {pair for members in same_lab.values() for pair in combinations(members, 2)}
+    same_lab_id = {}
+    for i, lab_id in enumerate(linked["lab_id"].tolist()):
+        same_lab_id.setdefault(lab_id, []).append(i)
+    found_pairs = {pair for members in same_lab_id.values() for pair in combinations(members, 2)}
+    correct = len(true_pairs & found_pairs)
+
+    print(f"{len(rows):,} entries of {len(same_lab):,} labs in {args.editions} editions each")
+    print(f"blocking: {stats.comparisons:,} comparisons in {stats.blocks:,} blocks, {seconds:.2f}s")
+    print(f"naive:    {stats.naive_comparisons:,} comparisons, ~{naive:.2f}s for the comparisons alone")
+    print(f"          {stats.naive_comparisons / max(stats.comparisons, 1):,.0f}x fewer comparisons with blocking")
+    print(f"labs found: {stats.labs:,}, pair precision {correct / max(len(found_pairs), 1):.1%}, "
+          f"recall {correct / max(len(true_pairs), 1):.1%}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,36 @@
+"""Throughput of the vectorised post-parse normalisation.
+
+Run from the repository root:
+
+    python -m benchmarks.normalize [--copies N] [--repeat N]
+
+The rendered corpus is parsed once, then normalize_rows is timed over all of its rows in one batch.
+"""
+import argparse
+import sys
+import time
+
+from benchmarks.corpus import build_corpus
+from src.utils.normalize import normalize_rows
+from src.utils.ocr_utils import iter_rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--copies", type=int, default=500, help="How many noisy copies of the corpus to normalise.")
+    parser.add_argument("--repeat", type=int, default=3, help="Timing runs, best is kept.")
+    args = parser.parse_args(argv)
+
+    rows = [row for _, year, page, _ in build_corpus(args.copies) for row in iter_rows([page], year)]
+
+    best = float("inf")
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        normalize_rows(rows)
+        best = min(best, time.perf_counter() - start)
+    print(f"{len(rows):,} rows normalised in {best:.3f}s ({len(rows) / best:,.0f} rows/s)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,63 @@
+"""Micro-benchmark for parse_entry against the pre-compilation reference implementation.
+
+Run from the repository root:
+
+    python -m benchmarks.parse_entry [--copies N] [--repeat N]
+
+Every rendered entry is parsed by both implementations, the current one with the default edition profile. The outputs
+must be identical, and the best-of-N time of each is reported.
+"""
+import argparse
+import sys
+import time
+
+from benchmarks.corpus import build_corpus
+from benchmarks.legacy_parser import legacy_parse_entry
+from src.utils.editions import DEFAULT_EDITION
+from src.utils.ocr_utils import parse_entry
+
+
+def parse_all(parse, jobs):
+    return [parse(entry, year)[0] for year, entry in jobs]
+
+
+def parse_entry_default(entry, year):
+    return parse_entry(entry, year, edition=DEFAULT_EDITION)
+
+
+def best_time(parse, jobs, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        parse_all(parse, jobs)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--copies", type=int, default=50, help="How many noisy copies of the corpus to parse.")
+    parser.add_argument("--repeat", type=int, default=5, help="Timing runs per implementation, best is kept.")
+    args = parser.parse_args(argv)
+
+    jobs = [(year, entry) for _, year, _, entries in build_corpus(args.copies) for entry in entries]
+
+    expected = parse_all(legacy_parse_entry, jobs)
+    actual = parse_all(parse_entry_default, jobs)
+    mismatches = [(job, e, a) for job, e, a in zip(jobs, expected, actual) if e != a]
+    if mismatches:
+        (year, entry), e, a = mismatches[0]
+        print(f"{len(mismatches)} of {len(jobs)} entries differ. First one:\n{entry}\nexpected: {e}\nactual:   {a}")
+        return 1
+
+    legacy = best_time(legacy_parse_entry, jobs, args.repeat)
+    compiled = best_time(parse_entry_default, jobs, args.repeat)
+    print(f"{len(jobs)} entries, identical output")
+    print(f"legacy:   {legacy:.3f}s ({len(jobs) / legacy:,.0f} entries/s)")
+    print(f"compiled: {compiled:.3f}s ({len(jobs) / compiled:,.0f} entries/s)")
+    print(f"speedup:  {legacy / compiled:.2f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,280 @@
+"""Stage-level benchmark of the OCR pipeline over the bundled test PDFs.
+
+Run from the repository root:
+
+    python -m benchmarks.pipeline run [--profile fast] [--repeat 3] [--output baseline.json]
+    python -m benchmarks.pipeline compare baseline.json candidate.json [--threshold 0.1]
+
+Every page of resources/test-entries/pdfs goes through the same steps as ocr_pdf_page, one page at a time on one
+thread, timed stage by stage:
+
+    rasterize  pdfinfo and pdftoppm rendering the page, read back by pdf2image
+    decode     converting the rendered page into the BGR array OpenCV works on
+    segment    splitting the columns and finding the text blocks
+    ocr        Tesseract over every block
+    parse      parsing the file's regions into rows
+    write      writing the rows to a CSV
+
+Each stage reports its seconds, pages/sec and regions/sec, the best of the repeats, and the peak RSS of this process
+and its Tesseract and Poppler children while it ran. run stores the results as JSON, compare prints the change of every
+stage between two of them and exits with 1 if one got slower or bigger by more than the threshold.
+"""
+import argparse
+import glob
+import json
+import logging
+import os
+import platform
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+import cv2
+import numpy as np
+import psutil
+from pdf2image import convert_from_path
+
+from src.core.image_processor import ImageProcessor
+from src.core.results import RegionResult
+from src.ocr import OCRProcessorNoGUI
+from src.utils.config import set_tesseract_path
+from src.utils.memory import tree_rss
+from src.utils.ocr_utils import iter_parsed, write_csv, year_from_filename
+from src.utils.profiles import DEFAULT_PROFILE, PROFILES, get_profile
+
+PDF_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "resources", "test-entries", "pdfs")
+STAGES = ("rasterize", "decode", "segment", "ocr", "parse", "write")
+MB = 1024 * 1024
+
+
+class StageTimer:
+    """Adds up the time spent in each stage, and samples the RSS in the background to find each stage's peak."""
+
+    def __init__(self, sample_seconds=0.005):
+        self.seconds = dict.fromkeys(STAGES, 0.0)
+        self.peak_rss = dict.fromkeys(STAGES, 0)
+        self.current = None
+        self.sample_seconds = sample_seconds
+        self._process = psutil.Process()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self._sample_until_stopped, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+        return False
+
+    def _sample(self):
+        stage = self.current
+        if stage is not None:
+            self.peak_rss[stage] = max(self.peak_rss[stage], tree_rss(self._process))
+
+    def _sample_until_stopped(self):
+        while not self._stop.wait(self.sample_seconds):
+            self._sample()
+
+    @contextmanager
+    def stage(self, name):
+        self.current = name
+        self._sample()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.seconds[name] += time.perf_counter() - start
+            self._sample()
+            self.current = None
+
+
+def benchmark_file(pdf_path, split, profile, timer, output_dir):
+    """Runs one PDF through every stage.
+
+    :return: The number of pages, regions and rows.
+    """
+    with timer.stage("rasterize"):
+        page_count = ImageProcessor.count_pages(pdf_path)
+
+    regions = []
+    for page_number in range(1, page_count + 1):
+        with timer.stage("rasterize"):
+            images = convert_from_path(pdf_path, grayscale=True, dpi=profile.dpi, first_page=page_number,
+                                       last_page=page_number)
+        with timer.stage("decode"):
+            image = cv2.cvtColor(np.asarray(images[0]), cv2.COLOR_GRAY2BGR)
+        del images
+
+        processor = ImageProcessor(image, split=split, profile=profile)
+        with timer.stage("segment"):
+            if split:
+                left_col, right_col = processor.split_page()
+                columns = [(0, 0, left_col), (1, left_col.shape[1], right_col)]
+            else:
+                columns = [(0, 0, image)]
+            blocks = [
+                (column, x_offset, box, block)
+                for column, x_offset, half in columns
+                for box, block in processor.find_regions(half, profile.kernel, profile.min_height)
+            ]
+        with timer.stage("ocr"):
+            for column, x_offset, (x, y, w, h), block in blocks:
+                text, confidence = processor.ocr_region(block)
+                regions.append(RegionResult(text, page_number, column, (x + x_offset, y, w, h), confidence))
+
+    with timer.stage("parse"):
+        rows = [row for row, _ in iter_parsed(regions, year_from_filename(pdf_path))]
+    with timer.stage("write"):
+        csv_name = os.path.splitext(os.path.basename(pdf_path))[0] + ".csv"
+        write_csv(rows, os.path.join(output_dir, csv_name))
+    return page_count, len(regions), len(rows)
+
+
+def run_benchmark(pdf_paths, profile, repeat=1):
+    """Benchmarks the pipeline stage by stage over pdf_paths.
+
+    :param pdf_paths: The PDFs to run.
+    :param profile: The PipelineProfile to run with.
+    :param repeat: How many times to run them, the best time of every stage is kept.
+    :return: The results, as stored in the JSON file.
+    """
+    set_tesseract_path()
+    no_split = OCRProcessorNoGUI(profile=profile).test_images_no_split
+    best = dict.fromkeys(STAGES, float("inf"))
+    peak_rss = dict.fromkeys(STAGES, 0)
+    best_wall = float("inf")
+    pages = regions = rows = 0
+
+    for _ in range(repeat):
+        pages = regions = rows = 0
+        start = time.perf_counter()
+        with tempfile.TemporaryDirectory() as output_dir, StageTimer() as timer:
+            for pdf_path in pdf_paths:
+                split = os.path.basename(pdf_path) not in no_split
+                file_pages, file_regions, file_rows = benchmark_file(pdf_path, split, profile, timer, output_dir)
+                pages += file_pages
+                regions += file_regions
+                rows += file_rows
+        best_wall = min(best_wall, time.perf_counter() - start)
+        for stage in STAGES:
+            best[stage] = min(best[stage], timer.seconds[stage])
+            peak_rss[stage] = max(peak_rss[stage], timer.peak_rss[stage])
+
+    def rate(count, seconds):
+        return round(count / seconds, 3) if seconds else None
+
+    return {
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "profile": profile.name,
+        "files": [os.path.basename(pdf_path) for pdf_path in pdf_paths],
+        "repeat": repeat,
+        "pages": pages,
+        "regions": regions,
+        "rows": rows,
+        "wall_seconds": round(best_wall, 3),
+        "pages_per_second": rate(pages, best_wall),
+        "regions_per_second": rate(regions, best_wall),
+        "peak_rss_mb": round(max(peak_rss.values()) / MB, 1),
+        "stages": {
+            stage: {
+                "seconds": round(best[stage], 3),
+                "pages_per_second": rate(pages, best[stage]),
+                "regions_per_second": rate(regions, best[stage]),
+                "peak_rss_mb": round(peak_rss[stage] / MB, 1),
+            }
+            for stage in STAGES
+        },
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        },
+    }
+
+
+def print_results(results):
+    print(f"{results['profile']} profile: {len(results['files'])} files, {results['pages']} pages, "
+          f"{results['regions']} regions, {results['rows']} rows, best of {results['repeat']}")
+    print(f"{'stage':<10} {'seconds':>9} {'pages/s':>9} {'regions/s':>10} {'peak MB':>8}")
+    for stage, numbers in results["stages"].items():
+        print(f"{stage:<10} {numbers['seconds']:>9.3f} {numbers['pages_per_second'] or 0:>9.2f} "
+              f"{numbers['regions_per_second'] or 0:>10.1f} {numbers['peak_rss_mb']:>8.1f}")
+    print(f"{'total':<10} {results['wall_seconds']:>9.3f} {results['pages_per_second'] or 0:>9.2f} "
+          f"{results['regions_per_second'] or 0:>10.1f} {results['peak_rss_mb']:>8.1f}")
+
+
+def compare(baseline, candidate, threshold=0.1, min_seconds=0.01, min_rss_mb=5.0):
+    """Compares two benchmark results stage by stage.
+
+    A stage regressed if its seconds or peak RSS grew by more than threshold, and by more than min_seconds or
+    min_rss_mb, so the noise of stages that take next to nothing isn't flagged.
+
+    :return: A list of (metric, baseline value, candidate value, change, regressed) tuples.
+    """
+    metrics = [("total seconds", "wall_seconds", min_seconds), ("total peak MB", "peak_rss_mb", min_rss_mb)]
+    pairs = [(name, baseline[key], candidate[key], floor) for name, key, floor in metrics]
+    for stage in STAGES:
+        old, new = baseline["stages"][stage], candidate["stages"][stage]
+        pairs.append((f"{stage} seconds", old["seconds"], new["seconds"], min_seconds))
+        pairs.append((f"{stage} peak MB", old["peak_rss_mb"], new["peak_rss_mb"], min_rss_mb))
+
+    comparison = []
+    for name, old, new, floor in pairs:
+        change = (new - old) / old if old else 0.0
+        comparison.append((name, old, new, change, change > threshold and new - old > floor))
+    return comparison
+
+
+def load(path):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    run_parser = commands.add_parser("run", help="Benchmark the pipeline and store the results as JSON.")
+    run_parser.add_argument("--pdfs", default=PDF_DIR, help="The directory of PDFs to run. Default: the bundled ones.")
+    run_parser.add_argument("-p", "--profile", choices=PROFILES, default=DEFAULT_PROFILE, help="The pipeline profile.")
+    run_parser.add_argument("--repeat", type=int, default=1, help="Runs to take the best time of. Default: 1.")
+    run_parser.add_argument("--output", default="pipeline-benchmark.json", help="Where to store the results.")
+    compare_parser = commands.add_parser("compare", help="Flag the regressions between two stored runs.")
+    compare_parser.add_argument("baseline", help="The results to compare against.")
+    compare_parser.add_argument("candidate", help="The results of the change.")
+    compare_parser.add_argument("--threshold", type=float, default=0.1,
+                                help="The relative growth flagged as a regression. Default: 0.1.")
+    args = parser.parse_args(argv)
+
+    if args.command == "compare":
+        baseline, candidate = load(args.baseline), load(args.candidate)
+        if baseline["files"] != candidate["files"] or baseline["profile"] != candidate["profile"]:
+            print("Warning: the two runs used different PDFs or profiles", file=sys.stderr)
+        comparison = compare(baseline, candidate, args.threshold)
+        print(f"{'metric':<18} {'baseline':>9} {'candidate':>9} {'change':>8}")
+        for name, old, new, change, regressed in comparison:
+            print(f"{name:<18} {old:>9.3f} {new:>9.3f} {change:>+8.1%}{'  REGRESSION' if regressed else ''}")
+        regressions = sum(regressed for *_, regressed in comparison)
+        print(f"{regressions} regression{'s' if regressions != 1 else ''} over {args.threshold:.0%}")
+        return 1 if regressions else 0
+
+    pdf_paths = sorted(glob.glob(os.path.join(args.pdfs, "*.pdf")))
+    if not pdf_paths:
+        print(f"No PDF files in {args.pdfs}", file=sys.stderr)
+        return 2
+    logging.getLogger("profiles").setLevel(logging.ERROR)
+    results = run_benchmark(pdf_paths, get_profile(args.profile), args.repeat)
+    print_results(results)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results stored in {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
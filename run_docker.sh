@@ -15,7 +15,7 @@ if [ -d "./input" ]; then
   docker build -t $IMAGE_NAME .
 
   # Run the container in detached mode with volume mount
-  docker run --user "$(id -u):$(id -g)"  --name $CONTAINER_NAME -v "$(pwd)/input:/app/input" -v "$(pwd)/output:/app/output" $IMAGE_NAME
+  docker run --user "$(id -u):$(id -g)"  --name $CONTAINER_NAME -e PIPELINE_PROFILE="${PIPELINE_PROFILE:-balanced}" -e SQLITE_DB="${SQLITE_DB:-}" -e CORRECTION_VOCAB="${CORRECTION_VOCAB:-}" -e WATCH="${WATCH:-}" -e METRICS_TEXTFILE="${METRICS_TEXTFILE:-}" -e METRICS_PORT="${METRICS_PORT:-}" ${METRICS_PORT:+-p "$METRICS_PORT:$METRICS_PORT"} -e MEMORY_BUDGET="${MEMORY_BUDGET:-}" -e QUEUE_DB="${QUEUE_DB:-}" -e MERGE_OUTPUT="${MERGE_OUTPUT:-}" -e WORKERS="${WORKERS:-}" -e OUTPUT_FORMAT="${OUTPUT_FORMAT:-}" -v "$(pwd)/input:/app/input" -v "$(pwd)/output:/app/output" $IMAGE_NAME
 
   echo "✅ Docker container has finished running."
 
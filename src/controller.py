@@ -1,8 +1,16 @@
 import multiprocessing
+import os
 import threading
+import time
 from multiprocessing import Queue
+from src.core.image_processor import ImageProcessor
+from src.utils.dedupe import group_duplicates
+from src.utils.memory import MemoryGovernor, estimate_file_bytes
 from src.utils.globals import AppState
+from src.utils.profiles import DEFAULT_PROFILE, get_profile
 from src.ocr import OCRProcessor, process_pdf_worker
+from src.utils.journal import JOURNAL_DIR, Journal
+from src.utils.output_sink import MERGED_NAME, OutputSink
 from src.gui.gui import GUI
 
 
@@ -10,11 +18,17 @@ class AppController:
     """Controller class for the graphical application."""
 
     def __init__(self):
+        self.profile = DEFAULT_PROFILE
+        self.run_profile = None  # The profile used by the last batch
+        self.output_dir = None  # None saves to the Downloads folder
+        self.merge_output = False
         self.gui = GUI(self)
-        self.ocr_processor = OCRProcessor(self)
+        self.ocr_processor = OCRProcessor(self, profile=self.profile)
         self.current_state = None
         self.parsed_files = []
         self.current_file = None  # Track the current file being processed
+        self.journal = None  # The pages OCR'd by the last batch, kept until its files are saved
+        self.copies = {}  # The PDFs of the last batch that were OCR'd, with the copies of them that weren't
         self.manager = multiprocessing.Manager()
         self.result_queue: Queue = self.manager.Queue()
 
@@ -23,26 +37,73 @@ class AppController:
         self.current_state = new_state
         self.gui.set_state(new_state)
 
+    def set_profile(self, profile_name):
+        """Sets the pipeline profile used for the next batch."""
+        self.profile = get_profile(profile_name).name
+
+    def set_output_dir(self, output_dir):
+        """Sets the folder parsed files are saved to, None for the Downloads folder."""
+        self.output_dir = output_dir or None
+
+    def set_merge_output(self, merge_output):
+        """Sets whether the next save writes every file into one CSV instead of one CSV per file."""
+        self.merge_output = bool(merge_output)
+
     def process_files(self, file_paths):
         """Processes one or more files using multiprocessing."""
         self.set_state(AppState.PROCESSING)
         self.parsed_files = []  # Clear previous results
+        self.run_profile = self.profile
+        self.ocr_processor.profile = get_profile(self.run_profile)
+        # Processing the same files again after a crash reads back the pages the journal has instead of OCRing them
+        self.journal = Journal(os.path.join(OutputSink(self.output_dir).output_dir, JOURNAL_DIR))
 
-        process_list = []
+        # Started from a thread, the hashing and the workers that wouldn't fit in memory yet don't block the GUI
+        threading.Thread(
+            target=self.start_workers,
+            args=(file_paths,),
+            daemon=True
+        ).start()
 
-        for file_path in file_paths:
+    def start_workers(self, file_paths, poll_seconds=0.5):
+        """Starts a worker process per file as memory allows, then collects their results."""
+        # PDFs with the same content are OCR'd once, and the result is added under the name of every copy
+        self.copies = group_duplicates(file_paths)
+        governor = MemoryGovernor()
+        profile = self.ocr_processor.profile
+        process_list = []
+        running = []  # (process, estimated bytes) of the workers not finished yet
+
+        for file_path in self.copies:
+            estimate = estimate_file_bytes(file_path, profile.dpi, profile.max_workers)
+            while True:
+                running = [(process, pending) for process, pending in running if process.is_alive()]
+                if not running or governor.has_room(estimate, sum(pending for _, pending in running)):
+                    break
+                time.sleep(poll_seconds)
             process = multiprocessing.Process(
                 target=process_pdf_worker,
-                args=(file_path, self.result_queue)
+                args=(file_path, self.result_queue, self.run_profile, self.journal.journal_dir)
             )
             process_list.append(process)
             process.start()
+            running.append((process, estimate))
 
-        threading.Thread(
-            target=self.collect_results,
-            args=(process_list,),
-            daemon=True
-        ).start()
+        self.collect_results(process_list)
+
+    def preview_file(self, file_path, pages=3):
+        """OCRs a few pages spread over a PDF in the background, then shows their rows."""
+        processor = OCRProcessor(self, profile=self.profile)
+
+        def preview():
+            try:
+                result = processor.preview(file_path, pages, spread=True)
+            except Exception as e:
+                self.gui.root.after(0, self.gui.handle_error, "Preview Error", f"Failed to preview {file_path}: {e}")
+                return
+            self.gui.root.after(0, self.gui.show_preview, result)
+
+        threading.Thread(target=preview, daemon=True).start()
 
     def collect_results(self, process_list):
         """Collect results from worker processes and update the GUI."""
@@ -52,17 +113,34 @@ class AppController:
         failed_files = []
 
         while not self.result_queue.empty():
-            result = self.result_queue.get()
-            if result:
-                file_path, parsed_result = result
-                if parsed_result:
-                    self.parsed_files.append((file_path, parsed_result))
-                else:
-                    failed_files.append(file_path)
-
-        self.gui.root.after(0, self.update_gui_after_processing, failed_files)
-
-    def update_gui_after_processing(self, failed_files):
+            pdf_path, file_path, parsed_result = self.result_queue.get()
+            copies = self.copies.get(pdf_path, [])
+            if parsed_result:
+                self.parsed_files.append((file_path, parsed_result))
+                # Each copy's text is parsed under its own name when saved, so with its own year
+                for copy in copies:
+                    copy_name = os.path.splitext(os.path.basename(copy))[0] + ".csv"
+                    self.parsed_files.append((os.path.join(os.path.dirname(file_path), copy_name), parsed_result))
+            else:
+                failed_files += [pdf_path] + copies
+
+        skipped_pages = 0
+        for file_path, copies in self.copies.items():
+            if copies:
+                try:
+                    skipped_pages += ImageProcessor.count_pages(file_path) * len(copies)
+                except Exception:
+                    pass  # Only for the report, a PDF that can't be read already failed
+
+        self.gui.root.after(0, self.update_gui_after_processing, failed_files, skipped_pages)
+
+    def update_gui_after_processing(self, failed_files, skipped_pages=0):
+        copies = sum(len(copies) for copies in self.copies.values())
+        if copies:
+            self.gui.log_message(
+                f"{copies} file{'s were copies' if copies > 1 else ' was a copy'} of others, "
+                f"{skipped_pages} page{'s' if skipped_pages != 1 else ''} not OCR'd"
+            )
         if failed_files:
             failed_message = "\n".join(failed_files)
             self.gui.handle_error("Processing Error", f"Some files failed:\n{failed_message}")
@@ -77,13 +155,50 @@ class AppController:
         files_to_save = [f for f in self.parsed_files if
                          f[0] in selected_paths] if selected_paths else self.parsed_files
 
-        # ocr_processor = OCRProcessor(master=self)
+        files_to_save = [(csv_path, text) for csv_path, text in files_to_save if csv_path and text]
 
-        for csv_path, extracted_text in files_to_save:
-            if csv_path and extracted_text:
-                saved_path = self.ocr_processor.save_csv(csv_path, extracted_text)
-                if not saved_path:
-                    self.gui.handle_error("Save Error", f"Failed to save: {csv_path}")
+        # Parse and write in worker processes so the GUI stays responsive on large batches
+        threading.Thread(
+            target=self.export_files,
+            args=(files_to_save,),
+            daemon=True
+        ).start()
+
+    def export_files(self, files_to_save):
+        self.ocr_processor.sink = OutputSink(self.output_dir, MERGED_NAME if self.merge_output else None)
+        results = self.ocr_processor.save_csv_batch(files_to_save)
+        self.gui.root.after(0, self.update_gui_after_saving, results)
+
+    def update_gui_after_saving(self, results):
+        failed = [result for result in results if not result.ok]
+        for result in failed:
+            self.gui.handle_error("Save Error", f"Failed to save: {result.output_path}\n{result.error}")
+
+        saved = [result for result in results if result.ok]
+        if not failed and len(saved) == len(self.parsed_files) and self.journal is not None:
+            self.journal.clear()
+        if saved:
+            total_seconds = sum(result.seconds for result in saved)
+            if self.ocr_processor.sink.merge_name:
+                destination = f"Merged {len(saved)} file{'s' if len(saved) > 1 else ''} into:\n{saved[0].output_path}"
+            else:
+                destination = (
+                    f"Saved {len(saved)} CSV file{'s' if len(saved) > 1 else ''} to:\n"
+                    f"{os.path.dirname(saved[0].output_path)}"
+                )
+            self.gui.show_info(
+                "Files Saved",
+                f"{destination}\n\n"
+                f"Parsing took {total_seconds:.2f}s in total. Pipeline profile: {self.run_profile}",
+            )
 
     def run(self):
         self.gui.root.mainloop()
+        self.close_journal()
+
+    def close_journal(self):
+        """Deletes the last batch's journal when the app is closed, saved or not: it's only kept to resume after a
+        crash. A batch still processing keeps its journal, as its workers are still writing to it."""
+        if self.journal is not None and self.current_state != AppState.PROCESSING:
+            self.journal.clear()
+            self.journal = None
@@ -1,26 +1,22 @@
-import os
-import tempfile
-
 import cv2
-import pytesseract
-from pdf2image import convert_from_path
+import numpy as np
+from pytesseract import pytesseract as tesseract
+from pdf2image import convert_from_path, pdfinfo_from_path
 
+from src.core.results import RegionResult, regions_to_text
 from src.utils.logger import get_logger
+from src.utils.profiles import get_profile
+from src.utils.tracing import span
 
 logger = get_logger("image_processor")
 
 
-WHITELIST = """ !\\"#$%&\\'()*+,-./0123456789:;<=>?@ABCDEFGHIJKLMNOPQRSTUVWXYZ[\\]`abcdefghijklmnopqrstuvwxyz{|}"""
-BLACKLIST = """~_^"""
-tess_config = config = (
-    f"--psm 6 -c tessedit_char_whitelist={WHITELIST} -c tessedit_char_blacklist={BLACKLIST}"
-)
-
-
 class ImageProcessor:
-    def __init__(self, image, split=True):
+    def __init__(self, image, split=True, profile=None):
         self.image = image
         self.split = split
+        self.profile = get_profile(profile)
+        self.tess_config = self.profile.tess_config()
 
     def split_page(self):
         """
@@ -37,12 +33,14 @@ class ImageProcessor:
         return left_col, right_col
 
     @staticmethod
-    def process_half(image):
+    def find_regions(image, kernel=(200, 20), min_height=60):
         """
-        Processes a single half of the image.
+        Finds the text blocks in a single half of the image.
 
         :param image: One half of the image.
-        :return: The half of the image with bounding boxes.
+        :param kernel: The (width, height) of the dilation kernel used to merge text into blocks.
+        :param min_height: Blocks shorter than this are dropped.
+        :return: A list of ((x, y, w, h), region image) pairs, top to bottom.
         """
         # Grayscale
         gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
@@ -53,7 +51,7 @@ class ImageProcessor:
         )
 
         # Draw the fake-boxes
-        rect_kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (200, 20))
+        rect_kernel = cv2.getStructuringElement(cv2.MORPH_RECT, tuple(kernel))
         dilation = cv2.dilate(thresh, rect_kernel, iterations=1)
 
         # Draw the bounding boxes based on the fake ones
@@ -61,106 +59,113 @@ class ImageProcessor:
             dilation, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE
         )
 
-        min_height = 60  # Remove very short shapes
-        file_paths = []
-
         # Pair each contour with its bounding box, filter by height, and sort by y-position descending
         contour_boxes = [
             (cnt, cv2.boundingRect(cnt))
             for cnt in contours
-            if cv2.boundingRect(cnt)[3] > min_height
+            if cv2.boundingRect(cnt)[3] > min_height  # Remove very short shapes
         ]
         contour_boxes.sort(key=lambda cb: cb[1][1], reverse=False)  # Sort by y
 
+        regions = []
         for cnt, (x, y, w, h) in contour_boxes:
             region = image[y : y + h, x : x + w].copy()
             shifted_contour = cnt - [x, y]
             cv2.drawContours(region, [shifted_contour], -1, (0, 255, 0), 2)
+            regions.append(((x, y, w, h), region))
 
-            # Create a temporary file
-            temp_file = tempfile.NamedTemporaryFile(delete=False, suffix=".tiff")
-            cv2.imwrite(temp_file.name, region)
-            file_paths.append(temp_file.name)
+        return regions
 
-        return file_paths
+    def ocr_region(self, region):
+        """
+        Runs Tesseract over one text block.
 
-    def process_image(self):
+        :param region: The image of the block.
+        :return: The text and the mean word confidence (None if no words were found).
         """
-        Processes the image.
+        # One Tesseract run writes both the plain text and the word table the confidence comes from
+        with tesseract.save(region) as (temp_name, input_filename):
+            tesseract.run_tesseract(
+                input_filename,
+                temp_name,
+                "txt tsv",
+                "eng",
+                config=f"-c tessedit_create_tsv=1 {self.tess_config}",
+            )
+            with open(f"{temp_name}.txt", encoding="utf-8") as f:
+                text = f.read()
+            with open(f"{temp_name}.tsv", encoding="utf-8") as f:
+                tsv = f.read()
+
+        confidences = []
+        for line in tsv.splitlines()[1:]:
+            fields = line.split("\t")
+            if len(fields) == 12 and fields[11].strip():
+                conf = float(fields[10])
+                if conf >= 0:
+                    confidences.append(conf)
+
+        confidence = sum(confidences) / len(confidences) if confidences else None
+        return text.replace("|", "1"), confidence
+
+    def process_regions(self, page=None):
+        """
+        Segments and OCRs the image, keeping each text block separate.
 
-        :return: The full text of the page.
+        :param page: The page number to record on the results.
+        :return: A list of RegionResult in reading order, left column before right.
         """
         if self.split:
             left_col, right_col = self.split_page()
-            left_paths, right_paths = self.process_half(left_col), self.process_half(
-                right_col
-            )
-
-            text = ""
-
-            for tmp_file in left_paths:
-                img = cv2.imread(tmp_file)
-                text += pytesseract.image_to_string(
-                    img, lang="eng", config=tess_config
-                ).replace("|", "1")
-                text += "\n"
-                os.remove(tmp_file)
-            for tmp_file in right_paths:
-                img = cv2.imread(tmp_file)
-                text += pytesseract.image_to_string(
-                    img, lang="eng", config=tess_config
-                ).replace("|", "1")
-                text += "\n"
-                os.remove(tmp_file)
-
-            return text
+            columns = [(0, 0, left_col), (1, left_col.shape[1], right_col)]
         else:
-            processed_paths = self.process_half(self.image)
+            columns = [(0, 0, self.image)]
 
-            text = ""
+        results = []
+        for column, x_offset, image in columns:
+            with span("segment", page=page, column=column) as segment_span:
+                regions = self.find_regions(image, self.profile.kernel, self.profile.min_height)
+                segment_span.set(regions=len(regions))
+            for (x, y, w, h), region in regions:
+                bbox = (x + x_offset, y, w, h)
+                with span("tesseract", page=page, column=column, region=len(results), bbox=bbox):
+                    text, confidence = self.ocr_region(region)
+                results.append(RegionResult(text, page, column, bbox, confidence))
 
-            for tmp_file in processed_paths:
-                img = cv2.imread(tmp_file)
-                text += pytesseract.image_to_string(
-                    img, lang="eng", config=tess_config
-                ).replace("|", "1")
-                text += "\n"
-                os.remove(tmp_file)
+        return results
 
-            return text
+    def process_image(self):
+        """
+        Processes the image.
+
+        :return: The full text of the page.
+        """
+        return regions_to_text(self.process_regions())
 
     @staticmethod
-    def convert_pdf_to_tiff(pdf_path, temp_dir):
-        """Converts the PDF at the input file path to a multipage TIFF image using LZW compression.
+    def count_pages(pdf_path):
+        """Counts the pages of a PDF without rasterizing it.
 
         :param pdf_path: The path to a PDF file.
-        :return: The path to a TIFF image on success or None if there was an error.
+        :return: The number of pages.
         """
-        try:
-            images = convert_from_path(
-                pdf_path,
-                grayscale=True,
-                fmt="tiff",
-                dpi=400,
-            )
+        return int(pdfinfo_from_path(pdf_path)["Pages"])
+
+    @staticmethod
+    def rasterize_page(pdf_path, page_number, dpi=400):
+        """Rasterizes a single page of a PDF, so only the pages being worked on are held in memory.
 
-            # Save TIFF to temp directory to avoid permission issues
-            tiff_name = os.path.basename(pdf_path).replace(".pdf", ".tif")
-            tiff_path = os.path.join(temp_dir, tiff_name)
-
-            if len(images) != 0:
-                images[0].save(
-                    tiff_path,
-                    save_all=True,
-                    append_images=images[1:],
-                    compression="tiff_lzw",
-                )
-            else:
-                logger.error(f"Could not convert {pdf_path} to TIFF.")
-                return None
-
-            return tiff_path
-        except Exception as e:
-            print(f"Error convert PDF to TIFF: {e}")
-            logger.error(f"Error converting {pdf_path} to TIFF: {e}")
-            return None
+        :param pdf_path: The path to a PDF file.
+        :param page_number: The 1-based page number.
+        :param dpi: The resolution to rasterize at.
+        :return: The page as a BGR image.
+        """
+        images = convert_from_path(
+            pdf_path,
+            grayscale=True,
+            dpi=dpi,
+            first_page=page_number,
+            last_page=page_number,
+        )
+        # Straight from the grayscale page to BGR, without the RGB copies in between
+        return cv2.cvtColor(np.asarray(images[0]), cv2.COLOR_GRAY2BGR)
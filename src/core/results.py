@@ -0,0 +1,79 @@
+class RegionResult:
+    """The OCR output of one text region, with where on the page it came from."""
+
+    __slots__ = ("text", "page", "column", "bbox", "confidence")
+
+    def __init__(self, text, page=None, column=0, bbox=None, confidence=None):
+        """
+        :param text: The recognised text.
+        :param page: The 1-based page number.
+        :param column: 0 for the left (or only) column, 1 for the right column.
+        :param bbox: The (x, y, width, height) of the region in page pixels.
+        :param confidence: Tesseract's mean word confidence for the region, 0-100.
+        """
+        self.text = text
+        self.page = page
+        self.column = column
+        self.bbox = bbox
+        self.confidence = confidence
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    @classmethod
+    def from_dict(cls, data):
+        bbox = data.get("bbox")
+        return cls(data["text"], data.get("page"), data.get("column", 0), tuple(bbox) if bbox else None,
+                   data.get("confidence"))
+
+    def __repr__(self):
+        return (
+            f"RegionResult(page={self.page}, column={self.column}, bbox={self.bbox}, "
+            f"confidence={self.confidence}, text={self.text[:30]!r})"
+        )
+
+
+def regions_to_text(regions):
+    """Joins regions into the page text the pipeline used to build by concatenation."""
+    return "".join(region.text + "\n" for region in regions)
+
+
+class PreviewResult:
+    """The parsed rows of a sample of a PDF's pages, with what OCRing the whole PDF should take."""
+
+    __slots__ = ("pdf_path", "pages", "page_count", "rows", "page_seconds", "parallelism")
+
+    def __init__(self, pdf_path, pages, page_count, rows, page_seconds, parallelism=1):
+        """
+        :param pdf_path: The PDF previewed.
+        :param pages: The 1-based numbers of the pages sampled.
+        :param page_count: The number of pages in the PDF.
+        :param rows: The row dicts parsed from the sampled pages.
+        :param page_seconds: The seconds each sampled page took to rasterize and OCR, in the order of pages.
+        :param parallelism: The number of pages a full run OCRs at once.
+        """
+        self.pdf_path = pdf_path
+        self.pages = pages
+        self.page_count = page_count
+        self.rows = rows
+        self.page_seconds = page_seconds
+        self.parallelism = parallelism
+
+    @property
+    def seconds_per_page(self):
+        return sum(self.page_seconds) / len(self.page_seconds) if self.page_seconds else 0.0
+
+    @property
+    def estimated_seconds(self):
+        """The seconds a full run of the PDF should take, extrapolated from the sampled pages."""
+        return self.seconds_per_page * self.page_count / max(1, min(self.parallelism, self.page_count))
+
+    def to_dict(self):
+        return {
+            "pdf_path": self.pdf_path,
+            "pages": self.pages,
+            "page_count": self.page_count,
+            "rows": len(self.rows),
+            "seconds_per_page": round(self.seconds_per_page, 3),
+            "estimated_seconds": round(self.estimated_seconds, 1),
+        }
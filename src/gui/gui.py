@@ -13,6 +13,7 @@ except ImportError:
 
 from tkinterdnd2 import TkinterDnD, DND_FILES
 from src.utils.globals import AppState, FILE_PIC_BASE_64, SDP_LOGO
+from src.utils.profiles import PROFILES
 
 
 class GUI:
@@ -25,7 +26,7 @@ class GUI:
         self.root.title("R&D Labs Directory Parser")
         self.state = AppState.FILE_SELECTION
         self.master.current_state = AppState.FILE_SELECTION
-        self.added_files = []
+        self.added_files = {}  # Used as an ordered set: paths as keys, in the order they were added
         self.selected_files = []
         self.selected_save_paths = set()
         self.result_file_widgets = {}
@@ -50,6 +51,9 @@ class GUI:
         self.drag_drop_label = None
         self.status_label = None
         self.process_button = None
+        self.profile_var = None
+        self.merge_var = None
+        self.output_dir_label = None
         self.main_frame = None
         self.sdp_logo = PhotoImage(data=SDP_LOGO)
         self.file_icon = PhotoImage(data=FILE_PIC_BASE_64)
@@ -195,6 +199,23 @@ class GUI:
         )
         self.select_button.pack(side="right", padx=10)
 
+        self.preview_button = Button(
+            button_frame,
+            text="Preview",
+            command=self.preview_file,
+            font=("Arial", 10, "bold"),
+            bg="#c3c3c7",
+            padx=10,
+            pady=5
+        )
+        self.preview_button.pack(side="right", padx=10)
+
+        self.profile_var = StringVar(self.root, value=self.master.profile)
+        profile_menu = OptionMenu(button_frame, self.profile_var, *PROFILES.keys(), command=self.master.set_profile)
+        profile_menu.config(font=("Arial", 10), padx=10, pady=5)
+        profile_menu.pack(side="right", padx=10)
+        Label(button_frame, text="Profile:", font=("Arial", 10)).pack(side="right")
+
         self.update_page_title("Select Files to Parse")
 
     def create_processing_frame(self):
@@ -299,9 +320,25 @@ class GUI:
         bottom_frame.grid_columnconfigure(0, weight=1)
         bottom_frame.grid_propagate(False)
 
-        status_placeholder = Label(bottom_frame, text="")  # You could repurpose this for summary or status
+        status_placeholder = Label(bottom_frame, text=f"Pipeline profile: {self.master.run_profile}")
         status_placeholder.grid(row=0, column=0, padx=10, sticky="w")
 
+        output_frame = Frame(bottom_frame)
+        output_frame.grid(row=0, column=1, padx=10, sticky="e")
+        self.output_dir_label = Label(output_frame, text=self.output_dir_text(), font=("Arial", 10))
+        self.output_dir_label.pack(side="left")
+        Button(output_frame, text="Change...", command=self.choose_output_dir, font=("Arial", 10)).pack(
+            side="left", padx=5
+        )
+        self.merge_var = BooleanVar(self.root, value=self.master.merge_output)
+        Checkbutton(
+            output_frame,
+            text="Merge into one CSV",
+            variable=self.merge_var,
+            command=lambda: self.master.set_merge_output(self.merge_var.get()),
+            font=("Arial", 10)
+        ).pack(side="left", padx=5)
+
         self.save_button = Button(
             bottom_frame,
             text="Save Parsed Files",
@@ -312,9 +349,19 @@ class GUI:
             padx=10,
             pady=5
         )
-        self.save_button.grid(row=0, column=1, padx=10, sticky="e")
+        self.save_button.grid(row=0, column=2, padx=10, sticky="e")
         self.update_save_button_text()
 
+    def output_dir_text(self):
+        output_dir = self.master.output_dir
+        return f"Save to: {os.path.basename(output_dir) or output_dir}" if output_dir else "Save to: Downloads"
+
+    def choose_output_dir(self):
+        output_dir = filedialog.askdirectory(parent=self.root, mustexist=True)
+        if output_dir:
+            self.master.set_output_dir(output_dir)
+            self.output_dir_label.config(text=self.output_dir_text())
+
     def create_complete_frame(self):
         # Implementation for complete frame goes here.
 
@@ -343,7 +390,7 @@ class GUI:
             if self.is_pdf(file) and file not in self.added_files:
                 if not self.added_files:
                     self.remove_drag_drop_label()
-                self.added_files.append(file)
+                self.added_files[file] = None
                 valid_count += 1
 
         if valid_count > 0:
@@ -361,7 +408,7 @@ class GUI:
             if file not in self.added_files:
                 if not self.added_files:
                     self.remove_drag_drop_label()
-                self.added_files.append(file)
+                self.added_files[file] = None
                 valid_count += 1
             else:
                 self.log_message(f"Skipping previously added file: {file}", "info")
@@ -379,8 +426,7 @@ class GUI:
         removed_count = len(selected_paths)
 
         for file_path in selected_paths:
-            if file_path in self.added_files:
-                self.added_files.remove(file_path)
+            self.added_files.pop(file_path, None)
 
         self.selected_files = []
 
@@ -829,12 +875,46 @@ class GUI:
     def process_files(self):
         if self.status_label:
             self.status_label.config(text="")
-        files_to_process = self.get_selected_files() if self.selected_files else self.added_files
+        files_to_process = self.get_selected_files() if self.selected_files else list(self.added_files)
         if files_to_process:
             self.master.process_files(files_to_process)
         else:
             self.handle_error("Processing Error", "Parsing failed. No PDF files were selected.")
 
+    def preview_file(self):
+        files = self.get_selected_files() if self.selected_files else list(self.added_files)
+        if not files:
+            self.handle_error("Preview Error", "No PDF file was selected to preview.")
+            return
+        self.update_status(f"Previewing {os.path.basename(files[0])}...", "info", True)
+        self.master.preview_file(files[0])
+
+    def show_preview(self, result):
+        """Shows the rows parsed from a sample of a PDF's pages, with the time a full run should take."""
+        minutes = result.estimated_seconds / 60
+        summary = (
+            f"Pages {', '.join(map(str, result.pages))} of {result.page_count}: {len(result.rows)} rows, "
+            f"{result.seconds_per_page:.1f}s per page. Parsing the whole file should take about {minutes:.1f} minutes."
+        )
+        self.update_status(summary, "success", True)
+
+        window = Toplevel(self.root)
+        window.title(f"Preview of {os.path.basename(result.pdf_path)}")
+        window.geometry("760x480")
+        Label(window, text=summary, font=("Arial", 10), anchor="w", justify="left", wraplength=740).pack(
+            fill="x", padx=10, pady=5
+        )
+        text = Text(window, wrap="none", font=("Courier", 9))
+        scrollbar = Scrollbar(window, orient="vertical", command=text.yview)
+        text.configure(yscrollcommand=scrollbar.set)
+        scrollbar.pack(side="right", fill="y")
+        text.pack(expand=True, fill="both", padx=(10, 0), pady=(0, 10))
+        for row in result.rows:
+            text.insert("end", " | ".join(f"{key}: {value}" for key, value in row.items() if value) + "\n\n")
+        if not result.rows:
+            text.insert("end", "No entries were parsed from these pages.")
+        text.configure(state="disabled")
+
     def get_selected_result_paths(self):
         return list(self.selected_save_paths)
 
@@ -1,35 +1,146 @@
 import traceback
 import sys
 import os
-import platform
-import subprocess
 import tempfile
-from concurrent.futures import ThreadPoolExecutor, as_completed
-
-import cv2
-import numpy as np
-from PIL import Image
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 
 from src.utils.config import set_tesseract_path
 from src.core.image_processor import ImageProcessor
-from src.utils.ocr_utils import parse_file_to_csv
-
-if platform.system() == "Windows":
-    import winreg
-
-
-def process_pdf_worker(pdf_path, result_queue):
-    """Standalone worker for multiprocessing."""
-    processor = OCRProcessor(master=None)  # No GUI in multiprocessing context
-    csv_path, text = processor.extract_text_from_pdf(pdf_path)
-    result_queue.put((csv_path, text) if text else None)
+from src.core.results import PreviewResult, RegionResult, regions_to_text
+from src.utils.journal import Journal, file_key
+from src.utils import metrics
+from src.utils.logger import get_logger
+from src.utils.ocr_utils import iter_parsed, parse_file_to_csv, year_from_filename
+from src.utils.output_sink import OutputSink
+from src.utils.profiles import get_profile
+from src.utils.tracing import span
+
+logger = get_logger("ocr")
+
+
+def process_pdf_worker(pdf_path, result_queue, profile=None, journal_dir=None):
+    """Standalone worker for multiprocessing.
+
+    Puts (pdf_path, csv_path, extracted text) on the queue, with None for the text if the PDF failed.
+    """
+    processor = OCRProcessor(master=None, profile=profile)  # No GUI in multiprocessing context
+    if journal_dir:
+        processor.journal = Journal(journal_dir, repair=False)
+    with span("file", file=pdf_path, profile=processor.profile.name):
+        csv_path, text = processor.extract_text_from_pdf(pdf_path)
+    if text and processor.journal is not None:
+        processor.journal.save_file(pdf_path)
+    result_queue.put((pdf_path, csv_path, text or None))
+
+
+def ocr_pdf_page(pdf_path, page_number, split, profile):
+    """Rasterizes and OCRs one page of a PDF.
+
+    :return: A list of RegionResult for the page, in reading order.
+    """
+    with span("page", file=pdf_path, page=page_number) as page_span:
+        with span("rasterize", file=pdf_path, page=page_number, dpi=profile.dpi):
+            image = ImageProcessor.rasterize_page(pdf_path, page_number, dpi=profile.dpi)
+        regions = ImageProcessor(image, split=split, profile=profile).process_regions(page=page_number)
+        page_span.set(regions=len(regions))
+    return regions
+
+
+def iter_page_regions(pdf_path, split, profile, keep_going=False, journal=None):
+    """Yields the OCR regions of each page of a PDF in page order.
+
+    Pages are rasterized and OCR'd by a thread pool, with at most two pages per worker in flight, so memory use
+    does not grow with the length of the document.
+
+    :param pdf_path: The path to a PDF file.
+    :param split: Whether the pages are laid out in two columns.
+    :param profile: The PipelineProfile to run with.
+    :param keep_going: If True, a page that fails is logged and yields a single region holding the error,
+        instead of raising.
+    :param journal: A Journal to save every page OCR'd to, and to read back the pages it already has from.
+    :return: A generator of RegionResult lists, one per page.
+    """
+    num_pages = ImageProcessor.count_pages(pdf_path)
+    max_in_flight = profile.max_workers * 2
+    key = file_key(pdf_path, profile, split) if journal is not None else None
+
+    def ocr_page(page_number):
+        if journal is None:
+            return ocr_pdf_page(pdf_path, page_number, split, profile)
+        regions = journal.load_page(key, page_number)
+        metrics.count_cache("journal", regions is not None)
+        if regions is None:
+            regions = ocr_pdf_page(pdf_path, page_number, split, profile)
+            journal.save_page(key, page_number, regions)
+        return regions
+
+    def result(page_number, future):
+        try:
+            return future.result()
+        except Exception as e:
+            if not keep_going:
+                raise
+            logger.error(f"Failed to process page {page_number} of {pdf_path}: {e}")
+            return [RegionResult(f"\nError: {e}\n", page=page_number)]
+
+    with ThreadPoolExecutor(max_workers=profile.max_workers) as executor:
+        in_flight = deque()
+        for page_number in range(1, num_pages + 1):
+            in_flight.append((page_number, executor.submit(ocr_page, page_number)))
+            if len(in_flight) >= max_in_flight:
+                yield result(*in_flight.popleft())
+        while in_flight:
+            yield result(*in_flight.popleft())
+
+
+def sample_pages(page_count, count, spread=False):
+    """Picks the pages to preview.
+
+    :param page_count: The number of pages in the PDF.
+    :param count: The number of pages to pick, all of them if the PDF is shorter.
+    :param spread: If True, spread the pages evenly from the first to the last, else take the first ones.
+    :return: The sorted 1-based page numbers.
+    """
+    count = min(count, page_count)
+    if not spread or count < 2:
+        return list(range(1, count + 1))
+    return sorted({1 + round(i * (page_count - 1) / (count - 1)) for i in range(count)})
+
+
+def preview_pdf(pdf_path, split, profile, pages=3, spread=False, corrector=None):
+    """OCRs and parses a few pages of a PDF, to check its settings before OCRing all of it.
+
+    The sampled pages are OCR'd one after another with the profile a full run would use, so their rows and timing
+    are those of the full run, except for an entry running over onto a page that wasn't sampled. Nothing is journaled
+    or written.
+
+    :param pages: The number of pages to sample.
+    :param spread: Whether to spread the sampled pages over the PDF instead of taking the first ones.
+    :param corrector: A Corrector passed on to the parser.
+    :return: A PreviewResult.
+    """
+    page_count = ImageProcessor.count_pages(pdf_path)
+    sampled = sample_pages(page_count, pages, spread)
+    regions = []
+    page_seconds = []
+    for page_number in sampled:
+        start = time.perf_counter()
+        regions += ocr_pdf_page(pdf_path, page_number, split, profile)
+        page_seconds.append(time.perf_counter() - start)
+    rows = [row for row, _ in iter_parsed(regions, year_from_filename(pdf_path), corrector)]
+    return PreviewResult(pdf_path, sampled, page_count, rows, page_seconds, parallelism=profile.max_workers)
 
 
 class OCRProcessor:
     """Class to handle OCR operations."""
 
-    def __init__(self, master):
+    def __init__(self, master, profile=None, sink=None, journal=None):
         self.master = master
+        self.profile = get_profile(profile)
+        self.sink = sink or OutputSink()
+        self.journal = journal
         self.temp_dir = tempfile.gettempdir()
         self.test_images_no_split = [
             "1975-a1_1-2.pdf",
@@ -55,81 +166,40 @@ class OCRProcessor:
             self.master.gui.handle_error("Tesseract Error", str(e))
             return None, None
 
-        extracted_text = ""
-        basename = os.path.basename(pdf_path)
-        filename = basename.replace(".pdf", ".csv")
-        downloads_folder = self.get_downloads_folder()
-        csv_path = os.path.join(downloads_folder, filename)
-
-        image_path = ImageProcessor.convert_pdf_to_tiff(pdf_path, self.temp_dir)
-        if image_path is not None:
-            try:
-                with Image.open(image_path) as img:
-                    num_pages = img.n_frames
-
-                    def process_page(i):
-                        img.seek(i)
-                        img_cv2 = np.array(img.convert("RGB"))
-                        img_cv2 = cv2.cvtColor(img_cv2, cv2.COLOR_RGB2BGR)
-                        img_processor = ImageProcessor(
-                            img_cv2,
-                            split=(
-                                False if basename in self.test_images_no_split else True
-                            ),
-                        )
-
-                        processed_text = img_processor.process_image() + "\n"
-
-                        return processed_text
-
-                    with ThreadPoolExecutor(max_workers=4) as executor:
-                        futures = [
-                            executor.submit(process_page, i) for i in range(num_pages)
-                        ]
-                        for future in as_completed(futures):
-                            try:
-                                extracted_text += future.result() + "\n"
-                            except Exception as e:
-                                extracted_text += f"\nError: {e}\n"
-            finally:
-                if os.path.exists(image_path):
-                    try:
-                        os.remove(image_path)
-                    except Exception as e:
-                        self.master.gui.handle_error(
-                            "File Deletion Error",
-                            f"Failed to delete file: {image_path}\n{str(e)}",
-                        )
+        csv_path = self.sink.path_for(pdf_path)
+
+        pages = self.extract_regions_from_pdf(pdf_path)
+        extracted_text = "".join(regions_to_text(regions) + "\n\n" for regions in pages)
 
         return csv_path, extracted_text
 
+    def extract_regions_from_pdf(self, pdf_path):
+        """OCRs a PDF, keeping the text of every region with its page, column, box and confidence.
+
+        :param pdf_path: The path to the PDF file.
+        :return: A list with one list of RegionResult per page, or an empty list if the PDF couldn't be read.
+        """
+        basename = os.path.basename(pdf_path)
+        split = basename not in self.test_images_no_split
+        logger.info(f"Processing {basename} with the '{self.profile.name}' profile")
+        try:
+            return list(iter_page_regions(pdf_path, split, self.profile, keep_going=True, journal=self.journal))
+        except Exception as e:
+            logger.error(f"Error reading {pdf_path}: {e}")
+            return []
+
+    def preview(self, pdf_path, pages=3, spread=False):
+        """OCRs and parses a sample of a PDF's pages, see preview_pdf.
+
+        :return: A PreviewResult.
+        """
+        set_tesseract_path()
+        split = os.path.basename(pdf_path) not in self.test_images_no_split
+        logger.info(f"Previewing {os.path.basename(pdf_path)} with the '{self.profile.name}' profile")
+        return preview_pdf(pdf_path, split, self.profile, pages, spread)
+
     def get_downloads_folder(self):
-        if platform.system() == "Windows":
-            sub_key = (
-                r"SOFTWARE\Microsoft\Windows\CurrentVersion\Explorer\Shell Folders"
-            )
-            downloads_guid = "{374DE290-123F-4565-9164-39C4925E467B}"
-            try:
-                with winreg.OpenKey(winreg.HKEY_CURRENT_USER, sub_key) as key:
-                    return winreg.QueryValueEx(key, downloads_guid)[0]
-            except Exception:
-                return os.path.join(os.path.expanduser("~"), "Downloads")
-
-        elif platform.system() == "Darwin":
-            return os.path.join(os.path.expanduser("~"), "Downloads")
-
-        else:
-            try:
-                xdg_path = (
-                    subprocess.check_output(["xdg-user-dir", "DOWNLOAD"])
-                    .decode()
-                    .strip()
-                )
-                if os.path.exists(xdg_path):
-                    return xdg_path
-            except Exception:
-                pass
-            return os.path.join(os.path.expanduser("~"), "Downloads")
+        return self.sink.output_dir
 
     def save_csv(self, csv_path, extracted_text):
         """Saves the extracted text into the CSV file.
@@ -139,23 +209,18 @@ class OCRProcessor:
         :return: Either the path to the CSV file or None.
         """
         try:
-            # Ensure we're saving to the Downloads folder
-            downloads_folder = self.get_downloads_folder()
-            filename = os.path.basename(csv_path)
-            final_csv_path = os.path.join(downloads_folder, filename)
+            # Ensure we're saving to the output folder, the Downloads folder unless one was picked
+            final_csv_path = self.sink.path_for(csv_path)
 
             # Get the year from the filename if possible (format like "1975-a1_1-2")
-            year = ""
-            if "-" in filename:
-                year_part = filename.split("-")[0]
-                if year_part.isdigit() and len(year_part) == 4:
-                    year = year_part
+            year = year_from_filename(final_csv_path)
 
             parse_file_to_csv(extracted_text, year, final_csv_path)
 
             # Notify the user where the file was saved
             self.master.gui.show_info(
-                "File Saved", f"CSV file saved to:\n{final_csv_path}"
+                "File Saved",
+                f"CSV file saved to:\n{final_csv_path}\n\nPipeline profile: {self.profile.name}",
             )
 
             return final_csv_path
@@ -165,11 +230,24 @@ class OCRProcessor:
             traceback.print_exc(file=sys.stdout)
             return None
 
+    def save_csv_batch(self, files, max_workers=None, normalize=False):
+        """Parses and saves many extracted texts in parallel worker processes, to the files of the output sink.
+
+        :param files: A list of (csv_path, extracted_text) pairs.
+        :param max_workers: The number of worker processes, defaults to the CPU count.
+        :param normalize: If True, clean up phones, ZIPs, states and counts before writing.
+        :return: A list of ExportResult in the same order as files.
+        """
+        return self.sink.export(files, max_workers=max_workers, normalize=normalize)
+
 
 class OCRProcessorNoGUI:
     """Class to handle OCR operations, without GUI. Only meant to be used for the Docker image."""
 
-    def __init__(self):
+    def __init__(self, profile=None, corrector=None, sink=None):
+        self.profile = get_profile(profile)
+        self.corrector = corrector
+        self.sink = sink or OutputSink()
         self.temp_dir = tempfile.gettempdir()
         self.test_images_no_split = [
             "1975-a1_1-2.pdf",
@@ -192,81 +270,43 @@ class OCRProcessorNoGUI:
         try:
             set_tesseract_path()
         except FileNotFoundError as e:
+            logger.error(f"Can't OCR {pdf_path}: {e}")
             return None, None
 
-        extracted_text = ""
-        basename = os.path.basename(pdf_path)
-        filename = basename.replace(".pdf", ".csv")
-        downloads_folder = self.get_downloads_folder()
-        csv_path = os.path.join(downloads_folder, filename)
-
-        image_path = ImageProcessor.convert_pdf_to_tiff(pdf_path, self.temp_dir)
-        if image_path is not None:
-            try:
-                with Image.open(image_path) as img:
-                    num_pages = img.n_frames
-
-                    def process_page(i):
-                        img.seek(i)
-                        img_cv2 = np.array(img.convert("RGB"))
-                        img_cv2 = cv2.cvtColor(img_cv2, cv2.COLOR_RGB2BGR)
-                        img_processor = ImageProcessor(
-                            img_cv2,
-                            split=(
-                                False if basename in self.test_images_no_split else True
-                            ),
-                        )
-
-                        processed_text = img_processor.process_image() + "\n"
-
-                        return processed_text
-
-                    with ThreadPoolExecutor(max_workers=4) as executor:
-                        futures = [
-                            executor.submit(process_page, i) for i in range(num_pages)
-                        ]
-                        for future in as_completed(futures):
-                            try:
-                                extracted_text += future.result() + "\n"
-                            except Exception as e:
-                                extracted_text += f"\nError: {e}\n"
-
-            finally:
-                if os.path.exists(image_path):
-                    try:
-                        os.remove(image_path)
-                    except Exception as e:
-                        print(f"Failed to delete file: {image_path}\n{str(e)}")
+        csv_path = self.sink.path_for(pdf_path)
+
+        pages = self.extract_regions_from_pdf(pdf_path)
+        extracted_text = "".join(regions_to_text(regions) + "\n\n" for regions in pages)
 
         return csv_path, extracted_text
 
+    def extract_regions_from_pdf(self, pdf_path):
+        """OCRs a PDF, keeping the text of every region with its page, column, box and confidence.
+
+        :param pdf_path: The path to the PDF file.
+        :return: A list with one list of RegionResult per page, or an empty list if the PDF couldn't be read.
+        """
+        basename = os.path.basename(pdf_path)
+        split = basename not in self.test_images_no_split
+        logger.info(f"Processing {basename} with the '{self.profile.name}' profile")
+        try:
+            return list(iter_page_regions(pdf_path, split, self.profile, keep_going=True))
+        except Exception as e:
+            logger.error(f"Error reading {pdf_path}: {e}")
+            return []
+
+    def preview(self, pdf_path, pages=3, spread=False):
+        """OCRs and parses a sample of a PDF's pages, see preview_pdf.
+
+        :return: A PreviewResult.
+        """
+        set_tesseract_path()
+        split = os.path.basename(pdf_path) not in self.test_images_no_split
+        logger.info(f"Previewing {os.path.basename(pdf_path)} with the '{self.profile.name}' profile")
+        return preview_pdf(pdf_path, split, self.profile, pages, spread, self.corrector)
+
     def get_downloads_folder(self):
-        if platform.system() == "Windows":
-            sub_key = (
-                r"SOFTWARE\Microsoft\Windows\CurrentVersion\Explorer\Shell Folders"
-            )
-            downloads_guid = "{374DE290-123F-4565-9164-39C4925E467B}"
-            try:
-                with winreg.OpenKey(winreg.HKEY_CURRENT_USER, sub_key) as key:
-                    return winreg.QueryValueEx(key, downloads_guid)[0]
-            except Exception:
-                return os.path.join(os.path.expanduser("~"), "Downloads")
-
-        elif platform.system() == "Darwin":
-            return os.path.join(os.path.expanduser("~"), "Downloads")
-
-        else:
-            try:
-                xdg_path = (
-                    subprocess.check_output(["xdg-user-dir", "DOWNLOAD"])
-                    .decode()
-                    .strip()
-                )
-                if os.path.exists(xdg_path):
-                    return xdg_path
-            except Exception:
-                pass
-            return os.path.join(os.path.expanduser("~"), "Downloads")
+        return self.sink.output_dir
 
     def save_csv(self, csv_path, extracted_text):
         """Saves the extracted text into the CSV file.
@@ -275,18 +315,17 @@ class OCRProcessorNoGUI:
         :param extracted_text: The text to be saved.
         :return: Either the path to the CSV file or None.
         """
+        if not csv_path or extracted_text is None:
+            # extract_text_from_pdf returns (None, None) when Tesseract isn't available
+            print("Nothing to save, no text was extracted")
+            return None
         try:
             # Get the year from the filename if possible (format like "1975-a1_1-2")
-            filename = os.path.basename(csv_path)
-            year = ""
-            if "-" in filename:
-                year_part = filename.split("-")[0]
-                if year_part.isdigit() and len(year_part) == 4:
-                    year = year_part
+            year = year_from_filename(csv_path)
 
             parse_file_to_csv(extracted_text, year, csv_path)
 
-            print(f"Successfully saved to {csv_path}")
+            print(f"Successfully saved to {csv_path} (pipeline profile: {self.profile.name})")
 
             return csv_path
         except Exception as e:
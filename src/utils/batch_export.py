@@ -0,0 +1,203 @@
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import pyarrow.parquet as pq
+
+from src.utils.columnar import SCHEMA, PARQUET_EXTENSIONS, is_columnar_path, rows_to_table, write_columnar, write_partition
+from src.utils.logger import get_logger
+from src.utils.normalize import normalize_records, write_normalized_csv
+from src.utils.ocr_utils import CsvRowWriter, atomic_path, iter_rows, write_csv
+
+logger = get_logger("batch_export")
+
+
+class ExportResult:
+    """The outcome of parsing and writing one file of a batch."""
+
+    __slots__ = ("output_path", "rows", "seconds", "error")
+
+    def __init__(self, output_path, rows=0, seconds=0.0, error=None):
+        self.output_path = output_path
+        self.rows = rows
+        self.seconds = seconds
+        self.error = error
+
+    @property
+    def ok(self):
+        return self.error is None
+
+    def to_dict(self):
+        return {"output_path": self.output_path, "rows": self.rows, "seconds": self.seconds, "error": self.error}
+
+
+def write_rows(rows, output_path, normalize=False):
+    """Writes parsed rows to one file, in the format its extension asks for.
+
+    .parquet, .feather and .arrow are written with a typed schema, anything else as CSV.
+
+    :param rows: An iterable of row dicts, e.g. from iter_rows.
+    :param normalize: If True, clean up the parsed fields with normalize_frame before writing.
+    :return: The number of rows written.
+    """
+    if is_columnar_path(output_path):
+        return write_columnar(rows, output_path, normalize)
+    if normalize:
+        return write_normalized_csv(rows, output_path)
+    return write_csv(rows, output_path)
+
+
+def export_file(text, year, output_path, normalize=False, partitioned=False):
+    """Parses one file's text and writes it out. Runs in a worker process.
+
+    The format follows the extension of output_path: .parquet, .feather and .arrow are written with a typed schema,
+    anything else as CSV.
+
+    :param normalize: If True, clean up the parsed fields with normalize_frame before writing.
+    :param partitioned: If True, output_path is a file inside a dataset partitioned by year, see dataset_file_path.
+    :return: An ExportResult.
+    """
+    start = time.perf_counter()
+    try:
+        if partitioned:
+            rows = write_partition(iter_rows([text], year), output_path, normalize)
+        else:
+            rows = write_rows(iter_rows([text], year), output_path, normalize)
+        return ExportResult(output_path, rows, time.perf_counter() - start)
+    except Exception as e:
+        return ExportResult(output_path, 0, time.perf_counter() - start, f"{type(e).__name__}: {e}")
+
+
+def export_batch(jobs, max_workers=None, max_in_flight=None, normalize=False, partitioned=False):
+    """Parses and writes many files across a process pool.
+
+    At most max_in_flight files are submitted at a time, so the texts of a large batch aren't all copied to the
+    workers at once. Every file is written by one worker to its own path, and results come back in job order, so
+    the output does not depend on scheduling.
+
+    :param jobs: An iterable of (text, year, output_path) tuples.
+    :param max_workers: The number of worker processes, defaults to the CPU count.
+    :param max_in_flight: The number of files submitted but not yet collected, defaults to twice max_workers.
+    :param normalize: If True, clean up the parsed fields with normalize_frame before writing.
+    :param partitioned: If True, the output paths are files of a dataset partitioned by year, see dataset_file_path.
+    :return: A generator of ExportResult, one per job, in job order.
+    """
+    max_workers = max_workers or os.cpu_count() or 1
+    max_in_flight = max_in_flight or max_workers * 2
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        in_flight = deque()
+        for text, year, output_path in jobs:
+            in_flight.append(executor.submit(export_file, text, year, output_path, normalize, partitioned))
+            if len(in_flight) >= max_in_flight:
+                yield _collect(in_flight.popleft())
+        while in_flight:
+            yield _collect(in_flight.popleft())
+
+
+def _collect(future):
+    result = future.result()
+    if result.ok:
+        logger.info(f"Wrote {result.rows} rows to {result.output_path} in {result.seconds:.3f}s")
+    else:
+        logger.error(f"Failed to write {result.output_path}: {result.error}")
+    return result
+
+
+def parse_rows(text, year, normalize=False):
+    """Parses one file's text into rows for a merged output. Runs in a worker process.
+
+    :return: The rows, the seconds taken and the error, None if there was none.
+    """
+    start = time.perf_counter()
+    try:
+        rows = list(iter_rows([text], year))
+        if normalize:
+            rows = normalize_records(rows)
+        return rows, time.perf_counter() - start, None
+    except Exception as e:
+        return [], time.perf_counter() - start, f"{type(e).__name__}: {e}"
+
+
+class MergedWriter:
+    """Appends the rows of every file of a batch to one CSV or Parquet file through a single open handle.
+
+    Parquet gets a row group per file. Like every other output, the file is written under a temporary name and only
+    replaces output_path once the whole batch is in, see atomic_path.
+    """
+
+    def __init__(self, output_path):
+        if is_columnar_path(output_path) and not output_path.lower().endswith(PARQUET_EXTENSIONS):
+            raise ValueError(f"A merged output is written as CSV or Parquet, not {output_path}")
+        self.output_path = output_path
+        self.count = 0
+        self._writer = None
+        self._atomic = None
+
+    def __enter__(self):
+        if is_columnar_path(self.output_path):
+            self._atomic = atomic_path(self.output_path)
+            self._writer = pq.ParquetWriter(self._atomic.__enter__(), SCHEMA)
+        else:
+            self._writer = CsvRowWriter(self.output_path).__enter__()
+        return self
+
+    def write_rows(self, rows):
+        """Appends rows, e.g. one file's.
+
+        :param rows: An iterable of row dicts.
+        :return: The number of rows written.
+        """
+        count = 0
+        if isinstance(self._writer, CsvRowWriter):
+            for row in rows:
+                self._writer.write(row)
+                count += 1
+        else:
+            table = rows_to_table(rows)
+            if table.num_rows:
+                self._writer.write_table(table)
+            count = table.num_rows
+        self.count += count
+        return count
+
+    def __exit__(self, exc_type, exc_value, tb):
+        if self._atomic is None:
+            self._writer.__exit__(exc_type, exc_value, tb)
+        else:
+            self._writer.close()
+            self._atomic.__exit__(exc_type, exc_value, tb)
+        return False
+
+
+def export_merged(jobs, output_path, max_workers=None, max_in_flight=None, normalize=False):
+    """Parses many files across a process pool and writes all of their rows to one file, in job order.
+
+    Workers only parse, the rows are written by this process through one MergedWriter, so nothing is written to the
+    same file from two places.
+
+    :param jobs: An iterable of (text, year, name) tuples, name only being used in the results.
+    :param output_path: The CSV or Parquet file to write.
+    :return: A generator of ExportResult, one per job, in job order, each with the rows its file added.
+    """
+    max_workers = max_workers or os.cpu_count() or 1
+    max_in_flight = max_in_flight or max_workers * 2
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor, MergedWriter(output_path) as writer:
+        in_flight = deque()
+        for text, year, name in jobs:
+            in_flight.append((name, executor.submit(parse_rows, text, year, normalize)))
+            if len(in_flight) >= max_in_flight:
+                yield _append(writer, *in_flight.popleft())
+        while in_flight:
+            yield _append(writer, *in_flight.popleft())
+    logger.info(f"Wrote {writer.count} rows to {output_path}")
+
+
+def _append(writer, name, future):
+    rows, seconds, error = future.result()
+    if error is not None:
+        logger.error(f"Failed to parse {name}: {error}")
+        return ExportResult(writer.output_path, 0, seconds, f"{name}: {error}")
+    return ExportResult(writer.output_path, writer.write_rows(rows), seconds)
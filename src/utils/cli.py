@@ -0,0 +1,576 @@
+"""Headless batch processing: OCRs directory PDFs and writes their parsed entries.
+
+    python -m src.utils.cli input/ "scans/**/*.pdf" -o output --format parquet --workers 4 --summary summary.json
+
+Inputs are PDF files, directories (searched recursively) or glob patterns (** matches any depth). Files are processed
+in parallel by a bounded pool of worker processes, each OCRing its file's pages on a few threads. The summary lists
+every file with its rows, pages, timing and peak RSS.
+
+Files are only handed to a worker while the memory they're estimated to need fits in the budget (--memory-budget,
+by default most of the memory available at the start), otherwise they wait for a running file to finish (see
+src.utils.memory).
+
+Completed pages are journaled in the output directory until the batch finishes, so running the same command again
+after a crash or a reboot resumes from the last page done instead of starting over (see src.utils.journal).
+
+With --watch the inputs are watched for new PDFs until stopped (see src.utils.watch).
+
+With --trace DIR every file, page, Tesseract call and parsed entry is traced, in the workers too, and the spans are
+merged into DIR/trace.json for chrome://tracing (see src.utils.tracing).
+
+With --metrics-port or --metrics-textfile, Prometheus metrics of the run are served or written (see src.utils.metrics).
+
+With --dataset DIR the rows of every PDF go into one Parquet dataset partitioned by year, DIR/year=1985/<name>.parquet,
+which loads back with pandas.read_parquet(DIR) or src.utils.columnar.read_dataset.
+
+With --preview N only N pages of each PDF are OCR'd, their rows printed as CSV as each PDF finishes, and the summary
+estimates how long the full batch would take. Nothing is written to the output directory, and the summary goes to
+stderr unless --summary is given, so the rows can be piped on their own.
+"""
+import argparse
+import copy
+import csv
+import glob
+import json
+import os
+import signal
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import nullcontext
+
+from src.core.results import RegionResult
+from src.ocr import OCRProcessorNoGUI, iter_page_regions, preview_pdf
+from src.utils import metrics, tracing
+from src.utils.batch_export import MergedWriter, write_rows
+from src.utils.columnar import dataset_file_path, write_partition
+from src.utils.config import set_tesseract_path
+from src.utils.correction import Corrector
+from src.utils.dedupe import group_duplicates
+from src.utils.entry_store import EntryStore
+from src.utils.journal import JOURNAL_DIR, Journal
+from src.utils.logger import get_logger
+from src.utils.memory import MB, MemoryGovernor, PeakRSS, estimate_file_bytes
+from src.utils.normalize import normalize_records
+from src.utils.ocr_utils import columns, iter_parsed, year_from_filename
+from src.utils.output_sink import OutputSink
+from src.utils.profiles import DEFAULT_PROFILE, PROFILES, get_profile
+from src.utils.watch import watch
+
+logger = get_logger("cli")
+
+FORMATS = {"csv": ".csv", "parquet": ".parquet", "feather": ".feather"}
+
+
+def expand_inputs(inputs, warn=True):
+    """Finds the PDFs named by files, directories and glob patterns.
+
+    :param inputs: Paths and patterns. Directories are searched recursively, ** in a pattern matches any depth.
+    :param warn: Whether to log the inputs that match nothing.
+    :return: The PDF paths, sorted, each once.
+    """
+    found = set()
+    for item in inputs:
+        if os.path.isdir(item):
+            matches = glob.glob(os.path.join(glob.escape(item), "**", "*"), recursive=True)
+        elif glob.has_magic(item):
+            matches = glob.glob(item, recursive=True)
+        else:
+            matches = [item]
+        for path in matches:
+            if path.lower().endswith(".pdf") and os.path.isfile(path):
+                found.add(os.path.normpath(path))
+        if warn and not matches:
+            logger.warning(f"No files match {item}")
+    return sorted(found)
+
+
+class FileResult:
+    """The outcome of processing one PDF."""
+
+    __slots__ = ("input_path", "output_path", "rows", "pages", "seconds", "error", "duplicate_of", "peak_rss_mb")
+
+    def __init__(self, input_path, output_path=None, rows=0, pages=0, seconds=0.0, error=None, duplicate_of=None,
+                 peak_rss_mb=None):
+        """
+        :param duplicate_of: The PDF with the same content this one's rows were taken from, None if it was OCR'd.
+        :param peak_rss_mb: The peak RSS of the worker and its Tesseract and Poppler processes while OCRing it.
+        """
+        self.input_path = input_path
+        self.output_path = output_path
+        self.rows = rows
+        self.pages = pages
+        self.seconds = seconds
+        self.error = error
+        self.duplicate_of = duplicate_of
+        self.peak_rss_mb = peak_rss_mb
+
+    @property
+    def ok(self):
+        return self.error is None
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+# One processor, corrector and journal per worker process, made by the first file it gets
+_processors = {}
+_correctors = {}
+_journals = {}
+
+
+def _processor(profile, page_workers):
+    key = (profile, page_workers)
+    if key not in _processors:
+        run_profile = copy.copy(get_profile(profile))
+        run_profile.max_workers = page_workers
+        _processors[key] = OCRProcessorNoGUI(profile=run_profile)
+    return _processors[key]
+
+
+def _corrector(vocabulary):
+    if vocabulary and vocabulary not in _correctors:
+        _correctors[vocabulary] = Corrector.load(vocabulary)
+    return _correctors.get(vocabulary)
+
+
+def _journal(journal_dir):
+    if journal_dir and journal_dir not in _journals:
+        _journals[journal_dir] = Journal(journal_dir, repair=False)
+    return _journals.get(journal_dir)
+
+
+def ocr_file(pdf_path, profile, page_workers, vocabulary=None, journal_dir=None, copy_years=()):
+    """OCRs and parses one PDF. Runs in a worker process.
+
+    :param profile: The name of the pipeline profile.
+    :param page_workers: The number of pages OCR'd at once.
+    :param vocabulary: A vocabulary file for Corrector.load, None to not correct.
+    :param journal_dir: The directory of the batch's Journal, None to not journal.
+    :param copy_years: The other years the PDF's copies are named with, its regions are parsed again for each.
+    :return: A FileResult, the (row, page) pairs parsed, and the (row, page) pairs parsed for each copy year.
+    """
+    start = time.perf_counter()
+    result = FileResult(pdf_path)
+    parsed = []
+    copies_parsed = {}
+    kept = []  # Every region, when there are other years to parse them for
+    with tracing.span("file", file=pdf_path, profile=profile) as file_span, PeakRSS() as peak_rss:
+        try:
+            set_tesseract_path()
+            processor = _processor(profile, page_workers)
+            split = os.path.basename(pdf_path) not in processor.test_images_no_split
+
+            def regions():
+                for page in iter_page_regions(pdf_path, split, processor.profile, journal=_journal(journal_dir)):
+                    result.pages += 1
+                    if copy_years:
+                        kept.extend(page)
+                    yield from page
+
+            for row, source in iter_parsed(regions(), year_from_filename(pdf_path), _corrector(vocabulary)):
+                parsed.append((row, source.page if source is not None else None))
+            for year in copy_years:
+                copies_parsed[year] = [
+                    (row, source.page if source is not None else None)
+                    for row, source in iter_parsed(kept, year, _corrector(vocabulary))
+                ]
+        except Exception as e:
+            result.error = f"{type(e).__name__}: {e}"
+        file_span.set(pages=result.pages, rows=len(parsed), error=result.error)
+    result.seconds = time.perf_counter() - start
+    result.peak_rss_mb = peak_rss.peak_mb
+    return result, parsed, copies_parsed
+
+
+def preview_file(pdf_path, profile, page_workers, pages, spread=False, vocabulary=None):
+    """OCRs and parses a sample of one PDF's pages. Runs in a worker process.
+
+    :return: A PreviewResult.
+    """
+    set_tesseract_path()
+    processor = _processor(profile, page_workers)
+    split = os.path.basename(pdf_path) not in processor.test_images_no_split
+    return preview_pdf(pdf_path, split, processor.profile, pages, spread, _corrector(vocabulary))
+
+
+def preview(pdf_paths, pages, spread=False, workers=None, profile=None, page_workers=None, vocabulary=None,
+            out=None):
+    """Previews PDFs in a pool of worker processes, printing the rows of each as soon as it's done.
+
+    The estimate assumes the full batch runs with the same workers and page workers, so it spreads the OCR time of
+    every page over as many pages at once as the CPUs allow.
+
+    :param pdf_paths: The PDFs to preview.
+    :param pages: The number of pages sampled from each PDF.
+    :param spread: Whether to spread the sampled pages over each PDF instead of taking the first ones.
+    :param out: Where to print the rows, defaults to stdout.
+    :return: The JSON summary, with the estimated seconds of the full batch.
+    """
+    out = out or sys.stdout
+    profile = get_profile(profile).name
+    workers = workers or os.cpu_count() or 1
+    page_workers = page_workers or max(1, (os.cpu_count() or 1) // workers)
+
+    previews = []
+    errors = {}
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(preview_file, pdf_path, profile, page_workers, pages, spread, vocabulary)
+            for pdf_path in pdf_paths
+        ]
+        for pdf_path, future in zip(pdf_paths, futures):
+            try:
+                result = future.result()
+            except Exception as e:
+                errors[pdf_path] = f"{type(e).__name__}: {e}"
+                logger.error(f"Failed to preview {pdf_path}: {errors[pdf_path]}")
+                continue
+            previews.append(result)
+            print(f"# {pdf_path}: pages {', '.join(map(str, result.pages))} of {result.page_count}", file=out)
+            writer = csv.DictWriter(out, fieldnames=columns, lineterminator="\n")
+            writer.writeheader()
+            writer.writerows(result.rows)
+            out.flush()
+
+    page_seconds = sum(result.seconds_per_page * result.page_count for result in previews)
+    parallelism = min(workers * page_workers, os.cpu_count() or 1)
+    return {
+        "profile": profile,
+        "files": len(pdf_paths),
+        "failed": len(errors),
+        "pages_sampled": sum(len(result.pages) for result in previews),
+        "pages": sum(result.page_count for result in previews),
+        "estimated_seconds": round(page_seconds / parallelism, 1),
+        "results": [result.to_dict() for result in previews] + [
+            {"pdf_path": pdf_path, "error": error} for pdf_path, error in errors.items()
+        ],
+    }
+
+
+def run(pdf_paths, sink, output_format="csv", workers=None, profile=None, page_workers=None, normalize=False,
+        vocabulary=None, store=None, max_in_flight=None, journal=None, dedupe=True, memory_budget_mb=None,
+        dataset_dir=None):
+    """OCRs PDFs in a pool of worker processes and writes their rows through the sink.
+
+    Workers OCR and parse, this process writes, so the merged file and the store each have one writer. At most
+    max_in_flight files are submitted at a time, fewer if the next one wouldn't fit in the memory budget, and results
+    come back in input order, except that copies of a PDF come right after it. If a worker dies, e.g. killed for
+    using too much memory, the files it took down with the pool fail and the rest go to a new pool.
+
+    :param pdf_paths: The PDFs to process.
+    :param sink: The OutputSink to write to, a file per PDF or one merged file.
+    :param output_format: A key of FORMATS, for the files written per PDF.
+    :param workers: The number of worker processes, defaults to the CPU count.
+    :param page_workers: The number of pages each worker OCRs at once, defaults to an even share of the CPUs.
+    :param vocabulary: A vocabulary file for Corrector.load, None to not correct.
+    :param store: An EntryStore to also upsert every file's rows into.
+    :param max_in_flight: The number of files submitted but not yet written, defaults to twice workers.
+    :param journal: A Journal recording the pages and files done, and holding the pages to resume from.
+    :param dedupe: Whether to OCR PDFs with the same content once, and write its rows under the name of each.
+    :param memory_budget_mb: The memory this process and its workers may use, see MemoryGovernor for the default.
+    :param dataset_dir: Write the rows into a Parquet dataset partitioned by year there, instead of through the sink.
+    :return: A generator of FileResult, one per PDF.
+    """
+    profile = get_profile(profile).name
+    workers = workers or os.cpu_count() or 1
+    page_workers = page_workers or max(1, (os.cpu_count() or 1) // workers)
+    max_in_flight = max_in_flight or workers * 2
+    dpi = get_profile(profile).dpi
+    governor = MemoryGovernor(memory_budget_mb * MB if memory_budget_mb else None)
+    os.makedirs(sink.output_dir, exist_ok=True)
+
+    extension = FORMATS[output_format]
+    journal_dir = journal.journal_dir if journal is not None else None
+    groups = group_duplicates(pdf_paths) if dedupe else {pdf_path: [] for pdf_path in pdf_paths}
+    copies_found = sum(len(copies) for copies in groups.values())
+    metrics.count_cache("dedupe", True, copies_found)
+    metrics.count_cache("dedupe", False, len(groups))
+    waiting = len(groups)
+    metrics.set_queue(waiting, 0, workers)
+    merged_writer = MergedWriter(sink.merged_path) if sink.merge_name else nullcontext()
+    executor = ProcessPoolExecutor(max_workers=workers)
+    try:
+        with merged_writer as merged:
+            in_flight = deque()
+
+            def write_oldest():
+                pdf_path, future, copies, _ = in_flight.popleft()
+                yield from _write(pdf_path, future, copies, sink, extension, normalize, merged, store, journal,
+                                  dataset_dir)
+                metrics.set_queue(waiting, len(in_flight))
+
+            for pdf_path, copies in groups.items():
+                estimate = estimate_file_bytes(pdf_path, dpi, page_workers)
+                # The oldest file is written first anyway, so waiting for it frees memory without reordering results
+                while in_flight and not governor.has_room(
+                    estimate, sum(pending for _, future, _, pending in in_flight if not future.done())
+                ):
+                    yield from write_oldest()
+                # A copy named for another year is parsed as that year's edition, the OCR is the same
+                copy_years = sorted({year_from_filename(copy) for copy in copies} - {year_from_filename(pdf_path)})
+                task = (ocr_file, pdf_path, profile, page_workers, vocabulary, journal_dir, copy_years)
+                try:
+                    future = executor.submit(*task)
+                except BrokenProcessPool:
+                    logger.warning("A worker process died, starting new ones for the files left")
+                    executor.shutdown(wait=False)
+                    executor = ProcessPoolExecutor(max_workers=workers)
+                    future = executor.submit(*task)
+                in_flight.append((pdf_path, future, copies, estimate))
+                waiting -= 1
+                metrics.set_queue(waiting, len(in_flight))
+                if len(in_flight) >= max_in_flight:
+                    yield from write_oldest()
+            while in_flight:
+                yield from write_oldest()
+    finally:
+        executor.shutdown()
+    if governor.pauses:
+        logger.info(f"Files were held back {governor.pauses} times to stay in the {governor.budget / MB:.0f} MB "
+                    f"memory budget, peaking at {governor.peak / MB:.0f} MB")
+
+
+def _write(pdf_path, future, copies, sink, extension, normalize, merged, store, journal, dataset_dir=None):
+    """Writes the rows of an OCR'd PDF, and of each of its copies under their own names.
+
+    Copies get the rows parsed for their own year. In a merged file, which has no column for the name, a copy with
+    the same year as the PDF would only repeat its rows, so it adds none. A PDF whose worker died fails, the pages
+    it journaled are kept for the next run.
+
+    :return: The FileResult of the PDF, followed by one for each copy.
+    """
+    try:
+        result, parsed, copies_parsed = future.result()
+    except BrokenProcessPool as e:
+        result, parsed, copies_parsed = FileResult(pdf_path, error=f"A worker process died: {e}"), [], {}
+    year = year_from_filename(result.input_path)
+    results = [result] + [
+        FileResult(copy, pages=result.pages, error=result.error, duplicate_of=result.input_path) for copy in copies
+    ]
+    for written in results:
+        if not written.ok:
+            continue
+        written_parsed = copies_parsed.get(year_from_filename(written.input_path), parsed)
+        rows = [row for row, _ in written_parsed]
+        with tracing.span("write", file=written.input_path, rows=len(rows)):
+            try:
+                if store is not None:
+                    name = os.path.basename(written.input_path)
+                    store.upsert(name, ((row, RegionResult("", page=page)) for row, page in written_parsed))
+                if merged is not None:
+                    written.output_path = merged.output_path
+                    if written.duplicate_of is None or year_from_filename(written.input_path) != year:
+                        written.rows = merged.write_rows(normalize_records(rows) if normalize else rows)
+                elif dataset_dir is not None:
+                    written_year = year_from_filename(written.input_path)
+                    written.output_path = dataset_file_path(dataset_dir, written_year, written.input_path)
+                    written.rows = write_partition(rows, written.output_path, normalize)
+                else:
+                    written.output_path = sink.path_for(written.input_path, extension)
+                    written.rows = write_rows(rows, written.output_path, normalize)
+                if journal is not None:
+                    journal.save_file(written.input_path, written.output_path, written.rows)
+            except Exception as e:
+                written.error = f"{type(e).__name__}: {e}"
+
+    for written in results:
+        if not written.ok:
+            logger.error(f"Failed to process {written.input_path}: {written.error}")
+        elif written.duplicate_of is not None:
+            logger.info(f"{written.input_path}: a copy of {written.duplicate_of}, {written.pages} pages not OCR'd")
+        else:
+            logger.info(
+                f"{written.input_path}: {written.rows} rows from {written.pages} pages in {written.seconds:.1f}s"
+            )
+    return results
+
+
+def summarize(results, wall_seconds, **settings):
+    """Builds the JSON summary of a run.
+
+    :param results: The FileResult of every file.
+    :param settings: The run's settings, included as they are.
+    """
+    # Only the pages actually OCR'd count towards the speed, copies are reported as the pages they saved
+    pages = sum(result.pages for result in results if result.duplicate_of is None)
+    return {
+        **settings,
+        "files": len(results),
+        "failed": sum(not result.ok for result in results),
+        "rows": sum(result.rows for result in results),
+        "pages": pages,
+        "duplicates": sum(result.duplicate_of is not None for result in results),
+        "pages_skipped": sum(result.pages for result in results if result.duplicate_of is not None),
+        "wall_seconds": round(wall_seconds, 3),
+        "pages_per_second": round(pages / wall_seconds, 3) if wall_seconds else None,
+        "peak_rss_mb": max((result.peak_rss_mb for result in results if result.peak_rss_mb is not None), default=None),
+        "results": [dict(result.to_dict(), seconds=round(result.seconds, 3)) for result in results],
+    }
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("inputs", nargs="+", help="PDF files, directories or glob patterns.")
+    parser.add_argument("-o", "--output-dir", default=".", help="Where to write the output. Default: the current one.")
+    parser.add_argument("-f", "--format", choices=FORMATS, default="csv", help="The format of the per-PDF files.")
+    parser.add_argument("--merge", metavar="NAME", help="Write every PDF's rows into this one .csv or .parquet file.")
+    parser.add_argument("--dataset", metavar="DIR",
+                        help="Write every PDF's rows into one Parquet dataset partitioned by year, DIR/year=1985/.")
+    parser.add_argument("-w", "--workers", type=int, help="PDFs processed at once. Default: the CPU count.")
+    parser.add_argument("--page-workers", type=int, help="Pages OCR'd at once per PDF. Default: CPUs / workers.")
+    parser.add_argument("-p", "--profile", choices=PROFILES, default=DEFAULT_PROFILE, help="The pipeline profile.")
+    parser.add_argument("--normalize", action="store_true", help="Clean up phones, ZIPs, states and counts.")
+    parser.add_argument("--vocabulary", help="Correct cities, states and fields against this vocabulary file.")
+    parser.add_argument("--store", help="Also upsert every file's rows into this SQLite entry store.")
+    parser.add_argument("--summary",
+                        help="Write the JSON summary here. Default: print it, to stderr with --preview.")
+    parser.add_argument("--preview", type=int, metavar="PAGES",
+                        help="Only OCR this many pages of each PDF, print their rows and estimate the full run.")
+    parser.add_argument("--spread", action="store_true",
+                        help="Spread the preview's pages over each PDF instead of taking the first ones.")
+    parser.add_argument("--trace", metavar="DIR",
+                        help="Trace where the time goes into DIR, merged into DIR/trace.json for chrome://tracing.")
+    parser.add_argument("--metrics-port", type=int, help="Serve Prometheus metrics on this port while running.")
+    parser.add_argument("--metrics-host", default="127.0.0.1",
+                        help="The address to serve the metrics on. Default: 127.0.0.1.")
+    parser.add_argument("--metrics-textfile",
+                        help="Write Prometheus metrics to this .prom file for the textfile collector when done.")
+    parser.add_argument("--memory-budget", type=int, metavar="MB",
+                        help="The memory the batch may use, files wait while it's full. Default: 80%% of what's free.")
+    parser.add_argument("--keep-duplicates", action="store_true",
+                        help="OCR every PDF, even those with the same content as another.")
+    parser.add_argument("--no-journal", action="store_true",
+                        help="Don't journal completed pages, so an interrupted batch starts over.")
+    parser.add_argument("--watch", action="store_true", help="Keep processing new PDFs under the inputs until stopped.")
+    parser.add_argument("--interval", type=float, default=2.0, help="Seconds between checks for new PDFs. Default: 2.")
+    parser.add_argument("--settle", type=float, default=5.0,
+                        help="Seconds a PDF must stay unchanged before it's processed. Default: 5.")
+    return parser
+
+
+def watch_inputs(args, sink, store, journal):
+    """Runs watch mode until SIGTERM or Ctrl+C."""
+    stop = threading.Event()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(signum, lambda *_: stop.set())
+
+    def process(pdf_paths):
+        ok = True
+        for result in run(
+            pdf_paths, sink, output_format=args.format, workers=args.workers, profile=args.profile,
+            page_workers=args.page_workers, normalize=args.normalize, vocabulary=args.vocabulary, store=store,
+            journal=journal, dedupe=not args.keep_duplicates, memory_budget_mb=args.memory_budget,
+            dataset_dir=args.dataset,
+        ):
+            ok = ok and result.ok
+            yield result
+        if ok and journal is not None:
+            journal.clear()
+        if args.metrics_textfile:
+            metrics.write_textfile(args.metrics_textfile)
+
+    def list_files(inputs):
+        return expand_inputs(inputs, warn=False)  # Empty until something arrives
+
+    processed = watch(args.inputs, list_files, args.output_dir, process, args.interval, args.settle, stop,
+                      dedupe=not args.keep_duplicates)
+    logger.info(f"Stopped watching, {processed} files processed")
+    return 0
+
+
+def make_journal(args):
+    return None if args.no_journal else Journal(os.path.join(args.output_dir, JOURNAL_DIR))
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.metrics_port or args.metrics_textfile:
+        metrics.enable()
+        if args.metrics_port:
+            metrics.serve(args.metrics_port, args.metrics_host)
+    if args.trace:
+        tracing.enable(args.trace, clear=True)
+    try:
+        return _main(parser, args)
+    finally:
+        if args.trace:
+            logger.info(f"Chrome trace written to {tracing.export_chrome_trace(args.trace)}")
+        if args.metrics_textfile:
+            metrics.write_textfile(args.metrics_textfile)
+        metrics.disable()
+
+
+def _main(parser, args):
+    if args.preview is not None and (args.preview < 1 or args.watch):
+        parser.error("--preview needs at least one page, and can't be used with --watch")
+    if args.merge and args.dataset:
+        parser.error("--merge and --dataset each write all the rows to one place, pick one")
+    if args.watch:
+        if args.merge:
+            parser.error("--merge can't be used with --watch, each batch would replace the merged file")
+        store = EntryStore(args.store) if args.store else None
+        try:
+            return watch_inputs(args, OutputSink(args.output_dir), store, make_journal(args))
+        finally:
+            if store is not None:
+                store.close()
+
+    pdf_paths = expand_inputs(args.inputs)
+    if not pdf_paths:
+        print("No PDF files found", file=sys.stderr)
+        return 2
+
+    if args.preview:
+        summary = preview(
+            pdf_paths, args.preview, spread=args.spread, workers=args.workers, profile=args.profile,
+            page_workers=args.page_workers, vocabulary=args.vocabulary,
+        )
+        logger.info(
+            f"Sampled {summary['pages_sampled']} of {summary['pages']} pages, "
+            f"the full run should take about {summary['estimated_seconds'] / 60:.1f} minutes"
+        )
+        if args.summary:
+            with open(args.summary, "w", encoding="utf-8") as f:
+                json.dump(summary, f, indent=2)
+        else:
+            print(json.dumps(summary, indent=2), file=sys.stderr)  # stdout has the rows
+        return 1 if summary["failed"] else 0
+
+    sink = OutputSink(args.output_dir, args.merge)
+    store = EntryStore(args.store) if args.store else None
+    journal = make_journal(args)
+    start = time.perf_counter()
+    try:
+        results = list(run(
+            pdf_paths, sink, output_format=args.format, workers=args.workers, profile=args.profile,
+            page_workers=args.page_workers, normalize=args.normalize, vocabulary=args.vocabulary, store=store,
+            journal=journal, dedupe=not args.keep_duplicates, memory_budget_mb=args.memory_budget,
+            dataset_dir=args.dataset,
+        ))
+    finally:
+        if store is not None:
+            store.close()
+
+    summary = summarize(
+        results, time.perf_counter() - start, profile=args.profile, format=args.format, merge=args.merge,
+        workers=args.workers or os.cpu_count(), output_dir=os.path.abspath(args.output_dir),
+    )
+    if summary["duplicates"]:
+        logger.info(f"{summary['duplicates']} PDFs were copies of others, {summary['pages_skipped']} pages not OCR'd")
+    if args.summary:
+        with open(args.summary, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+    else:
+        print(json.dumps(summary, indent=2))
+    if journal is not None and not summary["failed"]:
+        journal.clear()  # Everything is written, there's nothing to resume
+    return 1 if summary["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
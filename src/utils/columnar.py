@@ -0,0 +1,115 @@
+import os
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.feather as feather
+import pyarrow.parquet as pq
+
+from src.utils.normalize import COUNT_COLUMNS, normalize_rows
+from src.utils.ocr_utils import atomic_path, columns
+
+PARQUET_EXTENSIONS = (".parquet",)
+FEATHER_EXTENSIONS = (".feather", ".arrow")
+
+# The year directory hive partitioning reads back as null, for files whose name has no year
+UNKNOWN_YEAR_PARTITION = "__HIVE_DEFAULT_PARTITION__"
+
+
+def _column_type(column):
+    if column == "year":
+        return pa.int16()
+    if column in COUNT_COLUMNS:
+        return pa.int32()
+    return pa.string()
+
+
+# One typed field per CSV column, so a dataset reloads with integer years and counts instead of text
+SCHEMA = pa.schema([pa.field(column, _column_type(column)) for column in columns])
+
+
+def is_columnar_path(path):
+    """Tells whether a path asks for Parquet or Feather output instead of CSV."""
+    return path.lower().endswith(PARQUET_EXTENSIONS + FEATHER_EXTENSIONS)
+
+
+def rows_to_table(rows, normalize=False):
+    """Builds an Arrow table with the typed SCHEMA from parsed rows.
+
+    Counts that aren't plain numbers become null, run with normalize=True to rescue OCR misreads first.
+
+    :param rows: An iterable of row dicts, e.g. from iter_rows.
+    :param normalize: If True, clean the rows with normalize_frame first.
+    :return: A pyarrow.Table.
+    """
+    if normalize:
+        df = normalize_rows(rows)
+    else:
+        df = pd.DataFrame.from_records(list(rows), columns=columns)
+    for field in SCHEMA:
+        if pa.types.is_integer(field.type):
+            df[field.name] = pd.to_numeric(df[field.name], errors="coerce").astype(f"Int{field.type.bit_width}")
+        else:
+            df[field.name] = df[field.name].fillna("").astype(str)
+    return pa.Table.from_pandas(df[SCHEMA.names], schema=SCHEMA, preserve_index=False)
+
+
+def write_table(table, output_path):
+    """Writes a table as Parquet or Feather depending on the file extension, atomically, see atomic_path."""
+    with atomic_path(output_path) as temp_path:
+        if output_path.lower().endswith(FEATHER_EXTENSIONS):
+            feather.write_feather(table, temp_path)
+        else:
+            pq.write_table(table, temp_path)
+
+
+def write_columnar(rows, output_path, normalize=False):
+    """Writes parsed rows to a single Parquet (.parquet) or Arrow IPC (.feather, .arrow) file.
+
+    :param rows: An iterable of row dicts, e.g. from iter_rows.
+    :param output_path: The path to the file.
+    :param normalize: If True, clean the rows with normalize_frame first.
+    :return: The number of rows written.
+    """
+    table = rows_to_table(rows, normalize)
+    write_table(table, output_path)
+    return table.num_rows
+
+
+def dataset_file_path(dataset_dir, year, name, extension=".parquet"):
+    """Gets where one input file's rows go in a dataset partitioned by year.
+
+    The layout is hive style, dataset_dir/year=1975/<name>.parquet, so every file of a batch can be written by its own
+    worker and the whole dataset read back with pandas.read_parquet(dataset_dir).
+
+    :param dataset_dir: The root directory of the dataset.
+    :param year: The year of the input file, "" if unknown.
+    :param name: The input file name, its extension is replaced.
+    :return: The path of the file to write.
+    """
+    partition = f"year={year}" if year else f"year={UNKNOWN_YEAR_PARTITION}"
+    return os.path.join(dataset_dir, partition, os.path.splitext(os.path.basename(name))[0] + extension)
+
+
+def write_partition(rows, output_path, normalize=False):
+    """Writes parsed rows to a file inside a dataset made by dataset_file_path.
+
+    The year is left out of the file since the directory it's in holds it.
+
+    :return: The number of rows written.
+    """
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    table = rows_to_table(rows, normalize).drop_columns(["year"])
+    write_table(table, output_path)
+    return table.num_rows
+
+
+def read_dataset(dataset_dir):
+    """Reads a dataset written with dataset_file_path back into one DataFrame, year included.
+
+    :param dataset_dir: The root directory of the dataset.
+    :return: A DataFrame with the columns of columns.
+    """
+    partitioning = ds.partitioning(pa.schema([pa.field("year", pa.int16())]), flavor="hive")
+    table = pq.read_table(dataset_dir, partitioning=partitioning)
+    return table.select(columns).to_pandas()
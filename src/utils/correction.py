@@ -0,0 +1,310 @@
+"""Dictionary correction of the OCR misreads in city, state and fields.
+
+    python -m src.utils.correction vocabulary.json output/*.csv
+
+Mines the vocabulary of cities, states and field of R&D terms from already parsed CSVs and saves it for
+Corrector.load, which parse_entry(..., corrector=...) uses to correct every row it parses.
+"""
+import argparse
+import csv
+import json
+import re
+import sys
+from collections import Counter
+
+from src.utils.logger import get_logger
+from src.utils.normalize import STATE_CODES
+
+logger = get_logger("correction")
+
+_WORD = re.compile(r"[A-Za-z]+")
+
+# Words shorter than this aren't corrected, too many real words are an edit or two apart
+MIN_WORD_LENGTH = 5
+
+
+def edit_distance(a, b, max_distance):
+    """Optimal string alignment distance: insertions, deletions, substitutions and swaps of neighbouring letters.
+
+    :return: The distance, or max_distance + 1 once it's known to be bigger than max_distance.
+    """
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+    previous2 = None
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = a[i - 1] != b[j - 1]
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], previous2[j - 2] + 1)
+        if min(current) > max_distance:
+            return max_distance + 1
+        previous2, previous = previous, current
+    return previous[-1]
+
+
+def _deletes(word, max_distance):
+    """Every string made by deleting up to max_distance characters from word, word included."""
+    found = {word}
+    edge = {word}
+    for _ in range(max_distance):
+        edge = {variant[:i] + variant[i + 1 :] for variant in edge for i in range(len(variant))} - found
+        found |= edge
+    return found
+
+
+class SymSpellIndex:
+    """Finds the closest known term to a misread one without comparing it to every term.
+
+    Every term is stored under all the strings its first prefix_length characters make with up to max_distance
+    deletions. A misread token generates its own deletions, and the terms within max_distance edits of it are among
+    the ones stored under those, so a lookup costs the same however many terms there are.
+    """
+
+    def __init__(self, max_distance=2, prefix_length=7):
+        self.max_distance = max_distance
+        self.prefix_length = prefix_length
+        self.counts = {}
+        self.spellings = {}
+        self.deletes = {}
+
+    def __len__(self):
+        return len(self.counts)
+
+    def __contains__(self, term):
+        return term.casefold() in self.counts
+
+    def add(self, term, count=1):
+        """Adds a term, or adds to its count. The most common spelling of a term is the one suggested."""
+        key = term.casefold()
+        spellings = self.spellings.setdefault(key, Counter())
+        spellings[term] += count
+        if key not in self.counts:
+            self.counts[key] = 0
+            for variant in _deletes(key[: self.prefix_length], self.max_distance):
+                self.deletes.setdefault(variant, []).append(key)
+        self.counts[key] += count
+
+    def lookup(self, token, max_distance=None):
+        """Finds the known term closest to a token, the most common one among equally close terms.
+
+        :param max_distance: The most edits allowed, at most the index's max_distance.
+        :return: A (spelling, distance) pair, or None if no term is close enough or two are equally likely.
+        """
+        max_distance = self.max_distance if max_distance is None else min(max_distance, self.max_distance)
+        key = token.casefold()
+        if key in self.counts:
+            return self.spelling(key), 0
+
+        best = []
+        best_distance = max_distance
+        checked = set()
+        for variant in _deletes(key[: self.prefix_length], max_distance):
+            for term in self.deletes.get(variant, ()):
+                if term in checked:
+                    continue
+                checked.add(term)
+                distance = edit_distance(key, term, best_distance)
+                if distance < best_distance:
+                    best, best_distance = [term], distance
+                elif distance == best_distance:
+                    best.append(term)
+        if not best:
+            return None
+        best.sort(key=lambda term: self.counts[term], reverse=True)
+        if len(best) > 1 and self.counts[best[0]] == self.counts[best[1]]:
+            return None
+        return self.spelling(best[0]), best_distance
+
+    def spelling(self, key):
+        return self.spellings[key].most_common(1)[0][0]
+
+    def to_dict(self):
+        return {spelling: count for spellings in self.spellings.values() for spelling, count in spellings.items()}
+
+
+def _match_case(word, like):
+    if like.isupper():
+        return word.upper()
+    if like.islower():
+        return word.lower()
+    if like.istitle():
+        return word.title()
+    return word
+
+
+def _plural_pair(a, b):
+    """Tells whether one word is the other with an s or es added."""
+    a, b = a.casefold(), b.casefold()
+    return a in (b + "s", b + "es") or b in (a + "s", a + "es")
+
+
+def _max_distance(word):
+    return 1 if len(word) < 9 else 2
+
+
+class Corrector:
+    """Corrects the city, state and fields of parsed rows against a vocabulary mined from earlier output.
+
+    - city: the whole city is looked up, so "Baton Rauge" becomes "Baton Rouge".
+    - state: a state one edit away from the state its city is known to be in becomes that state, otherwise a state
+      that isn't a known code is corrected to the most common code one edit away.
+    - fields: every word of MIN_WORD_LENGTH letters or more that isn't known is corrected, keeping its case. A word is
+      never turned into its own plural or singular, since both are real words.
+
+    Corrections of cities and words already seen are cached, so a batch's recurring misreads are only looked up once.
+    """
+
+    def __init__(self, cities=None, city_states=None, states=None, field_terms=None):
+        """
+        :param cities: A dict of city to the number of rows it was seen in.
+        :param city_states: A dict of city to the state it was seen with most.
+        :param states: A dict of state code to the number of rows it was seen in, on top of STATE_CODES.
+        :param field_terms: A dict of field of R&D word to the number of times it was seen.
+        """
+        self.cities = SymSpellIndex()
+        for city, count in (cities or {}).items():
+            self.cities.add(city, count)
+        self.city_states = {city.casefold(): state for city, state in (city_states or {}).items()}
+        self.states = SymSpellIndex(max_distance=1)
+        for state in STATE_CODES:
+            self.states.add(state)
+        for state, count in (states or {}).items():
+            if state in STATE_CODES:
+                self.states.add(state, count)
+        self.field_terms = SymSpellIndex()
+        for term, count in (field_terms or {}).items():
+            self.field_terms.add(term, count)
+        self.corrections = Counter()
+        self._cities = {}
+        self._words = {}
+
+    @classmethod
+    def from_rows(cls, rows, min_count=2):
+        """Mines the vocabulary from parsed rows.
+
+        Only the cities of rows with a known state are kept, and only the cities and field words seen at least
+        min_count times, so the misreads in the rows mostly stay out of it.
+        """
+        cities, city_states, states, field_terms = Counter(), {}, Counter(), Counter()
+        for row in rows:
+            city, state = (row.get("city") or "").strip(), (row.get("state") or "").strip()
+            if state in STATE_CODES:
+                states[state] += 1
+                if city:
+                    cities[city] += 1
+                    city_states.setdefault(city, Counter())[state] += 1
+            for word in _WORD.findall(row.get("fields") or ""):
+                if len(word) >= MIN_WORD_LENGTH:
+                    field_terms[word.lower()] += 1
+        cities = {city: count for city, count in cities.items() if count >= min_count}
+        return cls(
+            cities=cities,
+            city_states={city: city_states[city].most_common(1)[0][0] for city in cities},
+            states=states,
+            field_terms={term: count for term, count in field_terms.items() if count >= min_count},
+        )
+
+    @classmethod
+    def from_csv_files(cls, csv_paths, min_count=2):
+        def rows():
+            for path in csv_paths:
+                with open(path, newline="", encoding="utf-8") as f:
+                    yield from csv.DictReader(f)
+
+        return cls.from_rows(rows(), min_count)
+
+    def to_dict(self):
+        return {
+            "cities": self.cities.to_dict(),
+            "city_states": {self.cities.spelling(city): state for city, state in self.city_states.items()},
+            "states": {state: count - 1 for state, count in self.states.to_dict().items() if count > 1},
+            "field_terms": self.field_terms.to_dict(),
+        }
+
+    def save(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, indent=1, sort_keys=True)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, encoding="utf-8") as f:
+            corrector = cls(**json.load(f))
+        logger.info(f"Loaded {len(corrector.cities)} cities and {len(corrector.field_terms)} field terms from {path}")
+        return corrector
+
+    def correct_row(self, row):
+        """Corrects a parsed row's city, state and fields in place.
+
+        :return: The row.
+        """
+        city = row["city"]
+        if len(city) >= MIN_WORD_LENGTH and city not in self.cities:
+            corrected = self._cities.get(city)
+            if corrected is None:
+                match = self.cities.lookup(city, _max_distance(city))
+                corrected = self._cities[city] = match[0] if match else city
+            if corrected != city:
+                row["city"] = corrected
+                self.corrections["city"] += 1
+
+        state = row["state"]
+        if state:
+            row["state"] = self._correct_state(state, row["city"])
+
+        if row["fields"]:
+            corrected = _WORD.sub(self._correct_word, row["fields"])
+            if corrected != row["fields"]:
+                row["fields"] = corrected
+                self.corrections["fields"] += 1
+        return row
+
+    def _correct_state(self, state, city):
+        # A valid state is kept, the same city name is found in several states ("Springfield", "Jackson")
+        upper = state.upper()
+        if upper in STATE_CODES:
+            self.corrections["state"] += upper != state
+            return upper
+        # Otherwise the city's state is the likeliest reading when it's an edit away ("PN" for "PA")
+        city_state = self.city_states.get(city.casefold())
+        if city_state and edit_distance(upper, city_state, 1) <= 1:
+            self.corrections["state"] += 1
+            return city_state
+        match = self.states.lookup(upper)
+        if match:
+            self.corrections["state"] += 1
+            return match[0]
+        return state
+
+    def _correct_word(self, match):
+        word = match.group(0)
+        if len(word) < MIN_WORD_LENGTH:
+            return word
+        corrected = self._words.get(word)
+        if corrected is None:
+            corrected = word
+            if word not in self.field_terms:
+                found = self.field_terms.lookup(word, _max_distance(word))
+                if found and not _plural_pair(found[0], word):
+                    corrected = _match_case(found[0], word)
+            self._words[word] = corrected
+        return corrected
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("output_path", help="The JSON file to save the vocabulary to.")
+    parser.add_argument("csv_paths", nargs="+", help="The parsed CSVs to mine.")
+    parser.add_argument("--min-count", type=int, default=2, help="How often a city or word must be seen to be kept.")
+    args = parser.parse_args(argv)
+
+    corrector = Corrector.from_csv_files(args.csv_paths, args.min_count)
+    corrector.save(args.output_path)
+    print(f"{len(corrector.cities)} cities and {len(corrector.field_terms)} field terms saved to {args.output_path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
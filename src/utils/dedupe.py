@@ -0,0 +1,62 @@
+"""Finds input PDFs with the same content, so each scan is OCR'd once however many names it's kept under."""
+import hashlib
+import os
+from collections import defaultdict
+
+SAMPLE_SIZE = 64 * 1024
+
+
+def fast_hash(path, sample_size=SAMPLE_SIZE):
+    """Hashes a file's size with its first and last sample_size bytes.
+
+    Different scans practically never agree on all of these, a PDF's end holding its cross-reference table, so only
+    files with the same fast hash need their full content compared.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    size = os.path.getsize(path)
+    digest.update(size.to_bytes(8, "little"))
+    with open(path, "rb") as f:
+        digest.update(f.read(sample_size))
+        if size > sample_size:
+            f.seek(max(sample_size, size - sample_size))
+            digest.update(f.read(sample_size))
+    return digest.hexdigest()
+
+
+def file_sha256(path, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def group_duplicates(paths):
+    """Groups files with the same content.
+
+    :param paths: The file paths, a path listed twice counts once.
+    :return: A dict from the first path of each distinct content to the later paths with the same content, in the
+        order of paths. A file that can't be read is a group of its own, left to fail where it's processed.
+    """
+    paths = list(dict.fromkeys(paths))
+    candidates = defaultdict(list)
+    for path in paths:
+        try:
+            candidates[fast_hash(path)].append(path)
+        except OSError:
+            candidates[(path,)].append(path)  # Keyed apart from every hash
+
+    groups = {}
+    for same_fast_hash in candidates.values():
+        if len(same_fast_hash) == 1:
+            groups[same_fast_hash[0]] = []
+            continue
+        same_content = defaultdict(list)
+        for path in same_fast_hash:
+            try:
+                same_content[file_sha256(path)].append(path)
+            except OSError:
+                same_content[(path,)].append(path)
+        for copies in same_content.values():
+            groups[copies[0]] = copies[1:]
+    return {path: groups[path] for path in paths if path in groups}
@@ -1,17 +1,82 @@
 import os
+import sys
 
-from src.ocr import OCRProcessorNoGUI as OCRProcessor
+from src.utils.cli import main as cli_main
+from src.utils.task_queue import main as queue_main
+
+
+def docker_args():
+    """Builds the CLI arguments from the environment the Docker image is run with.
+
+    - PIPELINE_PROFILE: the pipeline profile
+    - WORKERS: the number of PDFs processed at once, the CPU count by default
+    - OUTPUT_FORMAT: csv, parquet or feather
+    - OUTPUT_DIR: where to write, /app/output by default
+    - MERGE_OUTPUT=all.csv (or .parquet): write every PDF into that one file
+    - SQLITE_DB=entries.sqlite: also keep every run's rows in entries.sqlite in the output directory
+    - CORRECTION_VOCAB=vocabulary.json: correct cities, states and fields against vocabulary.json in the output
+      directory
+    - WATCH=1: keep processing the PDFs added to /app/input until the container is stopped
+    - METRICS_TEXTFILE=metrics.prom: write Prometheus metrics of the run to metrics.prom in the output directory
+    - METRICS_PORT=9464: serve Prometheus metrics on that port while running, e.g. with WATCH
+    - MEMORY_BUDGET=4096: the MB the batch may use before files wait, by default most of the container's limit
+    - QUEUE_DB=queue.sqlite: share the batch with the other containers using queue.sqlite in the output directory, see
+      queue_args
+
+    The JSON summary of the run is written to summary.json in the output directory, which holds the files named by
+    these variables too.
+    """
+    output_dir = os.getenv("OUTPUT_DIR") or "/app/output"
+    args = ["/app/input", "--output-dir", output_dir, "--summary", os.path.join(output_dir, "summary.json")]
+    for variable, option in (
+        ("PIPELINE_PROFILE", "--profile"),
+        ("WORKERS", "--workers"),
+        ("OUTPUT_FORMAT", "--format"),
+        ("MERGE_OUTPUT", "--merge"),
+    ):
+        if os.getenv(variable):
+            args += [option, os.getenv(variable)]
+    if os.getenv("SQLITE_DB"):
+        args += ["--store", os.path.join(output_dir, os.getenv("SQLITE_DB"))]
+    if os.getenv("CORRECTION_VOCAB"):
+        args += ["--vocabulary", os.path.join(output_dir, os.getenv("CORRECTION_VOCAB"))]
+    if os.getenv("WATCH"):
+        args.append("--watch")
+    if os.getenv("METRICS_TEXTFILE"):
+        args += ["--metrics-textfile", os.path.join(output_dir, os.getenv("METRICS_TEXTFILE"))]
+    if os.getenv("METRICS_PORT"):
+        # Scraped from outside the container
+        args += ["--metrics-port", os.getenv("METRICS_PORT"), "--metrics-host", "0.0.0.0"]
+    if os.getenv("MEMORY_BUDGET"):
+        args += ["--memory-budget", os.getenv("MEMORY_BUDGET")]
+    return args
+
+
+def queue_args():
+    """Builds the arguments of a task_queue worker, for containers sharing one batch through QUEUE_DB.
+
+    Each container adds the PDFs of /app/input that aren't queued yet and works until the queue is done.
+    PIPELINE_PROFILE, WORKERS, OUTPUT_FORMAT, OUTPUT_DIR and CORRECTION_VOCAB work as for docker_args.
+    """
+    output_dir = os.getenv("OUTPUT_DIR") or "/app/output"
+    args = [os.path.join(output_dir, os.getenv("QUEUE_DB")), "/app/input", "--output-dir", output_dir]
+    for variable, option in (
+        ("PIPELINE_PROFILE", "--profile"),
+        ("WORKERS", "--workers"),
+        ("OUTPUT_FORMAT", "--format"),
+    ):
+        if os.getenv(variable):
+            args += [option, os.getenv(variable)]
+    if os.getenv("CORRECTION_VOCAB"):
+        args += ["--vocabulary", os.path.join(output_dir, os.getenv("CORRECTION_VOCAB"))]
+    return args
 
 
 def main():
     if os.path.exists("/app/input"):
-        processor = OCRProcessor()
-        for file in os.listdir("/app/input"):
-            text = processor.extract_text_from_pdf(f"/app/input/{file}")
-            print(text)
-            processor.save_csv(f"/app/output/{file.replace(".pdf", ".csv")}", text[1])
+        sys.exit(queue_main(queue_args()) if os.getenv("QUEUE_DB") else cli_main(docker_args()))
     else:
-        print(f"{os.getenv("INPUT_FILES_DIR")} not found")
+        print(f"{os.getenv('INPUT_FILES_DIR')} not found")
         exit(1)
 
 if __name__ == "__main__":
@@ -0,0 +1,202 @@
+import re
+
+RUN_IN = "run-in"  # Code, title and address run together on the first lines of the entry
+BLOCK = "block"  # Title, street, city line and phone each on their own line
+
+
+def _street_address(match):
+    return match.group(1).strip(), match.group(2).strip(), match.group(3).strip(), match.group(4).strip()
+
+
+def _mailing_address(match):
+    street = f"{match.group(1).strip()} {match.group(4).strip()}"
+    return street, match.group(2).strip(), match.group(3).strip(), match.group(5).strip()
+
+
+def _mail_address(match):
+    street = f"{match.group(1).strip()}, {match.group(5).strip()}"
+    return street, match.group(2).strip(), match.group(3).strip(), match.group(4).strip()
+
+
+CODE = re.compile(r"([A-Z.]*\d+)\s+")
+SUB_CODE = re.compile(r"([A-Z.]*\d+(?:\.\d+)*)\s+")  # Also "A1.1" for the divisions listed under a company
+
+# Title = everything up until the street numbers in the street address
+TITLE = re.compile(r"(.*?),\s*([0-9].*)$")
+TITLE_BEFORE_STREET_OR_BOX = re.compile(r"(.*?),\s*((?:[0-9]|P\.?\s*O\.?\s*Box\b).*)$")
+
+# "12 Main St, Boise, ID 83725."
+STREET_ADDRESS = (
+    re.compile(r"\s*(.*?),\s*([A-Za-z\s]+),\s*([A-Z]{2})\s*([\w\-]{5,10})\."),
+    _street_address,
+)
+# The same without the period, which the 1979 edition leaves off before a tag, "3801 25th Ave, Schiller Park, IL 60176"
+STREET_ADDRESS_OPTIONAL_PERIOD = (
+    re.compile(r"\s*(.*?),\s*([A-Za-z\s]+),\s*([A-Z]{2})\s*([\w\-]{5,10})(?!\w)\.?"),
+    _street_address,
+)
+# "124 N Larch St, Lansing, MI (Mailing add: PO Box 508, 48902)."
+MAILING_ADDRESS = (
+    re.compile(
+        r"\s*(.*?),\s*([A-Za-z\s]+),\s*([A-Z]{2})\s*\(Mailing add:\s*(PO Box \d+),\s*([\w\-]{5,10})\)\.",
+        re.IGNORECASE,
+    ),
+    _mailing_address,
+)
+# "5800 E Pawnee, Wichita, KS 67218 (Mail: PO Box 1521, Wichita, KS 67201)."
+MAIL_ADDRESS = (
+    re.compile(r"\s*(.*?),\s*([A-Za-z\s]+),\s*([A-Z]{2})\s*([\w\-]{5,10})\s*\(Mail:\s*(PO Box \d+)[^)]*\)\."),
+    _mail_address,
+)
+# The street and city of a block entry, on one line or two joined, "P O Box 6767, Baltimore, MD 21204"
+BLOCK_ADDRESS = (
+    re.compile(r"(.*?),\s*([A-Za-z\s]+),\s*([A-Z]{2})\s*([\w\-]{5,10})\.?$"),
+    _street_address,
+)
+
+TEL_PHONE = re.compile(r"Tel:\s*([\d\-]+)")
+TEL_AREA_CODE_PHONE = re.compile(r"Tel:\s*\((\d{3})\)\s*(\d{3})\s*-\s*(\d{4})")
+AREA_CODE_PHONE = re.compile(r"\((\d{3})\)\s*(\d{3})\s*-\s*(\d{4})")
+ANY_DIGITS_PHONE = re.compile(r"\s*([\d\-]+)")
+
+STAFF = re.compile(r"Professional Staff:\s*(\d+)")
+LOWERCASE_STAFF = re.compile(r"Professional staff\s*(\d+):?")
+DOCTORATES = re.compile(r"Doctorates:\s*(\d+)")
+TECHS_AND_AUXS = re.compile(r"Technicians\s*&\s*Auxiliaries:\s*(\d+)")
+TECHS_AND_AUXS_NO_COLON = re.compile(r"Technicians\s*&\s*Auxiliaries:?\s*(\d+)")
+TECHNICIANS_AFTER_COUNT = re.compile(r"(\d+)\s*technicians(?:\s*and\s*auxiliaries)?")
+FIELDS = re.compile(r"Fields of R&D:(.*?)(?=Professional Staff:|$)")
+FIELD = re.compile(r"Fields? of R&D:(.*?)(?=Professional [Ss]taff|$)")
+
+
+# Divisions in the 1975 and 1977 editions are also tagged f, "A1.1 -Electronics Division (pf)"
+OLD_TAGS = ("pf", "f")
+
+
+class EditionProfile:
+    """How the entries of one range of directory editions are laid out.
+
+    Every field is matched with the patterns of its edition only, tried in the order given, so an entry is not
+    run through the patterns of layouts it can't have. A field whose pattern is None isn't printed in the edition.
+    """
+
+    def __init__(self, name, first_year, last_year, layout, code, title, addresses, phones, staff, doctorates,
+                 techs_and_auxs, fields, extra_tags=()):
+        """
+        :param extra_tags: Tags the edition prints besides the usual ones, ranked after them.
+        """
+        self.name = name
+        self.first_year = first_year
+        self.last_year = last_year
+        self.layout = layout
+        self.code = code
+        self.title = title
+        self.addresses = addresses
+        self.phones = phones
+        self.staff = staff
+        self.doctorates = doctorates
+        self.techs_and_auxs = techs_and_auxs
+        self.fields = fields
+        self.extra_tags = extra_tags
+
+    def __repr__(self):
+        return f"EditionProfile({self.name!r}, {self.first_year}-{self.last_year})"
+
+
+# The parser used before edition profiles existed, kept for files whose year is unknown
+DEFAULT_EDITION = EditionProfile(
+    name="default",
+    first_year=None,
+    last_year=None,
+    layout=RUN_IN,
+    code=CODE,
+    title=TITLE,
+    addresses=(STREET_ADDRESS, MAILING_ADDRESS),
+    phones=(TEL_PHONE, ANY_DIGITS_PHONE),
+    staff=STAFF,
+    doctorates=DOCTORATES,
+    techs_and_auxs=TECHS_AND_AUXS,
+    fields=FIELDS,
+)
+
+EDITIONS = [
+    EditionProfile(
+        name="1975",
+        first_year=1900,
+        last_year=1975,
+        layout=BLOCK,
+        code=SUB_CODE,
+        title=None,
+        addresses=(BLOCK_ADDRESS,),
+        phones=(AREA_CODE_PHONE,),
+        staff=LOWERCASE_STAFF,
+        doctorates=None,
+        techs_and_auxs=TECHNICIANS_AFTER_COUNT,
+        fields=FIELD,
+        extra_tags=OLD_TAGS,
+    ),
+    EditionProfile(
+        name="1977",
+        first_year=1976,
+        last_year=1978,
+        layout=RUN_IN,
+        code=SUB_CODE,
+        title=TITLE_BEFORE_STREET_OR_BOX,
+        addresses=(MAIL_ADDRESS, STREET_ADDRESS),
+        phones=(AREA_CODE_PHONE,),
+        staff=LOWERCASE_STAFF,
+        doctorates=None,
+        techs_and_auxs=TECHNICIANS_AFTER_COUNT,
+        fields=FIELD,
+        extra_tags=OLD_TAGS,
+    ),
+    EditionProfile(
+        name="1979",
+        first_year=1979,
+        last_year=1981,
+        layout=RUN_IN,
+        code=SUB_CODE,
+        title=TITLE_BEFORE_STREET_OR_BOX,
+        addresses=(STREET_ADDRESS_OPTIONAL_PERIOD, MAILING_ADDRESS),
+        phones=(TEL_AREA_CODE_PHONE, TEL_PHONE),
+        staff=STAFF,
+        doctorates=None,
+        techs_and_auxs=TECHS_AND_AUXS_NO_COLON,
+        fields=FIELD,
+    ),
+    # From 1982 on the layout is the one the default parser was written against
+    EditionProfile(
+        name="1982",
+        first_year=1982,
+        last_year=2100,
+        layout=RUN_IN,
+        code=CODE,
+        title=TITLE,
+        addresses=DEFAULT_EDITION.addresses,
+        phones=DEFAULT_EDITION.phones,
+        staff=STAFF,
+        doctorates=DOCTORATES,
+        techs_and_auxs=TECHS_AND_AUXS,
+        fields=FIELDS,
+    ),
+]
+
+_EDITION_BY_YEAR = {}
+
+
+def get_edition(year):
+    """Looks up the edition profile for a directory year.
+
+    :param year: The year as a string or int, "" or None if unknown.
+    :return: The matching EditionProfile, or DEFAULT_EDITION.
+    """
+    edition = _EDITION_BY_YEAR.get(year)
+    if edition is None:
+        edition = DEFAULT_EDITION
+        if str(year).isdigit():
+            for candidate in EDITIONS:
+                if candidate.first_year <= int(year) <= candidate.last_year:
+                    edition = candidate
+                    break
+        _EDITION_BY_YEAR[year] = edition
+    return edition
@@ -0,0 +1,253 @@
+import sqlite3
+
+from src.utils.logger import get_logger
+from src.utils.ocr_utils import columns, iter_parsed
+
+logger = get_logger("entry_store")
+
+INTEGER_COLUMNS = ("year", "staff", "doctorates", "numTechsAndAuxs")
+KEY_COLUMNS = ("source_file", "page", "entry")
+
+_COLUMN_DEFINITIONS = ",\n    ".join(
+    f"{column} {'INTEGER' if column in INTEGER_COLUMNS else 'TEXT'}" for column in columns
+)
+_CREATE_TABLE = f"""
+CREATE TABLE IF NOT EXISTS entries (
+    id INTEGER PRIMARY KEY,
+    source_file TEXT NOT NULL,
+    page INTEGER NOT NULL,
+    entry INTEGER NOT NULL,
+    {_COLUMN_DEFINITIONS},
+    UNIQUE (source_file, page, entry)
+)
+"""
+# (state, year) also serves lookups by state alone, and makes "all labs in a state in a year" a single index range
+_CREATE_INDEXES = [
+    "CREATE INDEX IF NOT EXISTS entries_year ON entries (year)",
+    "CREATE INDEX IF NOT EXISTS entries_code ON entries (code)",
+    "CREATE INDEX IF NOT EXISTS entries_state_year ON entries (state, year)",
+    "CREATE INDEX IF NOT EXISTS entries_zip ON entries (zip)",
+    "CREATE INDEX IF NOT EXISTS entries_title ON entries (title)",
+]
+
+# Full-text index over the free-text columns. It reads its content from entries and the triggers keep it in step, so
+# only the rows an upsert inserts, changes or deletes are (re)indexed.
+SEARCH_COLUMNS = ("title", "fields", "leftover")
+_CREATE_SEARCH = [
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS entries_fts USING fts5(
+        {", ".join(SEARCH_COLUMNS)}, content = 'entries', content_rowid = 'id', tokenize = 'porter unicode61'
+    )
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS entries_fts_insert AFTER INSERT ON entries BEGIN
+        INSERT INTO entries_fts (rowid, {", ".join(SEARCH_COLUMNS)})
+        VALUES (new.id, {", ".join(f"new.{column}" for column in SEARCH_COLUMNS)});
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS entries_fts_delete AFTER DELETE ON entries BEGIN
+        INSERT INTO entries_fts (entries_fts, rowid, {", ".join(SEARCH_COLUMNS)})
+        VALUES ('delete', old.id, {", ".join(f"old.{column}" for column in SEARCH_COLUMNS)});
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS entries_fts_update AFTER UPDATE OF {", ".join(SEARCH_COLUMNS)} ON entries BEGIN
+        INSERT INTO entries_fts (entries_fts, rowid, {", ".join(SEARCH_COLUMNS)})
+        VALUES ('delete', old.id, {", ".join(f"old.{column}" for column in SEARCH_COLUMNS)});
+        INSERT INTO entries_fts (rowid, {", ".join(SEARCH_COLUMNS)})
+        VALUES (new.id, {", ".join(f"new.{column}" for column in SEARCH_COLUMNS)});
+    END
+    """,
+]
+
+# Rows whose values are all unchanged aren't rewritten, so a re-run only touches what it parsed differently
+_UPSERT = f"""
+INSERT INTO entries ({", ".join(KEY_COLUMNS + tuple(columns))})
+VALUES ({", ".join("?" for _ in KEY_COLUMNS + tuple(columns))})
+ON CONFLICT (source_file, page, entry) DO UPDATE SET {", ".join(f"{column} = excluded.{column}" for column in columns)}
+WHERE ({", ".join(f"entries.{column}" for column in columns)}) IS NOT ({", ".join(f"excluded.{column}" for column in columns)})
+"""
+
+
+def keyed_rows(parsed):
+    """Numbers parsed entries by page.
+
+    :param parsed: (row, source) pairs from iter_parsed. Entries without a RegionResult source are put on page 0.
+    :return: A generator of (page, entry number on the page, row, source).
+    """
+    page = None
+    number = 0
+    for row, source in parsed:
+        row_page = source.page if source is not None and source.page is not None else 0
+        if row_page != page:
+            page, number = row_page, 0
+        yield row_page, number, row, source
+        number += 1
+
+
+class UpsertResult:
+    """What one file's upsert did to the store."""
+
+    __slots__ = ("source_file", "rows", "changed", "deleted")
+
+    def __init__(self, source_file, rows=0, changed=0, deleted=0):
+        self.source_file = source_file
+        self.rows = rows
+        self.changed = changed
+        self.deleted = deleted
+
+    def to_dict(self):
+        return {"source_file": self.source_file, "rows": self.rows, "changed": self.changed, "deleted": self.deleted}
+
+
+class EntryStore:
+    """Parsed entries of every run in one SQLite database, indexed for lookups and full-text search across years."""
+
+    def __init__(self, db_path, batch_size=500):
+        """
+        :param db_path: The path to the database file, created if it doesn't exist.
+        :param batch_size: The number of rows sent to SQLite per executemany.
+        """
+        self.db_path = db_path
+        self.batch_size = batch_size
+        # Transactions are opened and committed explicitly, one per file
+        self.connection = sqlite3.connect(db_path, isolation_level=None)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.execute("PRAGMA journal_mode = WAL")
+        self.connection.execute("PRAGMA synchronous = NORMAL")
+        self.connection.execute(_CREATE_TABLE)
+        for statement in _CREATE_INDEXES:
+            self.connection.execute(statement)
+
+        has_search = self.connection.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'entries_fts'"
+        ).fetchone()
+        for statement in _CREATE_SEARCH:
+            self.connection.execute(statement)
+        if not has_search:
+            # A store made before the search index existed gets its rows indexed once
+            self.connection.execute("INSERT INTO entries_fts (entries_fts) VALUES ('rebuild')")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.close()
+        return False
+
+    def close(self):
+        self.connection.close()
+
+    def iter_upsert(self, source_file, parsed, result=None):
+        """Upserts a file's parsed entries while passing them through, e.g. on to a CSV writer.
+
+        The whole file is one transaction. Once the entries run out, the ones a previous run stored for the file but
+        this run didn't produce are deleted, and the transaction is committed.
+
+        :param source_file: The name of the input file the entries come from.
+        :param parsed: (row, source) pairs from iter_parsed.
+        :param result: An UpsertResult to fill in with what the upsert did.
+        :return: A generator of the same (row, source) pairs.
+        """
+        result = result if result is not None else UpsertResult(source_file)
+        cursor = self.connection.cursor()
+        batch = []
+        try:
+            cursor.execute("BEGIN")
+            cursor.execute("CREATE TEMP TABLE IF NOT EXISTS seen (page INTEGER, entry INTEGER)")
+            cursor.execute("DELETE FROM seen")
+            for page, number, row, source in keyed_rows(parsed):
+                batch.append((source_file, page, number, *(row[column] for column in columns)))
+                if len(batch) >= self.batch_size:
+                    self._flush(cursor, batch, result)
+                yield row, source
+            self._flush(cursor, batch, result)
+
+            cursor.execute(
+                "DELETE FROM entries WHERE source_file = ? AND NOT EXISTS "
+                "(SELECT 1 FROM seen WHERE seen.page = entries.page AND seen.entry = entries.entry)",
+                (source_file,),
+            )
+            result.deleted = cursor.rowcount
+            cursor.execute("COMMIT")
+        except BaseException:
+            self.connection.rollback()
+            raise
+        logger.info(
+            f"Stored {result.rows} entries of {source_file}: {result.changed} new or changed, {result.deleted} removed"
+        )
+
+    def upsert(self, source_file, parsed):
+        """Upserts a file's parsed entries, see iter_upsert.
+
+        :return: An UpsertResult.
+        """
+        result = UpsertResult(source_file)
+        for _ in self.iter_upsert(source_file, parsed, result):
+            pass
+        return result
+
+    def upsert_text(self, source_file, text, year):
+        """Parses a file's extracted text and upserts its entries.
+
+        :return: An UpsertResult.
+        """
+        return self.upsert(source_file, iter_parsed([text], year))
+
+    def _flush(self, cursor, batch, result):
+        cursor.executemany(_UPSERT, batch)
+        # Counts the rows inserted or updated, not the search index rows the triggers write
+        result.changed += cursor.rowcount
+        cursor.executemany("INSERT INTO seen VALUES (?, ?)", (values[1:3] for values in batch))
+        result.rows += len(batch)
+        batch.clear()
+
+    def find(self, year=None, state=None, code=None, zip=None, title=None, title_prefix=None, limit=None):
+        """Looks up stored entries. Every filter given must match, each one is served by an index.
+
+        :param title_prefix: Matches titles starting with it, case-sensitively.
+        :return: A list of row dicts, with source_file, page and entry besides the columns.
+        """
+        conditions = []
+        parameters = []
+        for column, value in (("year", year), ("state", state), ("code", code), ("zip", zip), ("title", title)):
+            if value is not None:
+                conditions.append(f"{column} = ?")
+                parameters.append(value)
+        if title_prefix:
+            # A range instead of LIKE, which SQLite can't serve from the title index
+            conditions.append("title >= ? AND title < ?")
+            parameters += [title_prefix, title_prefix[:-1] + chr(ord(title_prefix[-1]) + 1)]
+
+        query = f"SELECT {', '.join(KEY_COLUMNS + tuple(columns))} FROM entries"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY year, source_file, page, entry"
+        if limit is not None:
+            query += f" LIMIT {int(limit)}"
+        return [dict(row) for row in self.connection.execute(query, parameters)]
+
+    def search(self, query, year=None, limit=20):
+        """Full-text search over the title, fields and leftover of every stored entry, best matches first.
+
+        :param query: An FTS5 query, e.g. "laser optics", "fields: radar OR sonar" or "microwav*".
+        :param year: Only return entries of this year.
+        :param limit: The maximum number of entries to return.
+        :return: A list of row dicts with source_file, page and entry besides the columns, and a snippet of the match.
+        """
+        sql = (
+            f"SELECT {', '.join(f'entries.{column}' for column in KEY_COLUMNS + tuple(columns))}, "
+            "snippet(entries_fts, -1, '[', ']', '...', 12) AS snippet "
+            "FROM entries_fts JOIN entries ON entries.id = entries_fts.rowid WHERE entries_fts MATCH ?"
+        )
+        parameters = [query]
+        if year is not None:
+            sql += " AND entries.year = ?"
+            parameters.append(year)
+        sql += " ORDER BY rank LIMIT ?"
+        parameters.append(limit)
+        return [dict(row) for row in self.connection.execute(sql, parameters)]
+
+    def count(self):
+        return self.connection.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
@@ -0,0 +1,129 @@
+"""Write-ahead journal of the pages and files a batch has finished, so an interrupted batch resumes where it stopped.
+
+Every page OCR'd is saved with its regions to a file of its own, flushed to disk, and only then recorded in the
+journal, an append-only log of JSON lines. A crash between the two only leaves a page to OCR again. When the batch is
+run again with the same journal, the pages it recorded are read back instead of being OCR'd, so the output comes out
+the same as an uninterrupted run's.
+"""
+import hashlib
+import json
+import os
+import shutil
+import threading
+
+from src.core.results import RegionResult
+from src.utils.logger import get_logger
+from src.utils.ocr_utils import atomic_path
+
+logger = get_logger("journal")
+
+JOURNAL_DIR = ".journal"
+LOG_NAME = "journal.jsonl"
+
+
+def file_key(pdf_path, profile, split):
+    """Identifies the OCR of a PDF by its path, size and modification time and the settings it's OCR'd with.
+
+    A change to any of them gives another key, so the file starts over instead of mixing pages from different runs.
+    """
+    stat = os.stat(pdf_path)
+    settings = (
+        os.path.abspath(pdf_path), stat.st_size, stat.st_mtime_ns, split,
+        profile.name, profile.dpi, profile.psm, profile.oem, profile.tessdata, profile.kernel, profile.min_height,
+    )
+    return hashlib.sha1(repr(settings).encode("utf-8")).hexdigest()[:16]
+
+
+class Journal:
+    """The pages and files completed by a batch, shared by the processes working on it."""
+
+    def __init__(self, journal_dir, repair=True):
+        """
+        :param journal_dir: The directory holding the log and the saved pages, created if needed.
+        :param repair: Whether to drop a record torn by a crash from the end of the log. Only the process that starts
+            the batch should, before its workers append to it.
+        """
+        self.journal_dir = journal_dir
+        self.log_path = os.path.join(journal_dir, LOG_NAME)
+        self.pages = set()  # (file key, page number)
+        self.files = {}  # PDF path: its file record
+        self._fd = None
+        self._lock = threading.Lock()
+        os.makedirs(journal_dir, exist_ok=True)
+        self._replay(repair)
+
+    def _replay(self, repair):
+        if not os.path.exists(self.log_path):
+            return
+        with open(self.log_path, "rb") as f:
+            data = f.read()
+        end = data.rfind(b"\n") + 1
+        if repair and end < len(data):
+            # Cut the torn record off so the next one starts on a line of its own
+            with open(self.log_path, "r+b") as f:
+                f.truncate(end)
+        for line in data[:end].splitlines():
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if record.get("type") == "page":
+                self.pages.add((record["key"], record["page"]))
+            elif record.get("type") == "file":
+                self.files[record["path"]] = record
+        if self.pages:
+            logger.info(f"Resuming from {self.journal_dir}: {len(self.pages)} pages and {len(self.files)} files done")
+
+    def _append(self, record):
+        line = (json.dumps(record) + "\n").encode("utf-8")
+        with self._lock:
+            if self._fd is None:
+                os.makedirs(self.journal_dir, exist_ok=True)  # In case it was cleared since
+                self._fd = os.open(self.log_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            # One write per record, so the records of several processes appending at once don't interleave
+            os.write(self._fd, line)
+            os.fsync(self._fd)
+
+    def _page_path(self, key, page_number):
+        return os.path.join(self.journal_dir, "pages", key, f"{page_number}.json")
+
+    def load_page(self, key, page_number):
+        """Reads back a page the journal recorded.
+
+        :return: The page's list of RegionResult, or None if it wasn't completed.
+        """
+        if (key, page_number) not in self.pages:
+            return None
+        with open(self._page_path(key, page_number), encoding="utf-8") as f:
+            return [RegionResult.from_dict(region) for region in json.load(f)]
+
+    def save_page(self, key, page_number, regions):
+        """Saves a page's regions to disk, then records the page as completed."""
+        path = self._page_path(key, page_number)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with atomic_path(path) as temp_path:
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump([region.to_dict() for region in regions], f)
+                f.flush()
+                os.fsync(f.fileno())
+        self._append({"type": "page", "key": key, "page": page_number})
+        self.pages.add((key, page_number))
+
+    def save_file(self, pdf_path, output_path=None, rows=None):
+        """Records a PDF as completed, with where its rows went."""
+        record = {"type": "file", "path": pdf_path, "output_path": output_path, "rows": rows}
+        self._append(record)
+        self.files[pdf_path] = record
+
+    def close(self):
+        with self._lock:
+            if self._fd is not None:
+                os.close(self._fd)
+                self._fd = None
+
+    def clear(self):
+        """Deletes the journal, once the batch's output is written and nothing is left to resume."""
+        self.close()
+        shutil.rmtree(self.journal_dir, ignore_errors=True)
+        self.pages.clear()
+        self.files.clear()
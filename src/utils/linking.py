@@ -0,0 +1,248 @@
+"""Links the entries of different directory editions that describe the same laboratory.
+
+    python -m src.utils.linking linked.csv 1985-*.csv 1986-*.csv ...
+
+Reads parsed CSVs, and writes all of their rows to one CSV with a lab_id column added.
+"""
+import argparse
+import hashlib
+import sys
+from itertools import combinations
+
+import pandas as pd
+
+from src.utils.logger import get_logger
+from src.utils.normalize import normalize_frame
+from src.utils.ocr_utils import columns
+
+logger = get_logger("linking")
+
+# Words that say what kind of organisation a lab is rather than which one it is
+_TITLE_STOPWORDS = r"\b(?:THE|INC|INCORPORATED|CORP|CORPORATION|CO|COMPANY|LTD|LIMITED|LLC|OF|AND)\b"
+
+TITLE_THRESHOLD = 0.8  # Title similarity that links two entries on its own
+LOCATION_TITLE_THRESHOLD = 0.55  # Title similarity that links two entries in the same ZIP or city
+
+
+class LinkStats:
+    """How much work linking did, against comparing every entry with every other one."""
+
+    __slots__ = ("rows", "blocks", "skipped_blocks", "comparisons", "naive_comparisons", "links", "labs")
+
+    # links counts the merges made, matches between entries already in the same lab aren't counted
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.blocks = 0
+        self.skipped_blocks = 0
+        self.comparisons = 0
+        self.naive_comparisons = rows * (rows - 1) // 2
+        self.links = 0
+        self.labs = 0
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+def normalize_title(titles):
+    """Reduces titles to the words that identify a lab: upper case, no punctuation and no words like INC or THE.
+
+    A sub-entry code the parser left at the start of a title ("B93.2 ACME LABS") is dropped too.
+
+    :param titles: A Series of titles.
+    :return: A Series of normalised titles.
+    """
+    return (
+        titles.str.upper()
+        .str.replace(r"^[A-Z.]*\d+(?:\.\d+)*\s+", "", regex=True)
+        .str.replace(r"[^A-Z0-9 ]", " ", regex=True)
+        .str.replace(_TITLE_STOPWORDS, " ", regex=True)
+        .str.replace(r"\s+", " ", regex=True)
+        .str.strip()
+    )
+
+
+def blocking_keys(df):
+    """Builds the keys that decide which entries get compared. Entries sharing any key are compared.
+
+    - title: the first two words of the normalised title
+    - place: ZIP, or city and state when there is no ZIP, plus the first letter of the title
+    - code: the directory code and state, plus the first letter of the title
+
+    :param df: A normalised DataFrame with a title_key column from normalize_title.
+    :return: A dict of key name to a Series of keys, "" where the entry has no such key.
+    """
+    words = df["title_key"].str.split(" ", n=2)
+    first_letter = df["title_key"].str[:1]
+    zip5 = df["zip"].str[:5]
+    city_state = df["city"].str.upper() + "|" + df["state"]
+    place = zip5.where(zip5 != "", city_state.where((df["city"] != "") & (df["state"] != ""), ""))
+
+    keys = {
+        "title": words.str[0].fillna("") + " " + words.str[1].fillna(""),
+        "place": (place + "|" + first_letter).where((place != "") & (first_letter != ""), ""),
+        "code": (df["code"] + "|" + df["state"] + "|" + first_letter).where((df["code"] != "") & (df["state"] != ""), ""),
+    }
+    keys["title"] = keys["title"].str.strip()
+    return keys
+
+
+def trigrams(text):
+    padded = f"  {text} "
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+def title_similarity(a, b):
+    """Jaccard similarity of the character trigrams of two normalised titles, robust to OCR misreads within words."""
+    if not a or not b:
+        return 0.0
+    shared = len(a & b)
+    return shared / (len(a) + len(b) - shared)
+
+
+def candidate_pairs(df, max_block_size=1000, stats=None):
+    """Finds the pairs of entries that share a blocking key and come from different years.
+
+    Blocks bigger than max_block_size are skipped, they come from keys too common to tell labs apart.
+
+    :param df: A normalised DataFrame with a RangeIndex and a title_key column.
+    :param stats: A LinkStats to count the blocks in.
+    :return: A set of (i, j) row position pairs with i < j.
+    """
+    years = df["year"].to_numpy()
+    pairs = set()
+    for name, keys in blocking_keys(df).items():
+        keys = keys[keys != ""]
+        for key, members in keys.groupby(keys).indices.items():
+            if len(members) < 2:
+                continue
+            if len(members) > max_block_size:
+                logger.warning(f"Skipping the {name} block {key!r} of {len(members)} entries")
+                if stats is not None:
+                    stats.skipped_blocks += 1
+                continue
+            if stats is not None:
+                stats.blocks += 1
+            for i, j in combinations(sorted(keys.index[members]), 2):
+                if years[i] != years[j]:
+                    pairs.add((i, j))
+    return pairs
+
+
+def _find(parents, i):
+    while parents[i] != i:
+        parents[i] = parents[parents[i]]
+        i = parents[i]
+    return i
+
+
+def link_rows(rows, max_block_size=1000):
+    """Links the entries of different directory editions that describe the same laboratory.
+
+    Entries are only compared within blocks (see blocking_keys), never all against all. Two entries of different years
+    are linked when their titles are similar enough, with a lower bar when they share a ZIP or a city. Entries whose
+    ZIP and city are both known and both differ are never linked, and a lab holds at most one entry per edition.
+    Every lab gets an ID made from its earliest entry, so the ID stays the same across runs as long as no earlier
+    edition of the lab is added.
+
+    :param rows: An iterable of row dicts or a DataFrame with the columns of columns.
+    :param max_block_size: Blocks with more entries than this are skipped.
+    :return: The normalised DataFrame with a lab_id column, and the LinkStats.
+    """
+    df = rows if isinstance(rows, pd.DataFrame) else pd.DataFrame.from_records(list(rows), columns=columns)
+    df = normalize_frame(df).reset_index(drop=True)
+    df["title_key"] = normalize_title(df["title"])
+    stats = LinkStats(len(df))
+
+    title_grams = [trigrams(title) for title in df["title_key"]]
+    zips = df["zip"].str[:5].to_numpy()
+    places = (df["city"].str.upper() + "|" + df["state"]).to_numpy()
+
+    matches = []
+    gram_counts = [len(grams) for grams in title_grams]
+    for i, j in candidate_pairs(df, max_block_size, stats):
+        stats.comparisons += 1
+        # The Jaccard similarity can't be above the ratio of the set sizes, so lopsided pairs are settled without it
+        if min(gram_counts[i], gram_counts[j]) < LOCATION_TITLE_THRESHOLD * max(gram_counts[i], gram_counts[j]):
+            continue
+        same_zip = zips[i] and zips[i] == zips[j]
+        same_city = places[i] != "|" and places[i] == places[j]
+        if not (same_zip or same_city) and zips[i] and zips[j] and places[i] != "|" and places[j] != "|":
+            # Known and different locations: divisions of one company share a title but not an address
+            continue
+        similarity = title_similarity(title_grams[i], title_grams[j])
+        same_place = same_zip or same_city
+        if similarity >= TITLE_THRESHOLD or (same_place and similarity >= LOCATION_TITLE_THRESHOLD):
+            matches.append((similarity + same_place, i, j))
+
+    # Best matches are merged first, and a lab never gets two entries of the same edition, since those are two labs
+    # (e.g. a company and one of its divisions)
+    years = df["year"].to_numpy()
+    parents = list(range(len(df)))
+    lab_years = [{year} for year in years]
+    for _, i, j in sorted(matches, reverse=True):
+        root_i, root_j = _find(parents, i), _find(parents, j)
+        if root_i == root_j or lab_years[root_i] & lab_years[root_j]:
+            continue
+        root, other = min(root_i, root_j), max(root_i, root_j)
+        parents[other] = root
+        lab_years[root] |= lab_years[other]
+        stats.links += 1
+
+    # The earliest entry of every lab names it
+    order = pd.to_numeric(df["year"], errors="coerce").sort_values(kind="stable").index
+    earliest = {}
+    for i in order:
+        earliest.setdefault(_find(parents, i), i)
+    identities = (
+        df["year"] + "|" + df["code"] + "|" + df["title_key"] + "|" + df["state"] + "|" + df["zip"]
+    ).to_numpy()
+    lab_ids = {}
+    used = set()
+    for root, first in earliest.items():
+        identity = identities[first]
+        lab_id = "L" + hashlib.sha1(identity.encode("utf-8")).hexdigest()[:10]
+        # Entries printed twice in one edition would name two labs the same
+        suffix = 1
+        while lab_id in used:
+            suffix += 1
+            lab_id = f"{lab_id.split('-')[0]}-{suffix}"
+        used.add(lab_id)
+        lab_ids[root] = lab_id
+
+    df["lab_id"] = [lab_ids[_find(parents, i)] for i in range(len(df))]
+    stats.labs = len(lab_ids)
+    logger.info(
+        f"Linked {stats.rows} entries into {stats.labs} labs with {stats.comparisons:,} comparisons "
+        f"instead of {stats.naive_comparisons:,}"
+    )
+    return df.drop(columns=["title_key"]), stats
+
+
+def link_csv_files(csv_paths, output_path):
+    """Links the rows of parsed CSV files and writes them to one CSV with a lab_id column.
+
+    :param csv_paths: The CSV files, as written by parse_file_to_csv.
+    :param output_path: The CSV file to write.
+    :return: The LinkStats.
+    """
+    frames = [pd.read_csv(path, dtype=str, keep_default_na=False) for path in csv_paths]
+    linked, stats = link_rows(pd.concat(frames, ignore_index=True)[columns])
+    linked.to_csv(output_path, index=False, encoding="utf-8")
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("output_path", help="The CSV to write the linked rows to.")
+    parser.add_argument("csv_paths", nargs="+", help="The parsed CSVs to link.")
+    args = parser.parse_args(argv)
+
+    stats = link_csv_files(args.csv_paths, args.output_path)
+    print(f"{stats.rows} entries, {stats.labs} labs, {stats.comparisons:,} comparisons "
+          f"({stats.naive_comparisons:,} without blocking)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
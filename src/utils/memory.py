@@ -0,0 +1,179 @@
+"""Keeps a batch's memory under a budget by holding back files that wouldn't fit.
+
+Before a PDF goes to a worker, its cost is estimated from the size of its pages at the profile's DPI: every page being
+OCR'd at once holds the rendered page and its working copies, about BYTES_PER_PIXEL bytes per pixel, and runs a
+Tesseract of its own. MemoryGovernor compares the estimate with the RSS of this process and its workers, and with the
+memory the system (or the container's cgroup) has left, and a file is only started if it fits. Otherwise the caller
+waits for a running file to finish first. A file is always started when nothing else is running, so a budget smaller
+than one file slows a batch down to one file at a time but never stops it.
+
+RSS counts the pages a forked worker shares with this process in both, so the measure errs on the high side.
+"""
+import os
+import threading
+
+import psutil
+from pdf2image import pdfinfo_from_path
+
+from src.utils import metrics
+from src.utils.logger import get_logger
+
+logger = get_logger("memory")
+
+MB = 1024 * 1024
+# The PIL page, its array and the BGR copy, then the grayscale, threshold and dilation of each column
+BYTES_PER_PIXEL = 6
+TESSERACT_BYTES = 100 * MB  # A Tesseract process with the English model loaded
+LETTER_POINTS = (612.0, 792.0)  # Assumed for a PDF pdfinfo can't read, it fails in the worker anyway
+DEFAULT_SHARE = 0.8  # Of the memory available when the batch starts
+MIN_AVAILABLE_BYTES = 256 * MB  # Always left to the rest of the system
+
+CGROUP_FILES = (
+    ("/sys/fs/cgroup/memory.max", "/sys/fs/cgroup/memory.current"),  # cgroup v2
+    ("/sys/fs/cgroup/memory/memory.limit_in_bytes", "/sys/fs/cgroup/memory/memory.usage_in_bytes"),  # cgroup v1
+)
+
+
+def _read_bytes(path):
+    try:
+        with open(path) as f:
+            return int(f.read().strip())
+    except (OSError, ValueError):
+        return None  # Missing, or "max" for no limit
+
+
+def available_bytes():
+    """:return: The memory left to use, within the container's cgroup limit if there is one."""
+    available = psutil.virtual_memory().available
+    for limit_path, usage_path in CGROUP_FILES:
+        limit, usage = _read_bytes(limit_path), _read_bytes(usage_path)
+        if limit is not None and usage is not None:
+            return min(available, max(0, limit - usage))
+    return available
+
+
+def tree_rss(process):
+    """Adds up the RSS of a process and of the processes it started.
+
+    A child still running the same command line is between a fork and running Tesseract or Poppler, and still in the
+    process's own memory, so it isn't counted again.
+    """
+    rss = process.memory_info().rss
+    cmdline = process.cmdline()
+    for child in process.children(recursive=True):
+        try:
+            if child.cmdline() != cmdline:
+                rss += child.memory_info().rss
+        except psutil.Error:
+            pass  # It finished in between
+    return rss
+
+
+def page_bytes(width, height, dpi):
+    """Estimates the memory OCRing one page takes.
+
+    :param width: The page width in points.
+    :param height: The page height in points.
+    :return: The bytes.
+    """
+    pixels = (width / 72 * dpi) * (height / 72 * dpi)
+    return int(pixels * BYTES_PER_PIXEL) + TESSERACT_BYTES
+
+
+def estimate_file_bytes(pdf_path, dpi, page_workers):
+    """Estimates the memory a worker needs for a PDF, from the size of its first page.
+
+    :param page_workers: The number of pages the worker OCRs at once.
+    :return: The bytes.
+    """
+    try:
+        info = pdfinfo_from_path(pdf_path)
+        width, height = (float(size) for size in info["Page size"].split()[0:3:2])  # "612 x 792 pts (letter)"
+        pages = int(info["Pages"])
+    except Exception:
+        (width, height), pages = LETTER_POINTS, page_workers
+    return max(1, min(pages, page_workers)) * page_bytes(width, height, dpi)
+
+
+class MemoryGovernor:
+    """Decides whether another file fits in the memory budget of this process and its workers."""
+
+    def __init__(self, budget_bytes=None, min_available_bytes=MIN_AVAILABLE_BYTES):
+        """
+        :param budget_bytes: The most this process and its workers may use together, defaults to DEFAULT_SHARE of
+            the memory available now plus what this process uses already.
+        :param min_available_bytes: The memory always left to the rest of the system.
+        """
+        self._process = psutil.Process()
+        self.baseline = self.rss()
+        self.budget = budget_bytes or int((available_bytes() + self.baseline) * DEFAULT_SHARE)
+        self.min_available = min_available_bytes
+        self.peak = self.baseline
+        self.pauses = 0
+        self._paused = False
+
+    def rss(self):
+        """:return: The RSS of this process and of each worker with the Tesseract and Poppler processes it started."""
+        rss = self._process.memory_info().rss
+        for child in self._process.children():
+            try:
+                rss += tree_rss(child)
+            except psutil.Error:
+                pass
+        return rss
+
+    def has_room(self, estimate, pending=0):
+        """Checks whether a file estimated to need estimate bytes can start now.
+
+        :param pending: The estimates of the files started and not done yet, which may not show in the RSS yet.
+        """
+        rss = self.rss()
+        self.peak = max(self.peak, rss)
+        unallocated = max(0, self.baseline + pending - rss)
+        room = (rss + unallocated + estimate <= self.budget
+                and available_bytes() - unallocated - estimate >= self.min_available)
+        metrics.set_memory(rss, self.budget)
+        if not room and not self._paused:
+            self.pauses += 1
+            metrics.count_pause()
+            logger.info(f"Using {rss / MB:.0f} MB of the {self.budget / MB:.0f} MB budget, "
+                        f"waiting for a file to finish before starting one needing {estimate / MB:.0f} MB")
+        self._paused = not room
+        return room
+
+
+class PeakRSS:
+    """Samples the RSS of this process and its children in the background to find their peak while in use."""
+
+    def __init__(self, sample_seconds=0.05):
+        self.peak = 0
+        self.sample_seconds = sample_seconds
+        self._process = psutil.Process(os.getpid())
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def peak_mb(self):
+        return round(self.peak / MB, 1)
+
+    def _sample(self):
+        try:
+            self.peak = max(self.peak, tree_rss(self._process))
+        except psutil.Error:
+            pass
+
+    def _sample_until_stopped(self):
+        while not self._stop.wait(self.sample_seconds):
+            self._sample()
+
+    def __enter__(self):
+        self._sample()
+        self._thread = threading.Thread(target=self._sample_until_stopped, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+        self._sample()
+        return False
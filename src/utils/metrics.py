@@ -0,0 +1,182 @@
+"""Prometheus metrics of headless runs, served over HTTP or written for the node exporter's textfile collector.
+
+    python -m src.utils.cli input/ -o output --watch --metrics-port 9464
+    python -m src.utils.cli input/ -o output --metrics-textfile /var/lib/node_exporter/textfile/ocr.prom
+
+The pipeline's tracing spans (see src.utils.tracing) feed the metrics, so they come from the same places:
+
+    ocr_pages_total, ocr_regions_total          pages and regions OCR'd
+    ocr_files_total{status}                     files processed, ok or failed
+    ocr_tesseract_seconds                       the latency of every Tesseract call
+    ocr_stage_seconds{stage}                    file, page, rasterize, segment, tesseract, parse and write durations
+    ocr_failures_total{stage,type}              failures by the stage they happened in and the exception type
+    ocr_cache_requests_total{cache,result}      hits and misses of the journal's pages and of duplicate PDFs
+    ocr_queue_depth, ocr_files_in_flight        files waiting to be submitted, and submitted but not written yet
+    ocr_workers                                 worker processes
+    ocr_memory_bytes, ocr_memory_budget_bytes   the RSS of the batch when a file was last started, and its budget
+    ocr_admission_pauses_total                  times files were held back to stay in the budget (see src.utils.memory)
+
+Worker processes write their numbers to files in a shared directory, prometheus_client's multiprocess mode, and the
+endpoint and the text file add them up, so the numbers cover every process. The directory is found through
+OCR_METRICS_DIR, which enable() sets for the processes started after it.
+"""
+import glob
+import os
+import shutil
+import tempfile
+
+from src.utils import tracing
+from src.utils.logger import get_logger
+
+logger = get_logger("metrics")
+
+METRICS_ENV = "OCR_METRICS_DIR"
+MULTIPROC_ENV = "PROMETHEUS_MULTIPROC_DIR"
+
+# Seconds, from a small region on a fast profile to a slow page at 600 DPI
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+_metrics = None
+_temp_dir = None  # The directory enable() made, deleted by disable()
+
+
+class PipelineMetrics:
+    """The metric objects, created once multiprocess mode is set up."""
+
+    def __init__(self, metrics_dir):
+        from prometheus_client import Counter, Gauge, Histogram, values
+
+        # The value class is picked from the environment when prometheus_client is first imported, which may have
+        # been before the directory was set
+        values.ValueClass = values.MultiProcessValue()
+        self.metrics_dir = metrics_dir
+        self.pages = Counter("ocr_pages", "Pages OCR'd.", registry=None)
+        self.regions = Counter("ocr_regions", "Text regions OCR'd.", registry=None)
+        self.files = Counter("ocr_files", "Files processed.", ["status"], registry=None)
+        self.tesseract = Histogram("ocr_tesseract_seconds", "Tesseract call latency.", buckets=LATENCY_BUCKETS,
+                                   registry=None)
+        self.stages = Histogram("ocr_stage_seconds", "Duration of each stage of the pipeline.", ["stage"],
+                                buckets=LATENCY_BUCKETS, registry=None)
+        self.failures = Counter("ocr_failures", "Failures by stage and exception type.", ["stage", "type"],
+                                registry=None)
+        self.cache = Counter("ocr_cache_requests", "Cache lookups by cache and result.", ["cache", "result"],
+                             registry=None)
+        self.queue_depth = Gauge("ocr_queue_depth", "Files waiting to be submitted to the workers.",
+                                 multiprocess_mode="livesum", registry=None)
+        self.in_flight = Gauge("ocr_files_in_flight", "Files submitted to the workers but not written yet.",
+                               multiprocess_mode="livesum", registry=None)
+        self.workers = Gauge("ocr_workers", "Worker processes.", multiprocess_mode="livesum", registry=None)
+        self.memory = Gauge("ocr_memory_bytes", "RSS of the batch and its workers at the last admission check.",
+                            multiprocess_mode="livemax", registry=None)
+        self.memory_budget = Gauge("ocr_memory_budget_bytes", "The memory budget of the batch.",
+                                   multiprocess_mode="livemax", registry=None)
+        self.pauses = Counter("ocr_admission_pauses", "Times files were held back to stay in the memory budget.",
+                              registry=None)
+
+    def observe(self, name, seconds, attributes):
+        self.stages.labels(name).observe(seconds)
+        error = attributes.get("error")
+        if error:
+            self.failures.labels(name, error.split(":", 1)[0]).inc()
+        if name == "tesseract":
+            self.tesseract.observe(seconds)
+        elif name == "page" and not error:
+            self.pages.inc()
+            self.regions.inc(attributes.get("regions", 0))
+        elif name == "file":
+            self.files.labels("failed" if error else "ok").inc()
+
+
+def is_enabled():
+    return _metrics is not None
+
+
+def enable(metrics_dir=None, clear=False):
+    """Turns the metrics on for this process and the processes it starts from now on.
+
+    :param metrics_dir: The directory shared with the worker processes, a new temporary one by default.
+    :param clear: Whether to delete the numbers of earlier runs from the directory first.
+    :return: The directory.
+    """
+    global _metrics, _temp_dir
+    if metrics_dir is None:
+        metrics_dir = _temp_dir = tempfile.mkdtemp(prefix="ocr-metrics-")
+    metrics_dir = os.path.abspath(metrics_dir)
+    os.makedirs(metrics_dir, exist_ok=True)
+    if clear:
+        for path in glob.glob(os.path.join(metrics_dir, "*.db")):
+            os.remove(path)
+    os.environ[METRICS_ENV] = os.environ[MULTIPROC_ENV] = metrics_dir
+    if _metrics is not None:
+        tracing.remove_observer(_metrics.observe)
+    _metrics = PipelineMetrics(metrics_dir)
+    tracing.add_observer(_metrics.observe)
+    return metrics_dir
+
+
+def disable():
+    global _metrics, _temp_dir
+    if _metrics is not None:
+        tracing.remove_observer(_metrics.observe)
+    _metrics = None
+    os.environ.pop(METRICS_ENV, None)
+    os.environ.pop(MULTIPROC_ENV, None)
+    if _temp_dir is not None:
+        shutil.rmtree(_temp_dir, ignore_errors=True)
+        _temp_dir = None
+
+
+def count_cache(cache, hit, amount=1):
+    """Counts lookups of a cache, e.g. the journal's pages."""
+    if _metrics is not None and amount:
+        _metrics.cache.labels(cache, "hit" if hit else "miss").inc(amount)
+
+
+def set_queue(waiting, in_flight, workers=None):
+    """Records how many files wait to be submitted and how many are being worked on."""
+    if _metrics is not None:
+        _metrics.queue_depth.set(waiting)
+        _metrics.in_flight.set(in_flight)
+        if workers is not None:
+            _metrics.workers.set(workers)
+
+
+def set_memory(rss, budget):
+    """Records the memory of the batch and its budget when deciding whether to start a file."""
+    if _metrics is not None:
+        _metrics.memory.set(rss)
+        _metrics.memory_budget.set(budget)
+
+
+def count_pause():
+    if _metrics is not None:
+        _metrics.pauses.inc()
+
+
+def registry():
+    """:return: A CollectorRegistry adding up the numbers of every process."""
+    from prometheus_client import CollectorRegistry
+    from prometheus_client.multiprocess import MultiProcessCollector
+
+    collected = CollectorRegistry()
+    MultiProcessCollector(collected, path=_metrics.metrics_dir)
+    return collected
+
+
+def serve(port, host="127.0.0.1"):
+    """Serves the metrics on http://host:port/metrics from a background thread."""
+    from prometheus_client import start_http_server
+
+    start_http_server(port, host, registry=registry())
+    logger.info(f"Serving metrics on http://{host}:{port}/metrics")
+
+
+def write_textfile(path):
+    """Writes the metrics for the textfile collector, replacing the file in one step so it's never read half done."""
+    from prometheus_client import write_to_textfile
+
+    write_to_textfile(path, registry())
+
+
+if os.environ.get(METRICS_ENV) and _metrics is None:
+    enable(os.environ[METRICS_ENV])
@@ -0,0 +1,111 @@
+import pandas as pd
+
+from src.utils.ocr_utils import atomic_path, columns
+
+# USPS codes for the states, DC and the territories, and the Canadian provinces that appear in the directories
+STATE_CODES = {
+    "AL", "AK", "AZ", "AR", "CA", "CO", "CT", "DE", "DC", "FL", "GA", "HI", "ID", "IL", "IN", "IA", "KS", "KY", "LA",
+    "ME", "MD", "MA", "MI", "MN", "MS", "MO", "MT", "NE", "NV", "NH", "NJ", "NM", "NY", "NC", "ND", "OH", "OK", "OR",
+    "PA", "RI", "SC", "SD", "TN", "TX", "UT", "VT", "VA", "WA", "WV", "WI", "WY", "PR", "VI", "GU", "AS", "MP",
+    "AB", "BC", "MB", "NB", "NL", "NS", "NT", "NU", "ON", "PE", "QC", "SK", "YT",
+}
+
+COUNT_COLUMNS = ["staff", "doctorates", "numTechsAndAuxs"]
+
+# Letters Tesseract reads in place of digits, only undone in columns that hold nothing but digits
+_DIGIT_LOOKALIKES = str.maketrans({"O": "0", "o": "0", "D": "0", "Q": "0", "I": "1", "l": "1", "i": "1", "|": "1",
+                                   "S": "5", "s": "5", "B": "8", "Z": "2", "z": "2"})
+
+
+def normalize_rows(rows):
+    """Loads parsed rows into a DataFrame and normalises it, see normalize_frame.
+
+    :param rows: An iterable of row dicts, e.g. from iter_rows.
+    :return: The normalised DataFrame, with columns in the order of columns.
+    """
+    return normalize_frame(pd.DataFrame.from_records(list(rows), columns=columns))
+
+
+def normalize_frame(df):
+    """Cleans up the parsed fields of a whole batch of rows at once.
+
+    Every step is a vectorised string operation over a column, so a corpus of many years normalises in one pass.
+
+    - Runs of whitespace are collapsed and stray separators (",;:*") are trimmed from the ends of every field. A
+      leftover of nothing but separators is cleared.
+    - Phones become "AAA-NNN-NNNN" (or "NNN-NNNN" without an area code), ZIPs "NNNNN" or "NNNNN-NNNN". Values that
+      don't have the right number of digits are left as they are.
+    - States are upper-cased and checked against STATE_CODES. Unknown ones are cleared and moved to leftover.
+    - staff, doctorates and numTechsAndAuxs become nullable integers.
+
+    :param df: A DataFrame with the columns of columns.
+    :return: A new, normalised DataFrame.
+    """
+    df = df.fillna("").astype(str)
+
+    text_columns = [column for column in columns if column not in COUNT_COLUMNS and column != "leftover"]
+    for column in text_columns:
+        df[column] = (
+            df[column].str.replace(r"\s+", " ", regex=True).str.strip().str.strip(",;:* ")
+        )
+    # What's left over once the fields are cut out is often only the separators that were between them
+    leftover = df["leftover"].str.replace(r"\s+", " ", regex=True).str.strip()
+    df["leftover"] = leftover.where(leftover.str.strip(".,;:* ") != "", "")
+    # The period that ends an entry's last sentence isn't part of the field
+    for column in ("street", "city", "state", "zip", "phone", "fields"):
+        df[column] = df[column].str.rstrip(". ")
+
+    df["phone"] = _normalize_phones(df["phone"])
+    df["zip"] = _normalize_zips(df["zip"])
+
+    state = df["state"].str.upper()
+    unknown = (state != "") & ~state.isin(STATE_CODES)
+    df["leftover"] = df["leftover"].where(~unknown, df["leftover"].str.cat(df["state"], sep=" ").str.strip())
+    df["state"] = state.where(~unknown, "")
+
+    for column in COUNT_COLUMNS:
+        digits = df[column].str.strip().str.translate(_DIGIT_LOOKALIKES).str.replace(",", "", regex=False)
+        df[column] = pd.to_numeric(digits.where(digits.str.fullmatch(r"\d+")), errors="coerce").astype("Int64")
+
+    return df
+
+
+def _normalize_phones(phones):
+    digits = phones.str.replace(r"\D", "", regex=True)
+    # A leading long-distance 1 isn't part of the number
+    digits = digits.where(~((digits.str.len() == 11) & digits.str.startswith("1")), digits.str[1:])
+    formatted = phones.copy()
+    ten = digits.str.len() == 10
+    formatted[ten] = digits[ten].str[:3] + "-" + digits[ten].str[3:6] + "-" + digits[ten].str[6:]
+    seven = digits.str.len() == 7
+    formatted[seven] = digits[seven].str[:3] + "-" + digits[seven].str[3:]
+    return formatted
+
+
+def _normalize_zips(zips):
+    digits = zips.str.translate(_DIGIT_LOOKALIKES).str.replace(r"[\s\-]", "", regex=True)
+    formatted = zips.copy()
+    five = digits.str.fullmatch(r"\d{5}")
+    formatted[five] = digits[five]
+    nine = digits.str.fullmatch(r"\d{9}")
+    formatted[nine] = digits[nine].str[:5] + "-" + digits[nine].str[5:]
+    return formatted
+
+
+def normalize_records(rows):
+    """Normalises rows like normalize_rows, back into row dicts of strings, "" where a count is missing."""
+    df = normalize_rows(rows)
+    return df.astype(object).where(df.notna(), "").astype(str).to_dict("records")
+
+
+def write_normalized_csv(rows, output_path):
+    """Normalises rows and writes them to a CSV file with the same columns as write_csv.
+
+    :param rows: An iterable of row dicts, e.g. from iter_rows.
+    :param output_path: The path to the CSV file.
+    :return: The number of rows written.
+    """
+    df = normalize_rows(rows)
+    with atomic_path(output_path) as temp_path:
+        df.to_csv(temp_path, index=False, encoding="utf-8")
+    return len(df)
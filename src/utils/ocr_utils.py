@@ -1,5 +1,12 @@
+import os
 import re
 import csv
+import uuid
+from contextlib import contextmanager
+
+from src.core.results import RegionResult
+from src.utils.editions import BLOCK, SUB_CODE, get_edition
+from src.utils.tracing import span
 
 columns = [
     "year",
@@ -87,173 +94,417 @@ possible_tags = [
 ]
 
 
-def parse_entry(entry, year, parent_code=None, parent_title=None):
+# Everything parse_entry needs is compiled once at import time
+_CODE_PREFIX = re.compile(r"[A-Z.]*\d+")
+_CODE = re.compile(r"([A-Z.]*\d+)\s+")
+_WORD_HYPHEN_BREAK = re.compile(r"(?<=[A-Za-z])-\s*\n\s*(?=[A-Za-z])")
+_DIGIT_HYPHEN_BREAK = re.compile(r"(?<=\d)-\s*\n\s*(?=\d)")
+_LINE_BREAK = re.compile(r"\s*\n\s*")
+_FAX = re.compile(r"FAX:\s*[\d\-\s]+", re.IGNORECASE)
+_TELEX = re.compile(r"Telex:\s*[\d\-\s,]+", re.IGNORECASE)
+_TAG = re.compile(r"\(\s*([a-z]{1,4})\s*\)", re.IGNORECASE)
+
+# When an entry has several tags, the one listed first in possible_tags wins
+_TAG_RANK = {tag: rank for rank, tag in enumerate(possible_tags)}
+
+
+def _rstrip_end(text, start, end):
+    """Moves end left past any trailing whitespace in text[start:end]."""
+    while end > start and text[end - 1].isspace():
+        end -= 1
+    return end
+
+
+def _best_tag(text, pos, end, extra_tags=()):
+    """Finds the tag in text[pos:end], preferring the one listed first in possible_tags, then in extra_tags."""
+    best = None
+    for match in _TAG.finditer(text, pos, end):
+        tag = match.group(1).lower()
+        rank = _TAG_RANK.get(tag)
+        if rank is None and tag in extra_tags:
+            rank = len(_TAG_RANK) + extra_tags.index(tag)
+        if rank is not None and (best is None or rank < best[0]):
+            best = (rank, match)
+    return best[1] if best else None
+
+
+def _parse_block_header(lines, row, edition):
+    """Parses the heading lines of a block layout entry: code and title, street, then city, state and zip.
+
+    :return: The rest of the entry, from the line after the address on.
+    """
+    # Titles may wrap, so the address is found by its city line. The street is on the same line, or the line above.
+    heading_end, rest = 1, 1
+    for i in range(1, min(len(lines), 6)):
+        candidates = [(lines[i], i)]
+        if i >= 2:
+            candidates.append((f"{lines[i - 1]}, {lines[i]}", i - 1))
+        match = None
+        for address, start in candidates:
+            for pattern, fields in edition.addresses:
+                match = pattern.match(address)
+                if match:
+                    row["street"], row["city"], row["state"], row["zip"] = fields(match)
+                    heading_end, rest = start, i + 1
+                    break
+            if match:
+                break
+        if match:
+            break
+
+    heading = " ".join(lines[:heading_end])
+    code_match = edition.code.match(heading)
+    if code_match:
+        row["code"] = code_match.group(1)
+        heading = heading[code_match.end() :]
+
+    tag_match = _best_tag(heading, 0, len(heading), edition.extra_tags)
+    if tag_match:
+        row["tag"] = tag_match.group(0)[1:-1]
+        heading = heading[: tag_match.start()] + heading[tag_match.end() :]
+    row["title"] = " ".join(heading.split()).rstrip(",")
+
+    return "\n".join(lines[rest:])
+
+
+def parse_entry(entry, year, parent_code=None, parent_title=None, edition=None, corrector=None):
+    """Parses one directory entry into a row.
+
+    :param entry: The entry text.
+    :param year: The directory year, used for the year column and to pick the edition.
+    :param edition: The EditionProfile whose patterns are used, by default the one for the year.
+    :param corrector: A Corrector to correct OCR misreads in the city, state and fields with, none by default.
+    :return: The row, the parent code and the parent title.
+    """
+    edition = edition or get_edition(year)
     lines = [line.strip() for line in entry.split("\n") if line.strip()]
     row = make_dict(year)
 
     # Pointer entry
-    if len(lines) == 2 and not re.match(r"^[A-Z.]*\d+", lines[0]):
+    if len(lines) == 2 and not _CODE_PREFIX.match(lines[0]):
         row["title"] = lines[0]
         row["note"] = lines[1]
         return row, parent_code, parent_title
 
+    block = edition.layout == BLOCK and bool(lines)
+    if block:
+        entry = _parse_block_header(lines, row, edition)
+
     # Transform from multi-line into single-line
-    entry_str = re.sub(r"(?<=[A-Za-z])-\s*\n\s*(?=[A-Za-z])", "", entry)
-    entry_str = re.sub(r"(?<=\d)-\s*\n\s*(?=\d)", "-", entry_str)
-    entry_str = re.sub(r"\s*\n\s*", " ", entry_str)
+    entry_str = _WORD_HYPHEN_BREAK.sub("", entry)
+    entry_str = _DIGIT_HYPHEN_BREAK.sub("-", entry_str)
+    entry_str = _LINE_BREAK.sub(" ", entry_str)
     entry_str = entry_str.replace("\t", "")
     entry_str = entry_str.replace(",*", ",")
     entry_str = entry_str.replace(",  ", ", ")
 
     # Clean-up irrelevant information that we know we don't need
-    entry_str = re.sub(r"FAX:\s*[\d\-\s]+", "", entry_str, flags=re.IGNORECASE)
-    entry_str = re.sub(
-        r"Telex:\s*[\d\-\s,]+", "", entry_str, flags=re.IGNORECASE
-    ).strip()
-
-    # Match on the code
-    code_match = re.match(r"^([A-Z.]*\d+)\s+", entry_str)
-    if code_match:
-        row["code"] = code_match.group(1)
-        entry_str = entry_str[code_match.end() :]
-
-    # Match on the tag
-    for tag in possible_tags:
-        pattern = rf"\(\s*{re.escape(tag)}\s*\)"  # e.g., '(pg)'
-        match = re.search(pattern, entry_str, re.IGNORECASE)
+    entry_str = _FAX.sub("", entry_str)
+    entry_str = _TELEX.sub("", entry_str).strip()
+
+    # The unparsed remainder of the entry is entry_str[pos:end]. Fields consumed from the front only move pos,
+    # fields cut from the middle are spliced out by their match span.
+    pos, end = 0, len(entry_str)
+
+    if not block:
+        # Match on the code
+        code_match = edition.code.match(entry_str)
+        if code_match:
+            row["code"] = code_match.group(1)
+            pos = code_match.end()
+
+        # Match on the tag
+        match = _best_tag(entry_str, pos, end, edition.extra_tags)
         if match:
-            row["tag"] = match.group(0).strip().replace("(", "").replace(")", "")
-            entry_str = entry_str.replace(match.group(0), "", 1)
-            break
-
-    # Match on the title, assumes title = everything up until the street numbers in street address
-    match = re.match(r"^(.*?),\s*([0-9].*)$", entry_str)
-    if match:
-        row["title"] = match.group(1).strip()
-        entry_str = match.group(2).strip()
+            row["tag"] = match.group(0)[1:-1]  # e.g., '(pg)' -> 'pg'
+            entry_str = entry_str[pos : match.start()] + entry_str[match.end() : end]
+            pos, end = 0, len(entry_str)
 
-        # Match on the street address, assumes street address is USA based
-        match = re.match(
-            r"\s*(.*?),\s*([A-Za-z\s]+),\s*([A-Z]{2})\s*([\w\-]{5,10})\.", entry_str
-        )
+        # Match on the title, assumes title = everything up until the street address
+        match = edition.title.match(entry_str, pos, end)
         if match:
-            row["street"] = match.group(1).strip()
-            row["city"] = match.group(2).strip()
-            row["state"] = match.group(3).strip()
-            row["zip"] = match.group(4).strip()
-            entry_str = entry_str.replace(match.group(0), "", 1)
-        else:
-            # Check if there's a mailing add
-            # Match full address with optional Mailing add
-            match = re.match(
-                r"\s*(.*?),\s*([A-Za-z\s]+),\s*([A-Z]{2})\s*\(Mailing add:\s*(PO Box \d+),\s*([\w\-]{5,10})\)\.",
-                entry_str,
-                flags=re.IGNORECASE,
-            )
-            if match:
-                row["street"] = f"{match.group(1).strip()} {match.group(4).strip()}"
-                row["city"] = match.group(2).strip()
-                row["state"] = match.group(3).strip()
-                row["zip"] = match.group(5).strip()
-                entry_str = entry_str.replace(match.group(0), "", 1)
+            row["title"] = match.group(1).strip()
+            pos = match.start(2)
+            end = _rstrip_end(entry_str, pos, end)
+
+            # Match on the street address, assumes street address is USA based. The edition lists its address
+            # forms in the order to try them, e.g. with or without a mailing address.
+            for pattern, fields in edition.addresses:
+                match = pattern.match(entry_str, pos, end)
+                if match:
+                    row["street"], row["city"], row["state"], row["zip"] = fields(match)
+                    pos = match.end()
+                    break
 
     # Match on the phone number
-    match = re.search(r"Tel:\s*([\d\-]+)", entry_str)
-    if match:
-        row["phone"] = match.group(1).strip()
-        if match.end() < len(entry_str) - 1 and entry_str[match.end() + 1] == ";":
-            entry_str = f"{entry_str[:match.start()]}{entry_str[match.end() + 2:]}"
-        else:
-            entry_str = entry_str.replace(match.group(0), "", 1).strip()
-    else:
-        match = re.search(r"\s*([\d\-]+)", entry_str)
+    for pattern in edition.phones:
+        match = pattern.search(entry_str, pos, end)
         if match:
-            row["phone"] = match.group(1).strip()
-            if match.end() < len(entry_str) - 1 and entry_str[match.end() + 1] == ";":
-                entry_str = f"{entry_str[:match.start()]}{entry_str[match.end() + 2:]}"
+            row["phone"] = "-".join(match.groups())
+            if match.end() < end - 1 and entry_str[match.end() + 1] == ";":
+                entry_str = entry_str[pos : match.start()] + entry_str[match.end() + 2 : end]
             else:
-                entry_str = entry_str.replace(match.group(0), "", 1).strip()
-
-    # Match on the number of staffs
-    staff_match = re.search(r"Professional Staff:\s*(\d+)", entry_str)
-    if staff_match:
-        row["staff"] = staff_match.group(1)
-        entry_str = entry_str.replace(staff_match.group(0), "", 1)
-
-    # Match on the number of doctorates
-    doctorates_match = re.search(r"Doctorates:\s*(\d+)", entry_str)
-    if doctorates_match:
-        row["doctorates"] = doctorates_match.group(1)
-        entry_str = entry_str.replace(doctorates_match.group(0), "", 1)
-
-    # Match on the number of techs & auxiliaries
-    match = re.search(r"Technicians\s*&\s*Auxiliaries:\s*(\d+)", entry_str)
-    if match:
-        row["numTechsAndAuxs"] = match.group(1)
-        entry_str = entry_str.replace(match.group(0), "", 1)
+                entry_str = (entry_str[pos : match.start()] + entry_str[match.end() : end]).strip()
+            pos, end = 0, len(entry_str)
+            break
+
+    # Match on the number of staffs, doctorates, and techs & auxiliaries, skipping what the edition doesn't print
+    for key, pattern in (
+        ("staff", edition.staff),
+        ("doctorates", edition.doctorates),
+        ("numTechsAndAuxs", edition.techs_and_auxs),
+    ):
+        match = pattern.search(entry_str, pos, end) if pattern else None
+        if match:
+            row[key] = match.group(1)
+            entry_str = entry_str[pos : match.start()] + entry_str[match.end() : end]
+            pos, end = 0, len(entry_str)
 
     # Match on the fields of R&D
-    match = re.search(r"Fields of R&D:(.*?)(?=Professional Staff:|$)", entry_str)
+    match = edition.fields.search(entry_str, pos, end)
     if match:
-        row["fields"] = " ".join(match.group(1).strip().split())
-        entry_str = entry_str.replace(match.group(0), "", 1)
+        row["fields"] = " ".join(match.group(1).split())
+        entry_str = entry_str[pos : match.start()] + entry_str[match.end() : end]
+        pos, end = 0, len(entry_str)
 
     # Fill the note column with everything not parsed by the parser
-    row["leftover"] = entry_str
+    row["leftover"] = entry_str[pos:end]
+
+    # Where divisions are listed under their company, as "A1.1 -Electronics Division", they're named after it in full
+    if edition.code is SUB_CODE and row["code"]:
+        if "." not in row["code"]:
+            parent_code, parent_title = row["code"], row["title"]
+        elif row["title"].startswith("-") and parent_title and row["code"].startswith(f"{parent_code}."):
+            row["title"] = parent_title + row["title"]
+
+    if corrector is not None:
+        corrector.correct_row(row)
 
     return row, parent_code, parent_title
 
 
 def make_dict(year):
-    d = dict()
-    for key in columns:
-        d[key] = "" if key != "year" else year
+    d = dict.fromkeys(columns, "")
+    d["year"] = year
 
     return d
 
 
-def parse_file_to_csv(content, year, output_path):
-    # Remove header
-    content = re.sub(r"^\d+\s+.*?\n", "", content)
-
-    entries = re.split(r"\n\s*\n", content)
-    rows = []
-    parent_code = None
-    parent_title = None
-
-    i = 0
-    while i < len(entries):
-        entry = entries[i]
+_HEADER = re.compile(r"^\d+\s+.*?\n")
+_ENTRY_BREAK = re.compile(r"\n\s*\n")
+
+
+def year_from_filename(filename):
+    """Gets the year from a file name if possible (format like "1975-a1_1-2").
+
+    :param filename: The file name or path.
+    :return: The four digit year, or "" if the name doesn't start with one.
+    """
+    filename = os.path.basename(filename)
+    if "-" in filename:
+        year_part = filename.split("-")[0]
+        if year_part.isdigit() and len(year_part) == 4:
+            return year_part
+    return ""
+
+
+_HEADER_START = re.compile(r"\d+(\s*)")
+
+
+def _header_complete(buffer):
+    """Tells whether enough of the stream has arrived to decide where its header line ends."""
+    match = _HEADER_START.match(buffer)
+    if match is None:
+        return bool(buffer)  # Doesn't start with a number, so there is no header
+    if match.end() == len(buffer):
+        return False
+    # A header needs whitespace after the number and runs to the end of the next non-blank line
+    return not match.group(1) or buffer.find("\n", match.end()) != -1
+
+
+def _split_entries(chunks):
+    """Splits a stream of texts on blank lines, the way re.split would split them joined together.
+
+    RegionResult chunks are split on their own, since a region boundary is always an entry boundary.
+
+    :return: A generator of (text, source) pairs, source being the RegionResult the text came from or None.
+    """
+    buffer = ""
+    header_done = False
+    for chunk in chunks:
+        if isinstance(chunk, RegionResult):
+            text = chunk.text.strip()
+            if buffer:
+                if not header_done:
+                    buffer = _HEADER.sub("", buffer, count=1)
+                for part in _ENTRY_BREAK.split(buffer):
+                    yield part, None
+                buffer = ""
+            elif not header_done:
+                # Remove header
+                text = _HEADER.sub("", text, count=1)
+            header_done = True
+            for part in _ENTRY_BREAK.split(text):
+                yield part, chunk
+            continue
+
+        buffer += chunk
+        if not header_done:
+            if not _header_complete(buffer):
+                continue
+            # Remove header
+            buffer = _HEADER.sub("", buffer, count=1)
+            header_done = True
+
+        # Trailing whitespace is held back, the next text may turn it into a blank line
+        cut = len(buffer.rstrip())
+        parts = _ENTRY_BREAK.split(buffer[:cut])
+        buffer = parts.pop() + buffer[cut:]
+        for part in parts:
+            yield part, None
+
+    if not header_done:
+        buffer = _HEADER.sub("", buffer, count=1)
+    if buffer:
+        yield buffer, None
+
+
+def iter_entries(chunks, with_source=False):
+    """Yields the entries found in a stream of page texts or OCR regions.
+
+    Chunks without a code are merged onto the entry before them, the same way parse_file_to_csv always has.
+
+    :param chunks: An iterable of text chunks or RegionResult, in reading order. The first chunk is stripped of
+        its page header.
+    :param with_source: If True, yield (entry, source) pairs, source being the RegionResult the entry starts in.
+    :return: A generator of entry strings.
+    """
+    entry = source = None
+    for next_entry, next_source in _split_entries(chunks):
+        if entry is None:
+            entry, source = next_entry, next_source
+            continue
 
         # Attempt to merge non-entries together for cleaner parsing
-        while True:
-            if not i < len(entries) - 1:
-                break
-
-            next_entry = entries[i + 1]
+        if next_entry.count("\n") > 1 and not _CODE.match(next_entry, 0, next_entry.find("\n")):
+            entry += next_entry
+            continue
 
-            ne_lines = next_entry.split("\n")
-            if len(ne_lines) <= 2:
-                break
+        if entry.strip():
+            yield (entry, source) if with_source else entry
+        entry, source = next_entry, next_source
 
-            code_match = re.match(r"^([A-Z.]*\d+)\s+", ne_lines[0])
-            if (
-                not code_match
-            ):  # If we fail to match a code, append to current entry, otherwise break and parse
-                entry += next_entry
-                i += 1
-            else:
-                break
+    if entry is not None and entry.strip():
+        yield (entry, source) if with_source else entry
 
-        if entry.strip():
-            row, parent_code, parent_title = parse_entry(
-                entry, year, parent_code, parent_title
-            )
-            rows.append(row)
 
-        i += 1
+def iter_parsed(chunks, year, corrector=None):
+    """Yields every entry in a stream of page texts or OCR regions, parsed.
 
-    with open(output_path, "w", newline="", encoding="utf-8") as csvfile:
-        writer = csv.DictWriter(csvfile, fieldnames=columns)
-        writer.writeheader()
-        writer.writerows(rows)
+    :param chunks: An iterable of text chunks or RegionResult, in reading order.
+    :param year: The year to fill the year column with.
+    :param corrector: A Corrector passed on to parse_entry.
+    :return: A generator of (row, source) pairs, source being the RegionResult the entry starts in or None.
+    """
+    parent_code = None
+    parent_title = None
+    for entry, source in iter_entries(chunks, with_source=True):
+        with span("parse", page=source.page if source is not None else None):
+            row, parent_code, parent_title = parse_entry(entry, year, parent_code, parent_title, corrector=corrector)
+        yield row, source
+
+
+def iter_rows(chunks, year, corrector=None):
+    """Yields a parsed row for every entry in a stream of page texts or OCR regions.
+
+    :param chunks: An iterable of text chunks or RegionResult, in reading order.
+    :param year: The year to fill the year column with.
+    :param corrector: A Corrector passed on to parse_entry.
+    :return: A generator of row dicts keyed by columns.
+    """
+    for row, _ in iter_parsed(chunks, year, corrector):
+        yield row
+
+
+@contextmanager
+def atomic_path(output_path):
+    """Gives a temporary path to write a file to, and moves it over output_path once the block finishes.
+
+    The temporary file is in the same directory and keeps the extension of output_path, so writers that pick the
+    format from the extension still do, and the rename is atomic. A crash or an exception leaves output_path as it was
+    instead of half-written, and the temporary file is removed.
+    """
+    directory, name = os.path.split(os.path.abspath(output_path))
+    stem, extension = os.path.splitext(name)
+    # Not mkstemp, its files are only readable by their owner and would stay that way after the rename
+    temp_path = os.path.join(directory, f".{stem}.{os.getpid()}.{uuid.uuid4().hex[:8]}{extension}")
+    try:
+        yield temp_path
+        os.replace(temp_path, output_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+class CsvRowWriter:
+    """Appends rows to a CSV file as they arrive, flushing regularly so they land on disk early.
+
+    The rows go to a temporary file that replaces output_path when the writer is closed without an error, see
+    atomic_path. So nothing shows up at output_path while the rows are still coming, only the temporary file next to
+    it grows: a reader never sees a half-written CSV under the real name, at the cost of not seeing the rows early.
+    """
+
+    def __init__(self, output_path, flush_every=20):
+        self.output_path = output_path
+        self.flush_every = flush_every
+        self.count = 0
+        self.csvfile = None
+        self.writer = None
+        self._atomic = None
+
+    def __enter__(self):
+        self._atomic = atomic_path(self.output_path)
+        temp_path = self._atomic.__enter__()
+        self.csvfile = open(temp_path, "w", newline="", encoding="utf-8")
+        self.writer = csv.DictWriter(self.csvfile, fieldnames=columns)
+        self.writer.writeheader()
+        return self
+
+    def write(self, row):
+        self.writer.writerow(row)
+        self.count += 1
+        if self.count % self.flush_every == 0:
+            self.csvfile.flush()
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.csvfile.close()
+        self._atomic.__exit__(exc_type, exc_value, tb)
+        return False
+
+
+def write_csv(rows, output_path):
+    """Writes rows to a CSV file as they are produced.
+
+    :param rows: An iterable of row dicts, e.g. from iter_rows.
+    :param output_path: The path to the CSV file.
+    :return: The number of rows written.
+    """
+    with CsvRowWriter(output_path) as writer:
+        for row in rows:
+            writer.write(row)
+    return writer.count
+
+
+def parse_file_to_csv(content, year, output_path, store=None, corrector=None):
+    """Parses a file's extracted text and writes its CSV.
+
+    :param store: An EntryStore to also upsert the rows into as they are written, under the name of the PDF the CSV
+        is made from. Its search index is updated with them in the same pass.
+    :param corrector: A Corrector passed on to parse_entry.
+    :return: The number of rows written.
+    """
+    parsed = iter_parsed([content], year, corrector)
+    if store is not None:
+        parsed = store.iter_upsert(os.path.basename(output_path).replace(".csv", ".pdf"), parsed)
+    return write_csv((row for row, _ in parsed), output_path)
@@ -0,0 +1,91 @@
+import os
+import platform
+import subprocess
+from functools import lru_cache
+
+from src.utils.batch_export import export_batch, export_merged
+from src.utils.logger import get_logger
+from src.utils.ocr_utils import year_from_filename
+
+logger = get_logger("output_sink")
+
+if platform.system() == "Windows":
+    import winreg
+
+# The name of the merged output when a batch is written to one file
+MERGED_NAME = "parsed_entries.csv"
+
+
+@lru_cache(maxsize=None)
+def downloads_folder():
+    """Finds the user's Downloads folder. Asks the OS only once per process, the answer is cached."""
+    if platform.system() == "Windows":
+        sub_key = r"SOFTWARE\Microsoft\Windows\CurrentVersion\Explorer\Shell Folders"
+        downloads_guid = "{374DE290-123F-4565-9164-39C4925E467B}"
+        try:
+            with winreg.OpenKey(winreg.HKEY_CURRENT_USER, sub_key) as key:
+                return winreg.QueryValueEx(key, downloads_guid)[0]
+        except Exception:
+            return os.path.join(os.path.expanduser("~"), "Downloads")
+
+    elif platform.system() == "Darwin":
+        return os.path.join(os.path.expanduser("~"), "Downloads")
+
+    else:
+        try:
+            xdg_path = subprocess.check_output(["xdg-user-dir", "DOWNLOAD"]).decode().strip()
+            if os.path.exists(xdg_path):
+                return xdg_path
+        except Exception:
+            pass
+        return os.path.join(os.path.expanduser("~"), "Downloads")
+
+
+class OutputSink:
+    """Where the parsed output of a run goes.
+
+    The output directory is resolved once, when it's first needed, and defaults to the Downloads folder. Every file is
+    written atomically (see atomic_path). With merge_name set, a batch goes to that one file instead of one per input.
+    """
+
+    def __init__(self, output_dir=None, merge_name=None):
+        """
+        :param output_dir: The directory to write to, the Downloads folder by default.
+        :param merge_name: The name of the one CSV or Parquet file to merge every batch into, None to write a file
+            per input.
+        """
+        self._output_dir = output_dir
+        self.merge_name = merge_name
+
+    @property
+    def output_dir(self):
+        if self._output_dir is None:
+            self._output_dir = downloads_folder()
+        return self._output_dir
+
+    def path_for(self, name, extension=".csv"):
+        """Gets the output path of an input file.
+
+        :param name: The input file's name or path, its extension is replaced.
+        """
+        return os.path.join(self.output_dir, os.path.splitext(os.path.basename(name))[0] + extension)
+
+    @property
+    def merged_path(self):
+        return os.path.join(self.output_dir, self.merge_name) if self.merge_name else None
+
+    def export(self, files, max_workers=None, normalize=False):
+        """Parses and writes many extracted texts in worker processes.
+
+        :param files: A list of (name, extracted_text) pairs, the year is taken from the name.
+        :param max_workers: The number of worker processes, defaults to the CPU count.
+        :param normalize: If True, clean up phones, ZIPs, states and counts before writing.
+        :return: A list of ExportResult in the same order as files.
+        """
+        os.makedirs(self.output_dir, exist_ok=True)
+        logger.info(f"Writing {len(files)} files to {self.merged_path or self.output_dir}")
+        if self.merge_name:
+            jobs = ((text, year_from_filename(name), name) for name, text in files)
+            return list(export_merged(jobs, self.merged_path, max_workers=max_workers, normalize=normalize))
+        jobs = ((text, year_from_filename(name), self.path_for(name)) for name, text in files)
+        return list(export_batch(jobs, max_workers=max_workers, normalize=normalize))
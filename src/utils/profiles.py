@@ -0,0 +1,142 @@
+import os
+
+from src.utils.logger import get_logger
+
+logger = get_logger("profiles")
+
+DEFAULT_PROFILE = "balanced"
+
+WHITELIST = """ !\\"#$%&\\'()*+,-./0123456789:;<=>?@ABCDEFGHIJKLMNOPQRSTUVWXYZ[\\]`abcdefghijklmnopqrstuvwxyz{|}"""
+BLACKLIST = """~_^"""
+
+# Where to look for the alternative traineddata sets, checked in order after the environment variables.
+TESSDATA_DIRS = {
+    "fast": [
+        "/usr/share/tesseract-ocr/5/tessdata_fast",
+        "/usr/local/share/tessdata_fast",
+        "/opt/homebrew/share/tessdata_fast",
+        r"C:\Program Files\Tesseract-OCR\tessdata_fast",
+    ],
+    "best": [
+        "/usr/share/tesseract-ocr/5/tessdata_best",
+        "/usr/local/share/tessdata_best",
+        "/opt/homebrew/share/tessdata_best",
+        r"C:\Program Files\Tesseract-OCR\tessdata_best",
+    ],
+}
+
+
+class PipelineProfile:
+    """A named set of the knobs that trade OCR speed for accuracy."""
+
+    def __init__(self, name, dpi, psm, oem, tessdata, kernel, min_height, max_workers, description=""):
+        self.name = name
+        self.dpi = dpi
+        self.psm = psm
+        self.oem = oem
+        self.tessdata = tessdata
+        self.kernel = kernel
+        self.min_height = min_height
+        self.max_workers = max_workers
+        self.description = description
+        self._tess_config = None
+
+    def tessdata_dir(self):
+        """Finds the directory holding the traineddata set this profile asks for.
+
+        :return: The directory, or None to let Tesseract use its default tessdata.
+        """
+        if self.tessdata is None:
+            return None
+
+        env_dir = os.getenv(f"TESSDATA_{self.tessdata.upper()}_DIR")
+        candidates = ([env_dir] if env_dir else []) + TESSDATA_DIRS.get(self.tessdata, [])
+        for path in candidates:
+            if os.path.exists(os.path.join(path, "eng.traineddata")):
+                return path
+
+        logger.warning(
+            f"tessdata_{self.tessdata} not found, profile '{self.name}' falls back to the default tessdata."
+        )
+        return None
+
+    def tess_config(self):
+        """Builds the Tesseract command line options for this profile.
+
+        :return: The config string passed to pytesseract.
+        """
+        if self._tess_config is not None:
+            return self._tess_config
+
+        config = f"--psm {self.psm}"
+        if self.oem is not None:
+            config += f" --oem {self.oem}"
+        tessdata_dir = self.tessdata_dir()
+        if tessdata_dir:
+            config += f' --tessdata-dir "{tessdata_dir}"'
+        self._tess_config = f"{config} -c tessedit_char_whitelist={WHITELIST} -c tessedit_char_blacklist={BLACKLIST}"
+        return self._tess_config
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "dpi": self.dpi,
+            "psm": self.psm,
+            "oem": self.oem,
+            "tessdata": self.tessdata,
+            "kernel": list(self.kernel),
+            "min_height": self.min_height,
+            "max_workers": self.max_workers,
+        }
+
+
+# The segmentation kernel and minimum region height are in pixels, so they scale with the DPI.
+PROFILES = {
+    "fast": PipelineProfile(
+        name="fast",
+        dpi=200,
+        psm=6,
+        oem=1,
+        tessdata="fast",
+        kernel=(100, 10),
+        min_height=30,
+        max_workers=os.cpu_count() or 4,
+        description="Low resolution and tessdata_fast, for quick triage passes.",
+    ),
+    "balanced": PipelineProfile(
+        name="balanced",
+        dpi=400,
+        psm=6,
+        oem=None,
+        tessdata=None,
+        kernel=(200, 20),
+        min_height=60,
+        max_workers=4,
+        description="The original pipeline settings.",
+    ),
+    "accurate": PipelineProfile(
+        name="accurate",
+        dpi=600,
+        psm=6,
+        oem=1,
+        tessdata="best",
+        kernel=(300, 30),
+        min_height=90,
+        max_workers=4,
+        description="High resolution and tessdata_best, for the final export.",
+    ),
+}
+
+
+def get_profile(profile=None):
+    """Looks up a pipeline profile.
+
+    :param profile: A profile name, a PipelineProfile, or None for the default profile.
+    :return: The matching PipelineProfile.
+    """
+    if isinstance(profile, PipelineProfile):
+        return profile
+    name = (profile or DEFAULT_PROFILE).lower()
+    if name not in PROFILES:
+        raise ValueError(f"Unknown pipeline profile '{profile}'. Choose one of: {', '.join(PROFILES)}")
+    return PROFILES[name]
@@ -0,0 +1,49 @@
+"""Searches the entries kept in an EntryStore database.
+
+    python -m src.utils.search entries.sqlite "radar OR sonar" [--year 1985] [--limit 20] [--json]
+
+The query is an SQLite FTS5 query over title, fields and leftover. Prefix a term with a column to search only that
+column ("fields: microwave"), end it with * for a prefix match ("laser*").
+"""
+import argparse
+import json
+import sqlite3
+import sys
+
+from src.utils.entry_store import EntryStore
+
+
+def format_match(row):
+    return (
+        f"{row['year']}  {row['source_file']} page {row['page']} entry {row['entry']}  {row['code']} {row['title']}\n"
+        f"    {row['snippet']}"
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("db_path", help="The EntryStore database to search.")
+    parser.add_argument("query", help="The FTS5 query.")
+    parser.add_argument("--year", type=int, help="Only return entries of this year.")
+    parser.add_argument("--limit", type=int, default=20, help="The maximum number of entries to return.")
+    parser.add_argument("--json", action="store_true", help="Print the matching rows as JSON.")
+    args = parser.parse_args(argv)
+
+    with EntryStore(args.db_path) as store:
+        try:
+            matches = store.search(args.query, year=args.year, limit=args.limit)
+        except sqlite3.OperationalError as e:
+            print(f"Invalid query {args.query!r}: {e}", file=sys.stderr)
+            return 2
+
+    if args.json:
+        print(json.dumps(matches, indent=2))
+    else:
+        for row in matches:
+            print(format_match(row))
+        print(f"{len(matches)} matching entries")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
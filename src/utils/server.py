@@ -0,0 +1,372 @@
+"""Local HTTP job service: upload PDFs, follow their progress and download their parsed entries.
+
+    python -m src.utils.server --port 8080 --workers 4 --data-dir jobs
+
+    curl --data-binary @1985-page.pdf "http://localhost:8080/jobs?name=1985-page.pdf"
+    curl http://localhost:8080/jobs/<id>
+    curl -o entries.csv http://localhost:8080/jobs/<id>/result
+    curl -o entries.parquet "http://localhost:8080/jobs/<id>/result?format=parquet"
+
+The pages of every job are OCR'd by one shared pool of worker processes. A client, told apart by its address, only
+sees its own jobs, runs at most a few of them at once and can only queue so many, and a job only has as many pages
+waiting for the pool as it has workers, so a long upload takes its turn with the others instead of going ahead of them.
+Finished jobs and their files are removed after a while.
+"""
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import signal
+import sys
+import tempfile
+import time
+import unicodedata
+import uuid
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from http import HTTPStatus
+from urllib.parse import parse_qs, quote, urlsplit
+
+from src.core.image_processor import ImageProcessor
+from src.ocr import OCRProcessorNoGUI, ocr_pdf_page
+from src.utils.batch_export import write_rows
+from src.utils.config import set_tesseract_path
+from src.utils.correction import Corrector
+from src.utils.logger import get_logger
+from src.utils.ocr_utils import iter_parsed, year_from_filename
+from src.utils.profiles import DEFAULT_PROFILE, PROFILES
+
+logger = get_logger("server")
+
+RESULT_FORMATS = {"csv": ("text/csv", ".csv"), "parquet": ("application/vnd.apache.parquet", ".parquet")}
+MAX_HEADER_LINES = 100
+DEFAULT_JOB_TTL_SECONDS = 3600
+
+
+def safe_filename(name):
+    """Keeps the base name of an uploaded file's name, without the control characters, quotes and backslashes that
+    could break out of the Content-Disposition header it's sent back in."""
+    name = os.path.basename(name or "")
+    return "".join(c for c in name if c not in '"\\' and unicodedata.category(c)[0] != "C").strip()
+
+
+class ServiceError(Exception):
+    """A request the service can't fulfil, answered with an HTTP status and a message."""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class Job:
+    """One uploaded PDF and the state of its processing."""
+
+    __slots__ = ("id", "client", "name", "pdf_path", "state", "pages", "pages_done", "rows", "error", "submitted",
+                 "started", "finished")
+
+    def __init__(self, job_id, client, name, pdf_path):
+        self.id = job_id
+        self.client = client
+        self.name = name
+        self.pdf_path = pdf_path
+        self.state = "queued"
+        self.pages = None
+        self.pages_done = 0
+        self.rows = None
+        self.error = None
+        self.submitted = time.time()
+        self.started = None
+        self.finished = None
+
+    def to_dict(self):
+        job = {name: getattr(self, name) for name in self.__slots__ if name != "pdf_path"}
+        job["progress"] = round(self.pages_done / self.pages, 3) if self.pages else 0.0
+        return job
+
+
+class JobService:
+    """Runs the uploaded PDFs through OCR and parsing, keeping each job's files under data_dir/<job id>."""
+
+    def __init__(self, data_dir, executor, workers, processor=None, max_running_per_client=2,
+                 max_queued_per_client=20, count_pages=ImageProcessor.count_pages, ocr_page=ocr_pdf_page,
+                 job_ttl_seconds=DEFAULT_JOB_TTL_SECONDS):
+        """
+        :param executor: The pool the pages are OCR'd in, shared by every job.
+        :param workers: The number of workers in the pool, and so the pages sent to it at once.
+        :param processor: The OCRProcessorNoGUI whose profile, corrector and no-split list are used.
+        :param max_running_per_client: The jobs a client can have running at once, the others wait.
+        :param max_queued_per_client: The unfinished jobs a client can have before uploads are refused.
+        :param count_pages: Counts a PDF's pages.
+        :param ocr_page: OCRs one page, called in the executor like ocr_pdf_page.
+        :param job_ttl_seconds: How long a finished job and its files are kept.
+        """
+        self.data_dir = data_dir
+        self.executor = executor
+        self.workers = workers
+        self.processor = processor or OCRProcessorNoGUI()
+        self.max_running_per_client = max_running_per_client
+        self.max_queued_per_client = max_queued_per_client
+        self.count_pages = count_pages
+        self.ocr_page = ocr_page
+        self.job_ttl_seconds = job_ttl_seconds
+        self.jobs = {}
+        self._pool_slots = asyncio.Semaphore(workers)
+        self._client_slots = defaultdict(lambda: asyncio.Semaphore(self.max_running_per_client))
+        self._tasks = set()
+
+    def submit(self, client, name, data):
+        """Saves an uploaded PDF and queues it. Must be called in the event loop.
+
+        :param client: Who submitted it, for the per-client limits.
+        :param name: The PDF's file name, which picks its edition and column layout.
+        :param data: The PDF's bytes.
+        :return: The queued Job.
+        """
+        if not data.startswith(b"%PDF"):
+            raise ServiceError(HTTPStatus.BAD_REQUEST, "The upload is not a PDF")
+        self.prune()
+        unfinished = sum(job.client == client and job.finished is None for job in self.jobs.values())
+        if unfinished >= self.max_queued_per_client:
+            raise ServiceError(HTTPStatus.TOO_MANY_REQUESTS, f"{unfinished} jobs are already waiting, try again later")
+
+        job_id = uuid.uuid4().hex[:12]
+        name = safe_filename(name) or f"{job_id}.pdf"
+        job_dir = os.path.join(self.data_dir, job_id)
+        os.makedirs(job_dir)
+        pdf_path = os.path.join(job_dir, name)
+        with open(pdf_path, "wb") as f:
+            f.write(data)
+
+        job = Job(job_id, client, name, pdf_path)
+        self.jobs[job_id] = job
+        task = asyncio.get_running_loop().create_task(self._run(job))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        logger.info(f"Job {job_id}: {name} from {client}")
+        return job
+
+    def get(self, job_id, client):
+        """:return: The client's job with this id, another client's jobs are not found."""
+        self.prune()
+        job = self.jobs.get(job_id)
+        if job is None or job.client != client:
+            raise ServiceError(HTTPStatus.NOT_FOUND, f"No job {job_id}")
+        return job
+
+    def list(self, client):
+        """:return: The client's jobs."""
+        self.prune()
+        return [job for job in self.jobs.values() if job.client == client]
+
+    def prune(self, now=None):
+        """Forgets the jobs finished more than job_ttl_seconds ago and removes their files."""
+        now = time.time() if now is None else now
+        for job in [job for job in self.jobs.values() if job.finished and now - job.finished > self.job_ttl_seconds]:
+            del self.jobs[job.id]
+            shutil.rmtree(os.path.dirname(job.pdf_path), ignore_errors=True)
+            logger.info(f"Job {job.id} expired")
+        for client in set(self._client_slots) - {job.client for job in self.jobs.values()}:
+            del self._client_slots[client]
+
+    def result_path(self, job, output_format):
+        return os.path.join(os.path.dirname(job.pdf_path), "entries" + RESULT_FORMATS[output_format][1])
+
+    async def _run(self, job):
+        async with self._client_slots[job.client]:
+            job.state = "running"
+            job.started = time.time()
+            loop = asyncio.get_running_loop()
+            try:
+                job.pages = await loop.run_in_executor(None, self.count_pages, job.pdf_path)
+                split = job.name not in self.processor.test_images_no_split
+                job_slots = asyncio.Semaphore(self.workers)
+                pages = [
+                    loop.create_task(self._ocr_page(job, page_number, split, job_slots))
+                    for page_number in range(1, job.pages + 1)
+                ]
+                try:
+                    pages = await asyncio.gather(*pages)
+                except BaseException:
+                    for page in pages:
+                        page.cancel()
+                    raise
+                job.rows = await loop.run_in_executor(None, self._write_results, job, pages)
+                job.state = "done"
+            except Exception as e:
+                job.state = "failed"
+                job.error = f"{type(e).__name__}: {e}"
+                logger.error(f"Job {job.id} failed: {job.error}")
+            job.finished = time.time()
+
+    async def _ocr_page(self, job, page_number, split, job_slots):
+        # Waiting on the job's slots first keeps a long job from queueing all of its pages ahead of the other jobs
+        async with job_slots, self._pool_slots:
+            regions = await asyncio.get_running_loop().run_in_executor(
+                self.executor, self.ocr_page, job.pdf_path, page_number, split, self.processor.profile,
+            )
+        job.pages_done += 1
+        return regions
+
+    def _write_results(self, job, pages):
+        regions = (region for page in pages for region in page)
+        rows = [row for row, _ in iter_parsed(regions, year_from_filename(job.name), self.processor.corrector)]
+        for output_format in RESULT_FORMATS:
+            write_rows(rows, self.result_path(job, output_format))
+        return len(rows)
+
+    async def close(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+
+class Server:
+    """A minimal HTTP/1.1 front end for a JobService, one request per connection."""
+
+    def __init__(self, service, max_upload_bytes=200 * 1024 * 1024):
+        self.service = service
+        self.max_upload_bytes = max_upload_bytes
+
+    async def handle(self, reader, writer):
+        try:
+            try:
+                method, target, headers = await self._read_head(reader)
+                url = urlsplit(target)
+                query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+                client = writer.get_extra_info("peername", ("unknown",))[0]
+                await self._route(method, url.path.strip("/").split("/"), query, headers, client, reader, writer)
+            except ServiceError as e:
+                await self._send_json(writer, e.status, {"error": str(e)})
+            except (asyncio.IncompleteReadError, ConnectionError):
+                pass
+            except Exception as e:
+                logger.error(f"Failed to handle a request: {e}")
+                await self._send_json(writer, HTTPStatus.INTERNAL_SERVER_ERROR, {"error": str(e)})
+        finally:
+            writer.close()
+
+    async def _read_head(self, reader):
+        request_line = (await reader.readline()).decode("latin-1").split()
+        if len(request_line) != 3:
+            raise ServiceError(HTTPStatus.BAD_REQUEST, "Malformed request line")
+        headers = {}
+        for _ in range(MAX_HEADER_LINES):
+            line = (await reader.readline()).decode("latin-1").strip()
+            if not line:
+                return request_line[0].upper(), request_line[1], headers
+            key, _, value = line.partition(":")
+            headers[key.strip().lower()] = value.strip()
+        raise ServiceError(HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE, "Too many headers")
+
+    async def _read_body(self, reader, headers):
+        if "content-length" not in headers:
+            raise ServiceError(HTTPStatus.LENGTH_REQUIRED, "Content-Length is required")
+        try:
+            length = int(headers["content-length"])
+        except ValueError:
+            length = -1
+        if length < 0:
+            raise ServiceError(HTTPStatus.BAD_REQUEST, "Content-Length must be a number of bytes")
+        if length > self.max_upload_bytes:
+            raise ServiceError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, f"Uploads are limited to {self.max_upload_bytes} bytes")
+        return await reader.readexactly(length)
+
+    async def _route(self, method, parts, query, headers, client, reader, writer):
+        if parts == ["jobs"] and method == "POST":
+            data = await self._read_body(reader, headers)
+            job = self.service.submit(client, query.get("name") or headers.get("x-filename"), data)
+            await self._send_json(writer, HTTPStatus.ACCEPTED, job.to_dict())
+        elif parts == ["jobs"] and method == "GET":
+            await self._send_json(writer, HTTPStatus.OK, {"jobs": [job.to_dict() for job in self.service.list(client)]})
+        elif len(parts) == 2 and parts[0] == "jobs" and method == "GET":
+            await self._send_json(writer, HTTPStatus.OK, self.service.get(parts[1], client).to_dict())
+        elif len(parts) == 3 and parts[0] == "jobs" and parts[2] == "result" and method == "GET":
+            job = self.service.get(parts[1], client)
+            output_format = query.get("format", "csv")
+            if output_format not in RESULT_FORMATS:
+                raise ServiceError(HTTPStatus.BAD_REQUEST, f"format must be one of {', '.join(RESULT_FORMATS)}")
+            if job.state != "done":
+                raise ServiceError(HTTPStatus.CONFLICT, f"Job {job.id} is {job.state}")
+            await self._send_file(writer, self.service.result_path(job, output_format), output_format, job.name)
+        else:
+            raise ServiceError(HTTPStatus.NOT_FOUND, f"No route for {method} /{'/'.join(parts)}")
+
+    @staticmethod
+    def _send(writer, status, content_type, length, extra_headers=()):
+        head = [f"HTTP/1.1 {status.value} {status.phrase}", f"Content-Type: {content_type}",
+                f"Content-Length: {length}", "Connection: close", *extra_headers]
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1"))
+
+    async def _send_json(self, writer, status, body):
+        data = json.dumps(body).encode("utf-8")
+        self._send(writer, status, "application/json", len(data))
+        writer.write(data)
+        await writer.drain()
+
+    async def _send_file(self, writer, path, output_format, name):
+        content_type, extension = RESULT_FORMATS[output_format]
+        filename = os.path.splitext(safe_filename(name))[0] + extension
+        # The plain filename has to be Latin-1 like the rest of the head, filename* carries the name as it was
+        fallback = filename.encode("latin-1", "replace").decode("latin-1")
+        self._send(writer, HTTPStatus.OK, content_type, os.path.getsize(path),
+                   [f"Content-Disposition: attachment; filename=\"{fallback}\"; filename*=UTF-8''{quote(filename)}"])
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 16), b""):
+                writer.write(chunk)
+                await writer.drain()
+
+
+async def serve(host, port, service, max_upload_bytes):
+    """Serves until SIGTERM or Ctrl+C, then cancels the jobs left."""
+    stop = asyncio.Event()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        asyncio.get_running_loop().add_signal_handler(signum, stop.set)
+    server = await asyncio.start_server(Server(service, max_upload_bytes).handle, host, port)
+    logger.info(f"Serving on http://{host}:{port}")
+    try:
+        async with server:
+            await stop.wait()
+    finally:
+        await service.close()
+    logger.info("Stopped serving")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1", help="The address to listen on. Default: 127.0.0.1.")
+    parser.add_argument("--port", type=int, default=8080, help="The port to listen on. Default: 8080.")
+    parser.add_argument("-w", "--workers", type=int, help="Pages OCR'd at once across all jobs. Default: the CPU count.")
+    parser.add_argument("--data-dir", help="Where uploads and results are kept. Default: a temporary directory.")
+    parser.add_argument("-p", "--profile", choices=PROFILES, default=DEFAULT_PROFILE, help="The pipeline profile.")
+    parser.add_argument("--vocabulary", help="Correct cities, states and fields against this vocabulary file.")
+    parser.add_argument("--jobs-per-client", type=int, default=2, help="Jobs a client runs at once. Default: 2.")
+    parser.add_argument("--queue-per-client", type=int, default=20,
+                        help="Unfinished jobs a client can have before uploads are refused. Default: 20.")
+    parser.add_argument("--job-ttl-minutes", type=float, default=DEFAULT_JOB_TTL_SECONDS / 60,
+                        help="How long finished jobs and their results are kept. Default: 60.")
+    parser.add_argument("--max-upload-mb", type=int, default=200, help="The largest upload accepted. Default: 200.")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    workers = args.workers or os.cpu_count() or 1
+    data_dir = args.data_dir or tempfile.mkdtemp(prefix="ocr-jobs-")
+    os.makedirs(data_dir, exist_ok=True)
+    corrector = Corrector.load(args.vocabulary) if args.vocabulary else None
+    processor = OCRProcessorNoGUI(profile=args.profile, corrector=corrector)
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=set_tesseract_path) as executor:
+        service = JobService(data_dir, executor, workers, processor, args.jobs_per_client, args.queue_per_client,
+                             job_ttl_seconds=args.job_ttl_minutes * 60)
+        try:
+            asyncio.run(serve(args.host, args.port, service, args.max_upload_mb * 1024 * 1024))
+        finally:
+            if not args.data_dir:
+                shutil.rmtree(data_dir, ignore_errors=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,398 @@
+"""Shared job queue: any number of worker processes, on one machine or in several containers, split a batch by page.
+
+    python -m src.utils.task_queue queue.sqlite input/ -o output --workers 4
+
+Running the same command again, e.g. in another container with the same volume, adds its workers to the batch. The
+queue is a SQLite file holding one task per (PDF, page). Workers claim tasks with a lease they keep renewing while
+they work, and write each page's OCR regions back to it. A task whose lease runs out, because its worker died or was
+stopped, is claimed again by another worker. Once every page of a PDF is done, one worker claims the PDF the same way
+and writes its output. There is no server, every worker only talks to the SQLite file, so it has to be on a disk the
+workers share with working file locks (a local disk or a Docker volume, not a network share).
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import socket
+import sqlite3
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+from src.core.image_processor import ImageProcessor
+from src.core.results import RegionResult
+from src.ocr import OCRProcessorNoGUI, ocr_pdf_page
+from src.utils.batch_export import write_rows
+from src.utils.cli import FORMATS, expand_inputs
+from src.utils.config import set_tesseract_path
+from src.utils.correction import Corrector
+from src.utils.logger import get_logger
+from src.utils.ocr_utils import iter_parsed, year_from_filename
+from src.utils.output_sink import OutputSink
+from src.utils.profiles import DEFAULT_PROFILE, PROFILES, get_profile
+
+logger = get_logger("task_queue")
+
+_CREATE_TABLES = [
+    """
+    CREATE TABLE IF NOT EXISTS files (
+        pdf_path TEXT PRIMARY KEY,
+        pages INTEGER NOT NULL,
+        profile TEXT NOT NULL,
+        state TEXT NOT NULL DEFAULT 'queued',
+        worker TEXT,
+        lease_until REAL,
+        output_path TEXT,
+        rows INTEGER,
+        error TEXT
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS tasks (
+        pdf_path TEXT NOT NULL,
+        page INTEGER NOT NULL,
+        state TEXT NOT NULL DEFAULT 'queued',
+        worker TEXT,
+        lease_until REAL,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        regions TEXT,
+        error TEXT,
+        PRIMARY KEY (pdf_path, page)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS tasks_state ON tasks (state, pdf_path, page)",
+    "CREATE INDEX IF NOT EXISTS tasks_worker ON tasks (worker, state)",
+]
+
+
+def worker_name():
+    """Names this process for the leases it takes, the host name telling containers apart."""
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+class TaskQueue:
+    """A connection to the queue file. Each process and thread needs its own."""
+
+    def __init__(self, db_path, lease_seconds=60.0, max_attempts=3):
+        """
+        :param db_path: The SQLite file, created if needed.
+        :param lease_seconds: How long a claim lasts without being renewed.
+        :param max_attempts: How many times a page is tried before it and its PDF are marked failed.
+        """
+        self.db_path = db_path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.connection = sqlite3.connect(db_path, timeout=60, isolation_level=None)
+        # WAL lets workers read the queue while another one claims from it
+        self.connection.execute("PRAGMA journal_mode = WAL")
+        self.connection.execute("PRAGMA synchronous = NORMAL")
+        with self._transaction():
+            for statement in _CREATE_TABLES:
+                self.connection.execute(statement)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.close()
+
+    def close(self):
+        self.connection.close()
+
+    @contextmanager
+    def _transaction(self):
+        # IMMEDIATE takes the write lock up front, so two workers can't both read a task as free and then claim it
+        self.connection.execute("BEGIN IMMEDIATE")
+        try:
+            yield self.connection
+        except BaseException:
+            self.connection.execute("ROLLBACK")
+            raise
+        self.connection.execute("COMMIT")
+
+    def enqueue(self, pdf_paths, profile=None):
+        """Adds a task for every page of the PDFs not queued yet. PDFs already queued are left as they are.
+
+        A PDF whose pages can't be counted is recorded as failed, with the error, and the rest are still queued.
+
+        :param profile: The name of the pipeline profile the PDFs are OCR'd with.
+        :return: The number of PDFs added, not counting those that failed.
+        """
+        profile = get_profile(profile).name
+        queued = {path for path, in self.connection.execute("SELECT pdf_path FROM files")}
+        added = 0
+        for pdf_path in pdf_paths:
+            if pdf_path in queued:
+                continue
+            try:
+                pages = ImageProcessor.count_pages(pdf_path)
+            except Exception as e:
+                logger.error(f"Can't count the pages of {pdf_path}: {e}")
+                with self._transaction() as connection:
+                    connection.execute(
+                        "INSERT OR IGNORE INTO files (pdf_path, pages, profile, state, error) "
+                        "VALUES (?, 0, ?, 'failed', ?)",
+                        (pdf_path, profile, f"{type(e).__name__}: {e}"),
+                    )
+                continue
+            with self._transaction() as connection:
+                cursor = connection.execute(
+                    "INSERT OR IGNORE INTO files (pdf_path, pages, profile) VALUES (?, ?, ?)",
+                    (pdf_path, pages, profile),
+                )
+                if cursor.rowcount:
+                    connection.executemany(
+                        "INSERT INTO tasks (pdf_path, page) VALUES (?, ?)",
+                        ((pdf_path, page) for page in range(1, pages + 1)),
+                    )
+                    added += 1
+        return added
+
+    def _expire(self, connection, now):
+        # Give up on pages whose leases ran out too often, and on the PDFs they belong to
+        connection.execute(
+            "UPDATE tasks SET state = 'failed', error = coalesce(error, 'The lease ran out on every attempt') "
+            "WHERE state = 'leased' AND lease_until < ? AND attempts >= ?",
+            (now, self.max_attempts),
+        )
+        connection.execute(
+            "UPDATE files SET state = 'failed', error = (SELECT 'Page ' || page || ': ' || error FROM tasks "
+            "WHERE tasks.pdf_path = files.pdf_path AND tasks.state = 'failed' ORDER BY page LIMIT 1) "
+            "WHERE state = 'queued' AND EXISTS "
+            "(SELECT 1 FROM tasks WHERE tasks.pdf_path = files.pdf_path AND tasks.state = 'failed')"
+        )
+
+    def claim(self, worker, limit=1):
+        """Leases up to limit pages that are queued or whose lease ran out, in file and page order.
+
+        The pages of a PDF that failed are left alone, its output won't be written.
+
+        :return: A list of (pdf_path, page) pairs.
+        """
+        now = time.time()
+        with self._transaction() as connection:
+            self._expire(connection, now)
+            claimed = connection.execute(
+                "UPDATE tasks SET state = 'leased', worker = ?, lease_until = ?, attempts = attempts + 1 "
+                "WHERE rowid IN (SELECT rowid FROM tasks WHERE (state = 'queued' OR "
+                "(state = 'leased' AND lease_until < ?)) AND pdf_path NOT IN "
+                "(SELECT pdf_path FROM files WHERE state = 'failed') ORDER BY pdf_path, page LIMIT ?) "
+                "RETURNING pdf_path, page",
+                (worker, now + self.lease_seconds, now, limit),
+            ).fetchall()
+        return sorted(claimed)
+
+    def complete(self, worker, pdf_path, page, regions):
+        """Writes a page's regions back, if worker still holds its lease.
+
+        :return: Whether the result was taken, False if the lease ran out and the page went to another worker.
+        """
+        with self._transaction() as connection:
+            cursor = connection.execute(
+                "UPDATE tasks SET state = 'done', regions = ?, lease_until = NULL, error = NULL "
+                "WHERE pdf_path = ? AND page = ? AND worker = ? AND state = 'leased'",
+                (json.dumps([region.to_dict() for region in regions]), pdf_path, page, worker),
+            )
+        return cursor.rowcount == 1
+
+    def fail(self, worker, pdf_path, page, error):
+        """Gives a page that failed back to the queue, or marks it failed once it's out of attempts."""
+        with self._transaction() as connection:
+            connection.execute(
+                "UPDATE tasks SET state = CASE WHEN attempts >= ? THEN 'failed' ELSE 'queued' END, error = ?, "
+                "lease_until = NULL WHERE pdf_path = ? AND page = ? AND worker = ? AND state = 'leased'",
+                (self.max_attempts, error, pdf_path, page, worker),
+            )
+            self._expire(connection, time.time())
+
+    def claim_file(self, worker):
+        """Leases a PDF whose pages are all done, to write its output.
+
+        :return: (pdf_path, profile), or None if no PDF is ready.
+        """
+        now = time.time()
+        with self._transaction() as connection:
+            return connection.execute(
+                "UPDATE files SET state = 'writing', worker = ?, lease_until = ? WHERE rowid = (SELECT rowid FROM "
+                "files WHERE (state = 'queued' OR (state = 'writing' AND lease_until < ?)) AND NOT EXISTS "
+                "(SELECT 1 FROM tasks WHERE tasks.pdf_path = files.pdf_path AND tasks.state != 'done') LIMIT 1) "
+                "RETURNING pdf_path, profile",
+                (worker, now + self.lease_seconds, now),
+            ).fetchone()
+
+    def file_regions(self, pdf_path):
+        """Gives every region of the pages of a PDF that are done, in page order."""
+        regions = []
+        for page_regions, in self.connection.execute(
+            "SELECT regions FROM tasks WHERE pdf_path = ? AND state = 'done' ORDER BY page", (pdf_path,)
+        ):
+            regions.extend(RegionResult.from_dict(region) for region in json.loads(page_regions))
+        return regions
+
+    def file_written(self, worker, pdf_path, output_path, rows=None, error=None):
+        """Records a PDF's output as written, or as failed with error."""
+        with self._transaction() as connection:
+            connection.execute(
+                "UPDATE files SET state = ?, output_path = ?, rows = ?, error = ?, lease_until = NULL "
+                "WHERE pdf_path = ? AND worker = ? AND state = 'writing'",
+                ("failed" if error else "written", output_path, rows, error, pdf_path, worker),
+            )
+
+    def renew(self, worker):
+        """Extends every lease worker holds."""
+        with self._transaction() as connection:
+            until = time.time() + self.lease_seconds
+            connection.execute(
+                "UPDATE tasks SET lease_until = ? WHERE worker = ? AND state = 'leased'", (until, worker)
+            )
+            connection.execute(
+                "UPDATE files SET lease_until = ? WHERE worker = ? AND state = 'writing'", (until, worker)
+            )
+
+    def finished(self):
+        """Tells whether every PDF was written or failed."""
+        return self.connection.execute(
+            "SELECT NOT EXISTS (SELECT 1 FROM files WHERE state IN ('queued', 'writing'))"
+        ).fetchone()[0] == 1
+
+    def status(self):
+        """Counts the pages and PDFs in each state."""
+        return {
+            table: dict(self.connection.execute(f"SELECT state, COUNT(*) FROM {table} GROUP BY state"))
+            for table in ("tasks", "files")
+        }
+
+
+class _Heartbeat(threading.Thread):
+    """Renews a worker's leases until stopped, on a connection of its own."""
+
+    def __init__(self, db_path, worker, lease_seconds):
+        super().__init__(daemon=True)
+        self.db_path = db_path
+        self.worker = worker
+        self.lease_seconds = lease_seconds
+        self.stopped = threading.Event()
+
+    def run(self):
+        with TaskQueue(self.db_path, self.lease_seconds) as queue:
+            while not self.stopped.wait(self.lease_seconds / 3):
+                try:
+                    queue.renew(self.worker)
+                except sqlite3.Error as e:
+                    logger.warning(f"Failed to renew the leases of {self.worker}: {e}")
+
+
+def work(db_path, output_dir, output_format="csv", normalize=False, vocabulary=None, lease_seconds=60.0,
+         poll_seconds=1.0, max_attempts=3, worker=None):
+    """Claims and OCRs pages, and writes the PDFs that are done, until every PDF in the queue is written or failed.
+
+    :param output_dir: Where the per-PDF files are written.
+    :param output_format: A key of FORMATS.
+    :param vocabulary: A vocabulary file for Corrector.load, None to not correct.
+    :param poll_seconds: How long to wait before looking again when every task is leased by other workers.
+    :param worker: The name of the leases, worker_name() by default.
+    :return: The number of pages OCR'd and of PDFs written by this worker.
+    """
+    worker = worker or worker_name()
+    sink = OutputSink(output_dir)
+    os.makedirs(sink.output_dir, exist_ok=True)
+    corrector = Corrector.load(vocabulary) if vocabulary else None
+    processors = {}  # By PDF, each PDF is OCR'd with the profile it was queued with
+    pages = files = 0
+    set_tesseract_path()
+    heartbeat = _Heartbeat(db_path, worker, lease_seconds)
+    heartbeat.start()
+    try:
+        with TaskQueue(db_path, lease_seconds, max_attempts) as queue:
+            def processor(pdf_path):
+                if pdf_path not in processors:
+                    profile, = queue.connection.execute(
+                        "SELECT profile FROM files WHERE pdf_path = ?", (pdf_path,)
+                    ).fetchone()
+                    same = [known for known in processors.values() if known.profile.name == profile]
+                    processors[pdf_path] = same[0] if same else OCRProcessorNoGUI(profile=profile)
+                return processors[pdf_path]
+
+            while True:
+                claimed = queue.claim(worker)
+                for pdf_path, page in claimed:
+                    ocr = processor(pdf_path)
+                    split = os.path.basename(pdf_path) not in ocr.test_images_no_split
+                    try:
+                        regions = ocr_pdf_page(pdf_path, page, split, ocr.profile)
+                    except Exception as e:
+                        logger.error(f"Failed to process page {page} of {pdf_path}: {e}")
+                        queue.fail(worker, pdf_path, page, f"{type(e).__name__}: {e}")
+                        continue
+                    if queue.complete(worker, pdf_path, page, regions):
+                        pages += 1
+
+                ready = queue.claim_file(worker)
+                while ready is not None:
+                    pdf_path, _ = ready
+                    output_path = sink.path_for(pdf_path, FORMATS[output_format])
+                    try:
+                        regions = queue.file_regions(pdf_path)
+                        rows = [row for row, _ in iter_parsed(regions, year_from_filename(pdf_path), corrector)]
+                        queue.file_written(worker, pdf_path, output_path, write_rows(rows, output_path, normalize))
+                        logger.info(f"{pdf_path}: {len(rows)} rows written to {output_path}")
+                        files += 1
+                    except Exception as e:
+                        logger.error(f"Failed to write {output_path}: {e}")
+                        queue.file_written(worker, pdf_path, output_path, error=f"{type(e).__name__}: {e}")
+                    ready = queue.claim_file(worker)
+
+                if not claimed:
+                    if queue.finished():
+                        break
+                    time.sleep(poll_seconds)  # The pages left are leased by others, one may still be given back
+    finally:
+        heartbeat.stopped.set()
+    return pages, files
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("queue", help="The SQLite queue file, shared by every worker.")
+    parser.add_argument("inputs", nargs="*", help="PDF files, directories or glob patterns to add to the queue.")
+    parser.add_argument("-o", "--output-dir", default=".", help="Where to write the output. Default: the current one.")
+    parser.add_argument("-f", "--format", choices=FORMATS, default="csv", help="The format of the per-PDF files.")
+    parser.add_argument("-w", "--workers", type=int, help="Worker processes to start. Default: the CPU count.")
+    parser.add_argument("-p", "--profile", choices=PROFILES, default=DEFAULT_PROFILE,
+                        help="The pipeline profile of the PDFs added.")
+    parser.add_argument("--normalize", action="store_true", help="Clean up phones, ZIPs, states and counts.")
+    parser.add_argument("--vocabulary", help="Correct cities, states and fields against this vocabulary file.")
+    parser.add_argument("--lease", type=float, default=60.0,
+                        help="Seconds before the pages of a worker that stopped renewing go to another. Default: 60.")
+    parser.add_argument("--status", action="store_true", help="Print the state of the queue and exit.")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    with TaskQueue(args.queue, args.lease) as queue:
+        if args.status:
+            print(json.dumps(queue.status(), indent=2))
+            return 0
+        if args.inputs:
+            added = queue.enqueue(expand_inputs(args.inputs), args.profile)
+            logger.info(f"Added {added} PDFs to {args.queue}")
+
+    worker_args = (args.queue, args.output_dir, args.format, args.normalize, args.vocabulary, args.lease)
+    workers = [
+        multiprocessing.Process(target=work, args=worker_args) for _ in range(args.workers or os.cpu_count() or 1)
+    ]
+    for process in workers:
+        process.start()
+    for process in workers:
+        process.join()
+
+    with TaskQueue(args.queue, args.lease) as queue:
+        status = queue.status()
+    print(json.dumps(status, indent=2))
+    return 1 if status["files"].get("failed") else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
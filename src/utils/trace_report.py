@@ -0,0 +1,33 @@
+"""Merges the trace files of a traced run into a Chrome trace, and lists where the time went.
+
+    python -m src.utils.trace_report traces/ [-o traces/trace.json]
+
+The trace directory is the one given to --trace or OCR_TRACE_DIR (see src.utils.tracing). Open the Chrome trace in
+chrome://tracing or https://ui.perfetto.dev to see every process and thread on a timeline.
+"""
+import argparse
+import sys
+
+from src.utils.tracing import TRACE_NAME, export_chrome_trace, load_events, summarize_spans
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("trace_dir", help="The directory the trace files were written to.")
+    parser.add_argument("-o", "--output", help=f"Where to write the Chrome trace. Default: {TRACE_NAME} in trace_dir.")
+    args = parser.parse_args(argv)
+
+    events = load_events(args.trace_dir)
+    if not events:
+        print(f"No trace files in {args.trace_dir}", file=sys.stderr)
+        return 2
+    output_path = export_chrome_trace(args.trace_dir, args.output)
+    print(f"{'span':<16} {'count':>7} {'total ms':>10} {'longest ms':>11}")
+    for name, count, total, longest in summarize_spans(events):
+        print(f"{name:<16} {count:>7} {total:>10.1f} {longest:>11.1f}")
+    print(f"Chrome trace written to {output_path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
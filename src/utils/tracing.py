@@ -0,0 +1,262 @@
+"""Lightweight tracing of where the pipeline spends its time.
+
+    with span("rasterize", file=pdf_path, page=page_number):
+        image = ImageProcessor.rasterize_page(pdf_path, page_number)
+
+    @traced("save")
+    def save(...):
+
+Tracing is off unless OCR_TRACE_DIR names a directory, or enable() is called, which sets it. Every process appends
+its spans to a file of its own there, trace-<pid>.jsonl, one JSON event per line, so worker processes, which inherit
+the environment, are traced too. export_chrome_trace merges the files into the Chrome trace-event format, to open in
+chrome://tracing or https://ui.perfetto.dev. python -m src.utils.trace_report does that for a trace directory.
+
+Observers added with add_observer are told about every span as it ends, whether tracing is on or not, which is how
+src.utils.metrics counts pages and times stages. With tracing off and no observers, span returns the same do-nothing
+context manager every time and traced calls the function straight away, so leaving them in the pipeline costs next to
+nothing.
+"""
+import functools
+import glob
+import json
+import multiprocessing
+import os
+import threading
+import time
+from collections import defaultdict
+
+TRACE_ENV = "OCR_TRACE_DIR"
+TRACE_NAME = "trace.json"
+
+_enabled = False
+_active = False  # Whether spans are timed at all, for tracing or for an observer
+_observers = []
+
+
+class _NoSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def set(self, **attributes):
+        pass
+
+
+_NO_SPAN = _NoSpan()
+
+
+class _Writer:
+    """Appends the events of this process to its trace file, reopened under the new pid after a fork."""
+
+    def __init__(self):
+        self.trace_dir = None
+        self._file = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def reset(self):
+        # The parent's file and lock aren't this process's, the lock may even have been held by another thread
+        self._file = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def write(self, event):
+        line = json.dumps(event, default=str) + "\n"
+        with self._lock:
+            if self._pid != os.getpid():
+                self._open()
+            # Flushed every time, worker processes exit without running atexit handlers
+            self._file.write(line)
+            self._file.flush()
+
+    def _open(self):
+        self._pid = os.getpid()
+        os.makedirs(self.trace_dir, exist_ok=True)
+        self._file = open(os.path.join(self.trace_dir, f"trace-{self._pid}.jsonl"), "a", encoding="utf-8")
+        name = {"name": "process_name", "ph": "M", "pid": self._pid, "tid": 0,
+                "args": {"name": f"{multiprocessing.current_process().name} ({self._pid})"}}
+        self._file.write(json.dumps(name) + "\n")
+
+    def close(self):
+        with self._lock:
+            if self._file is not None and self._pid == os.getpid():
+                self._file.close()
+            self._file = None
+            self._pid = None
+
+
+_writer = _Writer()
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_writer.reset)
+
+
+class Span:
+    """A traced stretch of work, written as a complete event when it ends."""
+
+    __slots__ = ("name", "attributes", "_start")
+
+    def __init__(self, name, attributes):
+        self.name = name
+        self.attributes = attributes
+        self._start = None
+
+    def set(self, **attributes):
+        """Adds attributes only known once the work is done, e.g. the number of rows."""
+        self.attributes.update(attributes)
+
+    def __enter__(self):
+        self._start = time.time_ns()  # The wall clock, the same in every process
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        end = time.time_ns()
+        if exc_type is not None:
+            self.attributes["error"] = f"{exc_type.__name__}: {exc_value}"
+        if _enabled:
+            _writer.write({
+                "name": self.name,
+                "ph": "X",
+                "ts": self._start // 1000,
+                "dur": (end - self._start) // 1000,
+                "pid": os.getpid(),
+                "tid": threading.get_native_id(),
+                "args": self.attributes,
+            })
+        for observer in _observers:
+            observer(self.name, (end - self._start) / 1e9, self.attributes)
+        return False
+
+
+def span(name, **attributes):
+    """Traces the work in a with block.
+
+    :param name: What the work is, e.g. "rasterize".
+    :param attributes: Where it happened, e.g. file, page or region, shown with the span.
+    :return: A context manager, whose set() adds attributes before the block ends.
+    """
+    if not _active:
+        return _NO_SPAN
+    return Span(name, attributes)
+
+
+def traced(name=None):
+    """Decorates a function to trace every call of it.
+
+    :param name: The name of the spans, defaults to the function's qualified name.
+    """
+    def decorate(function):
+        span_name = name or function.__qualname__
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not _active:
+                return function(*args, **kwargs)
+            with Span(span_name, {}):
+                return function(*args, **kwargs)
+
+        return wrapper
+
+    return decorate
+
+
+def is_enabled():
+    return _enabled
+
+
+def add_observer(observer):
+    """Calls observer(name, seconds, attributes) at the end of every span, in the processes that add it.
+
+    An observer must be quick and must not raise, it runs in the middle of the pipeline.
+    """
+    global _active
+    if observer not in _observers:
+        _observers.append(observer)
+    _active = True
+
+
+def remove_observer(observer):
+    global _active
+    if observer in _observers:
+        _observers.remove(observer)
+    _active = _enabled or bool(_observers)
+
+
+def enable(trace_dir, clear=False):
+    """Turns tracing on for this process and the processes it starts from now on.
+
+    :param trace_dir: The directory to write the trace files to, created if needed.
+    :param clear: Whether to delete the trace files of earlier runs first.
+    """
+    global _enabled, _active
+    trace_dir = os.path.abspath(trace_dir)
+    os.makedirs(trace_dir, exist_ok=True)
+    if clear:
+        for path in glob.glob(os.path.join(trace_dir, "trace-*.jsonl")):
+            os.remove(path)
+    _writer.close()
+    _writer.trace_dir = trace_dir
+    os.environ[TRACE_ENV] = trace_dir
+    _enabled = _active = True
+
+
+def disable():
+    global _enabled, _active
+    _enabled = False
+    _active = bool(_observers)
+    _writer.close()
+    os.environ.pop(TRACE_ENV, None)
+
+
+def load_events(trace_dir):
+    """Reads the events of every process traced to trace_dir, skipping a line cut short by a crash.
+
+    :return: The events, metadata first and then by start time.
+    """
+    events = []
+    for path in sorted(glob.glob(os.path.join(trace_dir, "trace-*.jsonl"))):
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    events.append(json.loads(line))
+                except ValueError:
+                    continue
+    events.sort(key=lambda event: (event["ph"] != "M", event.get("ts", 0)))
+    return events
+
+
+def export_chrome_trace(trace_dir, output_path=None):
+    """Merges the trace files of trace_dir into one Chrome trace-event file.
+
+    :param output_path: Where to write it, defaults to trace.json in trace_dir.
+    :return: The output path.
+    """
+    output_path = output_path or os.path.join(trace_dir, TRACE_NAME)
+    with open(output_path, "w", encoding="utf-8") as f:
+        json.dump({"traceEvents": load_events(trace_dir), "displayTimeUnit": "ms"}, f)
+    return output_path
+
+
+def summarize_spans(events):
+    """Totals the time of the spans by name.
+
+    :return: A list of (name, count, total milliseconds, longest milliseconds), the most total time first.
+    """
+    totals = defaultdict(lambda: [0, 0, 0])
+    for event in events:
+        if event["ph"] == "X":
+            total = totals[event["name"]]
+            total[0] += 1
+            total[1] += event["dur"]
+            total[2] = max(total[2], event["dur"])
+    return sorted(
+        ((name, count, total / 1000, longest / 1000) for name, (count, total, longest) in totals.items()),
+        key=lambda item: -item[2],
+    )
+
+
+if os.environ.get(TRACE_ENV):
+    enable(os.environ[TRACE_ENV])
@@ -0,0 +1,205 @@
+"""Watch mode: keeps OCRing the PDFs that appear in a folder, e.g. the one a scanning station saves to.
+
+    python -m src.utils.cli input/ -o output --watch
+
+The inputs are polled every few seconds. A file is only picked up once its size and modification time have stayed the
+same for a while and it ends like a complete PDF, so files still being copied in are left alone. What was processed
+is kept in a SQLite file in the output directory, so a restart only processes what's new or changed since.
+"""
+import os
+import shutil
+import sqlite3
+import threading
+import time
+
+from src.utils.dedupe import file_sha256
+from src.utils.logger import get_logger
+from src.utils.ocr_utils import year_from_filename
+
+logger = get_logger("watch")
+
+RECORD_NAME = ".processed.sqlite"
+
+_CREATE_TABLE = """
+CREATE TABLE IF NOT EXISTS processed (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    sha256 TEXT NOT NULL,
+    output_path TEXT,
+    rows INTEGER,
+    processed_at REAL NOT NULL
+)
+"""
+
+
+def looks_complete(path):
+    """Tells whether a file ends like a complete PDF, with %%EOF in its last kilobyte."""
+    with open(path, "rb") as f:
+        f.seek(max(0, os.path.getsize(path) - 1024))
+        return b"%%EOF" in f.read()
+
+
+class ProcessedRecord:
+    """The files a watcher has processed, by path, size, modification time and content hash."""
+
+    def __init__(self, db_path):
+        self.connection = sqlite3.connect(db_path)
+        self.connection.execute(_CREATE_TABLE)
+        self.connection.execute("CREATE INDEX IF NOT EXISTS processed_sha256 ON processed (sha256)")
+        self.connection.commit()
+        # Checked on every poll for every file, so kept in memory
+        self._signatures = {
+            path: (size, mtime_ns)
+            for path, size, mtime_ns in self.connection.execute("SELECT path, size, mtime_ns FROM processed")
+        }
+
+    def close(self):
+        self.connection.close()
+
+    def is_current(self, path, signature):
+        """Tells whether path was processed when it had this (size, mtime_ns)."""
+        return self._signatures.get(path) == signature
+
+    def find_content(self, sha256):
+        """:return: The (path, output_path) of a file processed with this content, or None."""
+        return self.connection.execute(
+            "SELECT path, output_path FROM processed WHERE sha256 = ? AND output_path IS NOT NULL "
+            "ORDER BY processed_at LIMIT 1",
+            (sha256,),
+        ).fetchone()
+
+    def rows_of(self, path):
+        row = self.connection.execute("SELECT rows FROM processed WHERE path = ?", (path,)).fetchone()
+        return row[0] if row else None
+
+    def mark(self, path, signature, sha256, output_path=None, rows=None):
+        self.connection.execute(
+            "INSERT OR REPLACE INTO processed VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (path, *signature, sha256, output_path, rows, time.time()),
+        )
+        self.connection.commit()
+        self._signatures[path] = signature
+
+
+class Watcher:
+    """Finds the files under the inputs that are new or changed and have finished being written."""
+
+    def __init__(self, inputs, list_files, record, settle_seconds=5.0):
+        """
+        :param inputs: Directories, files and glob patterns.
+        :param list_files: Lists the files of the inputs, e.g. cli.expand_inputs.
+        :param record: The ProcessedRecord of what's done.
+        :param settle_seconds: How long a file's size and modification time must stay the same before it's ready.
+        """
+        self.inputs = inputs
+        self.list_files = list_files
+        self.record = record
+        self.settle_seconds = settle_seconds
+        self.failed = {}  # path: the signature it failed with, tried again once that changes
+        self._pending = {}  # path: (signature, first seen with it, warned it looks incomplete)
+
+    def poll(self, now=None):
+        """Checks the inputs once.
+
+        :return: A list of (path, signature) for the files ready to process.
+        """
+        now = time.monotonic() if now is None else now
+        ready = []
+        paths = self.list_files(self.inputs)
+        for path in paths:
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue  # Removed since it was listed
+            signature = (stat.st_size, stat.st_mtime_ns)
+            if self.record.is_current(path, signature) or self.failed.get(path) == signature:
+                self._pending.pop(path, None)
+                continue
+
+            pending = self._pending.get(path)
+            if pending is None or pending[0] != signature:
+                self._pending[path] = (signature, now, False)
+            elif now - pending[1] >= self.settle_seconds:
+                if looks_complete(path):
+                    ready.append((path, signature))
+                    del self._pending[path]
+                elif not pending[2]:
+                    logger.warning(f"{path} has stopped changing but doesn't end like a PDF, waiting for it")
+                    self._pending[path] = (signature, pending[1], True)
+        for path in set(self._pending) - set(paths):
+            del self._pending[path]
+        return ready
+
+
+def copy_output(path, original_path, output_path):
+    """Writes the output of a file processed earlier under the name of a file with the same content.
+
+    :return: The copy's output path, or None if it needs processing after all: the original's output is gone, or the
+        names have different years, so the rows would be parsed as another edition.
+    """
+    if not os.path.exists(output_path) or year_from_filename(path) != year_from_filename(original_path):
+        return None
+    copy_path = os.path.join(
+        os.path.dirname(output_path), os.path.splitext(os.path.basename(path))[0] + os.path.splitext(output_path)[1]
+    )
+    temp_path = f"{copy_path}.tmp"
+    shutil.copyfile(output_path, temp_path)
+    os.replace(temp_path, copy_path)
+    return copy_path
+
+
+def watch(inputs, list_files, output_dir, process, interval=2.0, settle_seconds=5.0, stop=None, dedupe=True):
+    """Processes the files that appear under the inputs until stop is set.
+
+    Files whose content was already processed, under another name or before being touched, get a copy of its output
+    under their own name instead of being processed again. Copies within one batch are left to process, e.g. cli.run,
+    which OCRs them once. A file that fails is tried again once it changes, or after a restart, and a file that can't
+    be read yet is tried again on the next poll.
+
+    :param inputs: Directories, files and glob patterns to watch.
+    :param list_files: Lists the files of the inputs, e.g. cli.expand_inputs.
+    :param output_dir: Where the output goes, the record of processed files is kept there too.
+    :param process: Processes a list of PDF paths, returning a FileResult for each, e.g. cli.run with its options.
+    :param interval: Seconds between polls.
+    :param stop: A threading.Event that ends the watch, None to watch forever.
+    :param dedupe: Whether to copy the output of files processed earlier for files with the same content.
+    :return: The number of files processed.
+    """
+    stop = stop or threading.Event()
+    os.makedirs(output_dir, exist_ok=True)
+    record = ProcessedRecord(os.path.join(output_dir, RECORD_NAME))
+    watcher = Watcher(inputs, list_files, record, settle_seconds)
+    processed = 0
+    logger.info(f"Watching {', '.join(inputs)} every {interval}s")
+    try:
+        while not stop.is_set():
+            batch = {}
+            for path, signature in watcher.poll():
+                try:
+                    sha256 = file_sha256(path)
+                    found = record.find_content(sha256) if dedupe else None
+                    output_path = copy_output(path, *found) if found else None
+                except OSError as e:
+                    logger.warning(f"Couldn't read {path}, trying again on the next poll: {e}")
+                    continue  # Not recorded, so the next poll finds it again
+                if output_path is not None:
+                    logger.info(f"{path}: a copy of {found[0]}, its output copied to {output_path}")
+                    record.mark(path, signature, sha256, output_path, record.rows_of(found[0]))
+                    processed += 1
+                else:
+                    batch[path] = (signature, sha256)
+
+            if batch:
+                for result in process(list(batch)):
+                    signature, sha256 = batch[result.input_path]
+                    if result.ok:
+                        record.mark(result.input_path, signature, sha256, result.output_path, result.rows)
+                        processed += 1
+                    else:
+                        # Copies in the batch fail with their original, and are tried again with it
+                        watcher.failed[result.input_path] = signature
+            stop.wait(interval)
+    finally:
+        record.close()
+    return processed
@@ -0,0 +1,34 @@
+import pytest
+
+from benchmarks.accuracy import Score, pareto
+
+EXPECTED = [
+    {"code": "A1", "title": "ACME RESEARCH LABORATORIES", "city": "Boise", "state": "ID"},
+    {"code": "A2", "title": "ALPHA OPTICS CORPORATION", "city": "Dayton", "state": "OH"},
+    {"code": "A3", "title": "ATLAS CHEMICAL COMPANY", "city": "Reno", "state": "NV"},
+    {"code": "A4", "title": "AURORA INSTRUMENTS", "city": "Tulsa", "state": "OK"},
+]
+
+
+@pytest.mark.quick
+def test_score_against_ground_truth():
+    parsed = [dict(row) for row in EXPECTED[1:]][::-1]  # Out of order, the first row missed
+    parsed[0]["title"] = "AURORA INSTRUMENT5"  # One misread letter
+    parsed[1]["state"] = ""
+    parsed.append({"code": "X99", "title": "MADE UP LABS", "city": "Nowhere"})
+
+    score = Score()
+    score.add(EXPECTED, parsed)
+    result = score.to_dict()
+    assert (result["rows"], result["missed_rows"], result["extra_rows"]) == (4, 1, 1)
+    assert result["columns"]["title"] == {"fields": 4, "exact": 0.5, "fuzzy": 0.75}
+    assert result["columns"]["state"] == {"fields": 4, "exact": 0.5, "fuzzy": 0.5}
+    assert result["columns"]["zip"]["fields"] == 0
+    assert (result["exact"], result["fuzzy"]) == (10 / 16, 11 / 16)
+
+
+@pytest.mark.quick
+def test_pareto_front():
+    results = [{"seconds": 10, "fuzzy": 0.9}, {"seconds": 5, "fuzzy": 0.8}, {"seconds": 6, "fuzzy": 0.7},
+               {"seconds": 20, "fuzzy": 0.9}, {"seconds": 5, "fuzzy": 0.8}]
+    assert pareto(results) == [0, 1, 4]
@@ -0,0 +1,48 @@
+import os
+
+import pytest
+
+from benchmarks.corpus import build_corpus
+from src.ocr import OCRProcessor
+from src.utils.batch_export import export_batch
+from src.utils.ocr_utils import iter_rows
+from src.utils.output_sink import OutputSink
+
+CORPUS = build_corpus()
+
+
+@pytest.mark.quick
+def test_results_come_back_in_order_with_bounded_submission(tmp_path):
+    consumed = []
+
+    def jobs():
+        for name, year, page, _ in CORPUS:
+            consumed.append(name)
+            yield page, year, os.path.join(tmp_path, name)
+
+    results = []
+    for index, result in enumerate(export_batch(jobs(), max_workers=2, max_in_flight=3)):
+        results.append(result)
+        # No more than max_in_flight jobs are taken ahead of the one collected
+        assert len(consumed) <= index + 3
+
+    assert [result.output_path for result in results] == [os.path.join(tmp_path, name) for name, _, _, _ in CORPUS]
+    assert [result.rows for result in results] == [len(list(iter_rows([page], year))) for _, year, page, _ in CORPUS]
+
+
+@pytest.mark.quick
+def test_failing_file_is_reported_and_the_batch_goes_on(tmp_path):
+    not_a_dir = os.path.join(tmp_path, "file")
+    open(not_a_dir, "w").close()
+    (name, year, page, _), (other_name, other_year, other_page, _) = CORPUS[:2]
+    jobs = [(page, year, os.path.join(not_a_dir, name)), (other_page, other_year, os.path.join(tmp_path, other_name))]
+
+    failed, written = export_batch(jobs, max_workers=2)
+    assert not failed.ok and failed.rows == 0 and "NotADirectoryError" in failed.error
+    assert written.ok and os.path.exists(written.output_path)
+
+    # The GUI's batch save reports each file the same way, in the order given
+    processor = OCRProcessor(None, sink=OutputSink(os.path.join(tmp_path, "saved")))
+    results = processor.save_csv_batch([(other_name, other_page), (name, page)], max_workers=2)
+    assert [os.path.basename(result.output_path) for result in results] == [other_name, name]
+    assert all(result.ok for result in results)
@@ -0,0 +1,48 @@
+import os
+
+import pytest
+
+from src.utils.cli import FileResult, build_parser, expand_inputs, summarize
+from src.utils.docker_helper import docker_args
+
+
+@pytest.mark.quick
+def test_expand_inputs(tmp_path):
+    for path in ("1975/a.pdf", "1975/deep/b.PDF", "1977/c.pdf", "1977/notes.txt", "d.pdf"):
+        os.makedirs(os.path.dirname(os.path.join(tmp_path, path)), exist_ok=True)
+        open(os.path.join(tmp_path, path), "w").close()
+
+    found = expand_inputs([os.path.join(tmp_path, "1975"), os.path.join(tmp_path, "**", "c.pdf"),
+                           os.path.join(tmp_path, "d.pdf"), os.path.join(tmp_path, "1975", "a.pdf")])
+    assert [os.path.relpath(path, tmp_path) for path in found] == [
+        os.path.join("1975", "a.pdf"), os.path.join("1975", "deep", "b.PDF"), os.path.join("1977", "c.pdf"), "d.pdf",
+    ]
+    assert expand_inputs([os.path.join(tmp_path, "missing", "*.pdf")]) == []
+
+
+@pytest.mark.quick
+def test_summary_and_docker_args(monkeypatch):
+    results = [FileResult("a.pdf", "a.csv", rows=10, pages=2, seconds=1.23456),
+               FileResult("b.pdf", pages=1, seconds=0.5, error="RuntimeError: no pages")]
+    summary = summarize(results, 2.0, profile="fast")
+    assert (summary["files"], summary["failed"], summary["rows"], summary["pages"]) == (2, 1, 10, 3)
+    assert summary["pages_per_second"] == 1.5 and summary["profile"] == "fast"
+    assert summary["results"][0]["seconds"] == 1.235
+
+    for variable in ("OUTPUT_DIR", "WORKERS", "OUTPUT_FORMAT", "MERGE_OUTPUT", "SQLITE_DB", "CORRECTION_VOCAB"):
+        monkeypatch.delenv(variable, raising=False)
+    monkeypatch.setenv("PIPELINE_PROFILE", "fast")
+    monkeypatch.setenv("WORKERS", "8")
+    monkeypatch.setenv("SQLITE_DB", "entries.sqlite")
+    args = build_parser().parse_args(docker_args())
+    assert args.inputs == ["/app/input"] and args.output_dir == "/app/output"
+    assert (args.profile, args.workers, args.store) == ("fast", 8, "/app/output/entries.sqlite")
+    assert args.summary == "/app/output/summary.json" and args.merge is None
+
+    # Everything named by the environment goes to OUTPUT_DIR when it's set
+    monkeypatch.setenv("OUTPUT_DIR", "/data/out")
+    monkeypatch.setenv("CORRECTION_VOCAB", "vocabulary.json")
+    args = build_parser().parse_args(docker_args())
+    assert (args.output_dir, args.store, args.vocabulary) == (
+        "/data/out", "/data/out/entries.sqlite", "/data/out/vocabulary.json",
+    )
@@ -0,0 +1,69 @@
+import multiprocessing
+import os
+
+import pandas as pd
+import pytest
+
+from benchmarks.corpus import build_corpus
+from src import ocr
+from src.core.image_processor import ImageProcessor
+from src.core.results import RegionResult
+from src.utils import cli
+from src.utils.batch_export import export_batch
+from src.utils.columnar import dataset_file_path, read_dataset, write_columnar
+from src.utils.ocr_utils import iter_rows
+
+
+@pytest.mark.quick
+def test_columnar_file_matches_csv_rows(tmp_path):
+    name, year, page, _ = build_corpus()[0]
+    for extension in (".parquet", ".feather"):
+        path = os.path.join(tmp_path, "out" + extension)
+        count = write_columnar(iter_rows([page], year), path)
+
+        df = pd.read_parquet(path) if extension == ".parquet" else pd.read_feather(path)
+        assert len(df) == count
+        assert str(df["year"].dtype) == "Int16"
+        assert str(df["staff"].dtype) == "Int32"
+        assert list(df["title"]) == [row["title"] for row in iter_rows([page], year)]
+
+
+@pytest.mark.quick
+def test_partitioned_dataset_from_batch(tmp_path):
+    corpus = build_corpus()
+    jobs = [(page, year, dataset_file_path(tmp_path, year, name)) for name, year, page, _ in corpus]
+
+    results = list(export_batch(jobs, max_workers=2, partitioned=True))
+    assert all(result.ok for result in results)
+    assert os.path.isdir(os.path.join(tmp_path, "year=1975"))
+
+    df = read_dataset(tmp_path)
+    assert len(df) == sum(result.rows for result in results)
+    assert sorted(df["year"].unique()) == sorted(int(year) for _, year, _, _ in corpus)
+
+
+@pytest.mark.quick
+@pytest.mark.skipif(multiprocessing.get_start_method() != "fork", reason="The workers must inherit the fake OCR")
+def test_cli_writes_a_partitioned_dataset(tmp_path, monkeypatch):
+    pages = {year: page for _, year, page, _ in build_corpus()}
+
+    def fake_ocr_page(pdf_path, page_number, split, profile):
+        return [RegionResult(pages[os.path.basename(pdf_path)[:4]], page=page_number)]
+
+    monkeypatch.setattr(ocr, "ocr_pdf_page", fake_ocr_page)
+    monkeypatch.setattr(ImageProcessor, "count_pages", staticmethod(lambda pdf_path: 1))
+    monkeypatch.setattr(cli, "set_tesseract_path", lambda: None)
+
+    inputs = os.path.join(tmp_path, "input")
+    os.makedirs(inputs)
+    for name in ("1982-a.pdf", "1989-b.pdf"):
+        with open(os.path.join(inputs, name), "wb") as f:
+            f.write(f"%PDF-1.4\n{name}\n%%EOF\n".encode())
+
+    dataset = os.path.join(tmp_path, "dataset")
+    assert cli.main([inputs, "-o", os.path.join(tmp_path, "output"), "-w", "2", "--dataset", dataset,
+                     "--summary", os.path.join(tmp_path, "summary.json")]) == 0
+    assert os.path.exists(dataset_file_path(dataset, "1989", "1989-b.pdf"))
+    df = read_dataset(dataset)
+    assert sorted(df["year"].unique()) == [1982, 1989]
+    assert list(df[df["year"] == 1982]["title"]) == [row["title"] for row in iter_rows([pages["1982"]], "1982")]
@@ -0,0 +1,72 @@
+import os
+import random
+
+import pytest
+
+from benchmarks.correction import accuracy, build_jobs
+from benchmarks.corpus import load_expected_rows
+from src.utils.correction import Corrector, SymSpellIndex, edit_distance
+from src.utils.ocr_utils import parse_entry
+
+
+@pytest.mark.quick
+def test_index_finds_what_comparing_every_term_finds():
+    rng = random.Random(481)
+    terms = {"".join(rng.choice("abcdeh") for _ in range(rng.randint(3, 10))) for _ in range(500)}
+    index = SymSpellIndex(max_distance=2, prefix_length=20)
+    for term in terms:
+        index.add(term)
+
+    for _ in range(300):
+        token = "".join(rng.choice("abcdeh") for _ in range(rng.randint(3, 10)))
+        distances = {term: edit_distance(token, term, 2) for term in terms}
+        closest = min(distances.values())
+        found = index.lookup(token)
+        if closest > 2:
+            assert found is None
+        elif found is not None:
+            assert distances[found[0]] == found[1] == closest
+        else:
+            # Only equally close and equally common terms are left undecided
+            assert sum(distance == closest for distance in distances.values()) > 1
+
+
+@pytest.mark.quick
+def test_parse_entry_corrects_city_state_and_fields(tmp_path):
+    corrector = Corrector(
+        cities={"Baton Rouge": 3, "Pittsburgh": 5},
+        city_states={"Baton Rouge": "LA", "Pittsburgh": "PA"},
+        field_terms={"hydraulics": 4, "turbines": 6, "compressor": 3},
+    )
+    entry = (
+        "A12 ACME LABS, 100 Main St, Pittsburgb, PN 15213. Tel: 412-555-1212. "
+        "Fields of R&D: Hydranlics, turbincs, compressors, lasers."
+    )
+    row = parse_entry(entry, "1985", corrector=corrector)[0]
+    assert (row["city"], row["state"]) == ("Pittsburgh", "PA")
+    # Plurals of known words and words with nothing known close to them are left alone
+    assert row["fields"] == "Hydraulics, turbines, compressors, lasers."
+    assert parse_entry(entry, "1985")[0]["city"] == "Pittsburgb"
+
+    path = os.path.join(tmp_path, "vocabulary.json")
+    corrector.save(path)
+    assert Corrector.load(path).to_dict() == corrector.to_dict()
+
+
+@pytest.mark.quick
+def test_correction_improves_misread_corpus():
+    corrector = Corrector.from_rows((row for _, _, rows in load_expected_rows() for row in rows), min_count=1)
+    jobs = build_jobs(copies=2)
+    before, after = accuracy(jobs), accuracy(jobs, corrector)
+    for column in ("city", "state", "fields"):
+        assert after[column] > before[column]
+
+
+@pytest.mark.quick
+def test_valid_states_are_kept():
+    rows = [{"city": "Springfield", "state": "MA"}] * 5 + [{"city": "Springfield", "state": "MO"}] * 2
+    rows += [{"city": "Jackson", "state": "MS"}] * 3 + [{"city": "Jackson", "state": "MI"}] * 2
+    corrector = Corrector.from_rows(rows)
+    for city, state in (("Springfield", "MO"), ("Jackson", "MI"), ("Springfield", "MA")):
+        assert corrector.correct_row({"city": city, "state": state, "fields": ""})["state"] == state
+    assert corrector.correct_row({"city": "Springfield", "state": "M4", "fields": ""})["state"] == "MA"
@@ -0,0 +1,110 @@
+import csv
+import json
+import multiprocessing
+import os
+import shutil
+
+import pytest
+
+from benchmarks.corpus import build_corpus
+from src import ocr
+from src.core.image_processor import ImageProcessor
+from src.core.results import RegionResult
+from src.utils import cli, dedupe
+from src.utils.dedupe import SAMPLE_SIZE, group_duplicates
+
+PAGES = [text for _, _, text, _ in build_corpus()]
+
+
+@pytest.mark.quick
+def test_group_duplicates(tmp_path, monkeypatch):
+    head, tail = b"%PDF-1.4\n" + b"a" * SAMPLE_SIZE, b"b" * SAMPLE_SIZE + b"%%EOF\n"
+    contents = {"a.pdf": head + b"1" + tail, "b.pdf": head + b"2" + tail, "c.pdf": head + b"1" + tail,
+                "d.pdf": b"%PDF-1.4\n%%EOF\n"}
+    paths = {}
+    for name, content in contents.items():
+        paths[name] = os.path.join(tmp_path, name)
+        with open(paths[name], "wb") as f:
+            f.write(content)
+
+    hashed = []
+    file_sha256 = dedupe.file_sha256
+    monkeypatch.setattr(dedupe, "file_sha256", lambda path: hashed.append(path) or file_sha256(path))
+    groups = group_duplicates([paths["b.pdf"], paths["a.pdf"], paths["d.pdf"], paths["c.pdf"], paths["a.pdf"]])
+    # b differs from a and c only in the middle, so only the full hash tells them apart
+    assert groups == {paths["b.pdf"]: [], paths["a.pdf"]: [paths["c.pdf"]], paths["d.pdf"]: []}
+    assert sorted(hashed) == [paths["a.pdf"], paths["b.pdf"], paths["c.pdf"]]
+
+    # A file gone since it was listed is a group of its own, and fails where it's processed like any bad PDF
+    missing = os.path.join(tmp_path, "missing.pdf")
+    groups = group_duplicates([paths["a.pdf"], missing, paths["c.pdf"]])
+    assert groups == {paths["a.pdf"]: [paths["c.pdf"]], missing: []}
+
+
+@pytest.mark.quick
+@pytest.mark.skipif(multiprocessing.get_start_method() != "fork", reason="The workers must inherit the fake OCR")
+def test_copies_are_ocred_once(tmp_path, monkeypatch):
+    calls_path = os.path.join(tmp_path, "calls")
+
+    def fake_ocr_page(pdf_path, page_number, split, profile):
+        with open(calls_path, "a") as f:
+            f.write(f"{os.path.basename(pdf_path)} {page_number}\n")
+        offset = 0 if os.path.basename(pdf_path).startswith("1982") else 5
+        return [RegionResult(PAGES[(offset + page_number) % len(PAGES)], page=page_number)]
+
+    monkeypatch.setattr(ocr, "ocr_pdf_page", fake_ocr_page)
+    monkeypatch.setattr(ImageProcessor, "count_pages", staticmethod(lambda pdf_path: 5))
+    monkeypatch.setattr(cli, "set_tesseract_path", lambda: None)
+
+    inputs = os.path.join(tmp_path, "input")
+    os.makedirs(inputs)
+    for name, content in (("1982-a.pdf", b"%PDF-1.4\n1\n%%EOF\n"), ("1985-b.pdf", b"%PDF-1.4\n2\n%%EOF\n")):
+        with open(os.path.join(inputs, name), "wb") as f:
+            f.write(content)
+    shutil.copy(os.path.join(inputs, "1982-a.pdf"), os.path.join(inputs, "1982-copy.pdf"))
+
+    output_dir = os.path.join(tmp_path, "output")
+    summary_path = os.path.join(tmp_path, "summary.json")
+    assert cli.main([inputs, "-o", output_dir, "-w", "2", "--summary", summary_path]) == 0
+
+    with open(calls_path) as f:
+        calls = sorted(line.split()[0] for line in f)
+    assert calls == ["1982-a.pdf"] * 5 + ["1985-b.pdf"] * 5
+    with open(os.path.join(output_dir, "1982-a.csv"), "rb") as original, \
+            open(os.path.join(output_dir, "1982-copy.csv"), "rb") as copy:
+        assert copy.read() == original.read()
+    with open(summary_path) as f:
+        summary = json.load(f)
+    assert (summary["files"], summary["pages"], summary["duplicates"], summary["pages_skipped"]) == (3, 10, 1, 5)
+    copy_result, = [result for result in summary["results"] if result["input_path"].endswith("1982-copy.pdf")]
+    assert copy_result["duplicate_of"].endswith("1982-a.pdf")
+
+
+@pytest.mark.quick
+@pytest.mark.skipif(multiprocessing.get_start_method() != "fork", reason="The workers must inherit the fake OCR")
+def test_copies_get_their_own_year_and_merged_rows_count_once(tmp_path, monkeypatch):
+    monkeypatch.setattr(ocr, "ocr_pdf_page", lambda pdf_path, page_number, split, profile: [
+        RegionResult(PAGES[page_number % len(PAGES)], page=page_number)
+    ])
+    monkeypatch.setattr(ImageProcessor, "count_pages", staticmethod(lambda pdf_path: 3))
+    monkeypatch.setattr(cli, "set_tesseract_path", lambda: None)
+
+    inputs = os.path.join(tmp_path, "input")
+    os.makedirs(os.path.join(inputs, "other"))
+    for name in ("1985-a.pdf", "1985-copy.pdf", "other/1986-a.pdf"):
+        with open(os.path.join(inputs, name), "wb") as f:
+            f.write(b"%PDF-1.4\n1\n%%EOF\n")
+
+    output_dir = os.path.join(tmp_path, "output")
+    summary_path = os.path.join(tmp_path, "summary.json")
+    assert cli.main([inputs, "-o", output_dir, "--merge", "all.csv", "--summary", summary_path]) == 0
+
+    with open(os.path.join(output_dir, "all.csv"), newline="") as f:
+        years = [row["year"] for row in csv.DictReader(f)]
+    with open(summary_path) as f:
+        summary = json.load(f)
+    # The copy named for 1985 repeats the original's rows, so it adds none, the one named for 1986 is parsed as 1986
+    assert summary["rows"] == len(years)
+    assert set(years) == {"1985", "1986"} and years.count("1985") == years.count("1986")
+    rows = {os.path.basename(result["input_path"]): result["rows"] for result in summary["results"]}
+    assert rows["1985-copy.pdf"] == 0 and rows["1985-a.pdf"] == rows["1986-a.pdf"] > 0
@@ -0,0 +1,74 @@
+import os
+
+import pytest
+
+from benchmarks.corpus import build_corpus
+from src.core.results import RegionResult
+from src.utils.entry_store import EntryStore
+from src.utils.ocr_utils import iter_parsed
+
+
+@pytest.mark.quick
+def test_upsert_replaces_only_what_changed(tmp_path):
+    corpus = build_corpus()
+    with EntryStore(os.path.join(tmp_path, "entries.sqlite")) as store:
+        first = [store.upsert_text(name, page, year) for name, year, page, _ in corpus]
+        assert store.count() == sum(result.rows for result in first)
+        assert all(result.changed == result.rows for result in first)
+
+        rerun = [store.upsert_text(name, page, year) for name, year, page, _ in corpus]
+        assert [result.changed for result in rerun] == [0] * len(corpus)
+
+        entries = [
+            "A1 ONE LAB, 12 Main St, Boise, ID 83725.",
+            "A2 TWO LAB, 9 Elm St, Moscow, ID 83843.",
+            "A3 THREE LAB, 4 Oak St, Nampa, ID 83651.",
+        ]
+        store.upsert_text("1999-x.pdf", "1 HEADER\n" + "\n\n".join(entries), "1999")
+        # Edit the first entry and drop the last one
+        edited = ["A1 ONE LABS, 12 Main St, Boise, ID 83725.", entries[1]]
+        result = store.upsert_text("1999-x.pdf", "1 HEADER\n" + "\n\n".join(edited), "1999")
+        assert (result.rows, result.changed, result.deleted) == (2, 1, 1)
+        assert [row["title"] for row in store.find(year=1999)] == ["ONE LABS", "TWO LAB"]
+
+
+@pytest.mark.quick
+def test_find_uses_indexes_and_keeps_provenance(tmp_path):
+    regions = [
+        RegionResult("1 HEADER\nA1 ONE LAB, 12 Main St, Boise, ID 83725. Tel: 208-555-0100.", page=3),
+        RegionResult("A2 TWO LAB, 9 Elm St, Moscow, ID 83843. Tel: 208-555-0101.", page=4),
+    ]
+    with EntryStore(os.path.join(tmp_path, "entries.sqlite")) as store:
+        store.upsert("1985-x.pdf", iter_parsed(regions, "1985"))
+
+        rows = store.find(year=1985, state="ID")
+        assert [(row["source_file"], row["page"], row["entry"], row["title"]) for row in rows] == [
+            ("1985-x.pdf", 3, 0, "ONE LAB"),
+            ("1985-x.pdf", 4, 0, "TWO LAB"),
+        ]
+        assert [row["title"] for row in store.find(title_prefix="TWO")] == ["TWO LAB"]
+
+        plan = store.connection.execute("EXPLAIN QUERY PLAN SELECT * FROM entries WHERE state = 'ID' AND year = 1985")
+        assert "USING INDEX" in plan.fetchone()[3]
+
+
+@pytest.mark.quick
+def test_search_follows_upserts(tmp_path):
+    entries = [
+        "A1 ONE LAB, 12 Main St, Boise, ID 83725. Fields of R&D: Lasers and optics.",
+        "A2 TWO LAB, 9 Elm St, Moscow, ID 83843. Fields of R&D: Radar.",
+    ]
+    with EntryStore(os.path.join(tmp_path, "entries.sqlite")) as store:
+        store.upsert_text("1985-x.pdf", "1 HEADER\n" + "\n\n".join(entries), "1985")
+        store.upsert_text("1990-y.pdf", "1 HEADER\n" + entries[1], "1990")
+
+        [match] = store.search("laser")  # Stemmed, matches "Lasers"
+        assert (match["year"], match["source_file"], match["entry"], match["title"]) == (1985, "1985-x.pdf", 0, "ONE LAB")
+        assert "[Lasers]" in match["snippet"]
+        assert [row["year"] for row in store.search("fields: radar", year=1990)] == [1990]
+
+        # A re-run that changes an entry and drops another updates the index with it
+        store.upsert_text("1985-x.pdf", "1 HEADER\nA1 ONE LAB, 12 Main St, Boise, ID 83725. Fields of R&D: Sonar.", "1985")
+        assert store.search("laser") == []
+        assert [row["title"] for row in store.search("sonar")] == ["ONE LAB"]
+        assert [row["year"] for row in store.search("radar")] == [1990]
@@ -0,0 +1,92 @@
+import multiprocessing
+import os
+import json
+import signal
+
+import pytest
+
+from benchmarks.corpus import build_corpus
+from src import ocr
+from src.core.image_processor import ImageProcessor
+from src.core.results import RegionResult
+from src.utils import cli
+from src.utils.journal import JOURNAL_DIR, LOG_NAME, Journal
+
+PAGES = [text for _, _, text, _ in build_corpus()]
+NAMES = ["1982-a.pdf", "1985-b.pdf", "1985-c.pdf", "1989-d.pdf"]
+
+
+@pytest.mark.quick
+def test_torn_record_is_dropped(tmp_path):
+    journal = Journal(str(tmp_path))
+    journal.save_page("key", 1, [RegionResult("ACME LABS", page=1, bbox=(1, 2, 3, 4), confidence=91.5)])
+    journal.close()
+    with open(os.path.join(tmp_path, LOG_NAME), "ab") as f:
+        f.write(b'{"type": "page", "key": "key", "pa')
+
+    resumed = Journal(str(tmp_path))
+    resumed.save_page("key", 2, [])
+    resumed.close()
+    pages = Journal(str(tmp_path)).pages
+    assert pages == {("key", 1), ("key", 2)}
+    region = resumed.load_page("key", 1)[0]
+    assert (region.text, region.bbox, region.confidence) == ("ACME LABS", (1, 2, 3, 4), 91.5)
+
+
+@pytest.mark.quick
+@pytest.mark.skipif(multiprocessing.get_start_method() != "fork", reason="The workers must inherit the fake OCR")
+def test_resumed_batch_matches_uninterrupted_run(tmp_path, monkeypatch):
+    kill_marker = os.path.join(tmp_path, "kill")
+    calls_path = os.path.join(tmp_path, "calls")
+
+    def fake_ocr_page(pdf_path, page_number, split, profile):
+        name = os.path.basename(pdf_path)
+        if name == "1985-c.pdf" and page_number == 3 and os.path.exists(kill_marker):
+            os.kill(os.getpid(), signal.SIGKILL)
+        with open(calls_path, "a") as f:
+            f.write(f"{name} {page_number}\n")
+        text = PAGES[(NAMES.index(name) * 5 + page_number) % len(PAGES)]
+        return [RegionResult(text, page=page_number)]
+
+    monkeypatch.setattr(ocr, "ocr_pdf_page", fake_ocr_page)
+    monkeypatch.setattr(ImageProcessor, "count_pages", staticmethod(lambda pdf_path: 5))
+    monkeypatch.setattr(cli, "set_tesseract_path", lambda: None)
+
+    inputs = os.path.join(tmp_path, "input")
+    os.makedirs(inputs)
+    for name in NAMES:
+        with open(os.path.join(inputs, name), "wb") as f:
+            f.write(f"%PDF-1.4\n{name}\n%%EOF\n".encode())
+
+    def batch(output_dir, *options):
+        return cli.main([inputs, "-o", output_dir, "--merge", "all.csv", "-w", "2", "--page-workers", "1",
+                         "--summary", os.path.join(tmp_path, "summary.json"), *options])
+
+    def calls():
+        with open(calls_path) as f:
+            lines = f.readlines()
+        os.remove(calls_path)
+        return len(lines)
+
+    assert batch(os.path.join(tmp_path, "uninterrupted"), "--no-journal") == 0
+    assert calls() == 20
+
+    resumed = os.path.join(tmp_path, "resumed")
+    open(kill_marker, "w").close()
+    # The dead worker fails the files it was OCRing, the batch goes on and keeps the journal
+    assert batch(resumed) == 1
+    with open(os.path.join(tmp_path, "summary.json")) as f:
+        failed = [result["input_path"] for result in json.load(f)["results"] if result["error"]]
+    assert os.path.join(inputs, "1985-c.pdf") in failed and len(failed) < len(NAMES)
+    assert calls() < 20
+    journaled = len(Journal(os.path.join(resumed, JOURNAL_DIR), repair=False).pages)
+    assert journaled > 0
+
+    os.remove(kill_marker)
+    assert batch(resumed) == 0
+    # Only the pages the first run didn't journal are OCR'd again
+    assert calls() == 20 - journaled
+    assert not os.path.exists(os.path.join(resumed, JOURNAL_DIR))
+    with open(os.path.join(tmp_path, "uninterrupted", "all.csv"), "rb") as expected, \
+            open(os.path.join(resumed, "all.csv"), "rb") as actual:
+        assert actual.read() == expected.read()
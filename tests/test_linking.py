@@ -0,0 +1,41 @@
+import os
+
+import pytest
+
+from benchmarks.linking import build_editions
+from src.utils.linking import link_csv_files, link_rows
+from src.utils.ocr_utils import write_csv
+
+
+@pytest.mark.quick
+def test_links_labs_across_editions():
+    rows, truth = build_editions(editions=4, copies=3)
+    linked, stats = link_rows(rows)
+
+    assert stats.comparisons < stats.naive_comparisons / 50
+    lab_of = {}
+    for lab_id, lab in zip(linked["lab_id"], truth):
+        lab_of.setdefault(lab_id, set()).add(lab)
+    # Nothing from two different labs is merged, and every lab is found in one piece for the most part
+    assert all(len(labs) == 1 for labs in lab_of.values())
+    assert len(lab_of) <= len(set(truth)) * 1.1
+
+
+@pytest.mark.quick
+def test_lab_ids_are_stable(tmp_path):
+    rows, _ = build_editions(editions=4, copies=2)
+    first, _ = link_rows(rows)
+    again, _ = link_rows(rows)
+    assert list(first["lab_id"]) == list(again["lab_id"])
+
+    # Adding a later edition keeps the IDs the earlier ones got
+    later = [dict(row, year="1999") for row in rows if row["year"] == max(r["year"] for r in rows)]
+    extended, _ = link_rows(rows + later)
+    assert list(extended["lab_id"][: len(rows)]) == list(first["lab_id"])
+
+    paths = []
+    for year in sorted({row["year"] for row in rows}):
+        paths.append(os.path.join(tmp_path, f"{year}-page.csv"))
+        write_csv([row for row in rows if row["year"] == year], paths[-1])
+    stats = link_csv_files(paths, os.path.join(tmp_path, "linked.csv"))
+    assert stats.rows == len(rows)
@@ -0,0 +1,76 @@
+import json
+import multiprocessing
+import os
+import time
+
+import pytest
+
+from benchmarks.corpus import build_corpus
+from src import ocr
+from src.core.image_processor import ImageProcessor
+from src.core.results import RegionResult
+from src.utils import cli
+from src.utils.memory import LETTER_POINTS, MemoryGovernor, estimate_file_bytes, page_bytes
+
+PAGES = [text for _, _, text, _ in build_corpus()]
+
+
+@pytest.mark.quick
+def test_estimates_and_admission(tmp_path):
+    not_a_pdf = os.path.join(tmp_path, "broken.pdf")
+    with open(not_a_pdf, "wb") as f:
+        f.write(b"%PDF-1.4\n%%EOF\n")
+    # A PDF pdfinfo can't read is taken for letter pages, one per page worker
+    assert estimate_file_bytes(not_a_pdf, 300, 2) == 2 * page_bytes(*LETTER_POINTS, 300)
+    assert page_bytes(*LETTER_POINTS, 400) > page_bytes(*LETTER_POINTS, 200)
+
+    governor = MemoryGovernor(budget_bytes=1)
+    assert not governor.has_room(1) and not governor.has_room(1)
+    assert governor.pauses == 1  # Both checks were the same pause
+    roomy = MemoryGovernor(budget_bytes=1 << 50, min_available_bytes=0)
+    assert roomy.has_room(1024) and roomy.pauses == 0
+    assert roomy.peak >= roomy.baseline > 0
+
+
+@pytest.mark.quick
+@pytest.mark.skipif(multiprocessing.get_start_method() != "fork", reason="The workers must inherit the fake OCR")
+def test_files_wait_for_memory(tmp_path, monkeypatch):
+    calls_path = os.path.join(tmp_path, "calls")
+
+    def fake_ocr_page(pdf_path, page_number, split, profile):
+        start = time.time()
+        time.sleep(0.05)
+        with open(calls_path, "a") as f:
+            f.write(f"{os.path.basename(pdf_path)} {start} {time.time()}\n")
+        return [RegionResult(PAGES[page_number % len(PAGES)], page=page_number)]
+
+    monkeypatch.setattr(ocr, "ocr_pdf_page", fake_ocr_page)
+    monkeypatch.setattr(ImageProcessor, "count_pages", staticmethod(lambda pdf_path: 2))
+    monkeypatch.setattr(cli, "set_tesseract_path", lambda: None)
+
+    inputs = os.path.join(tmp_path, "input")
+    os.makedirs(inputs)
+    for name in ("1982-a.pdf", "1983-b.pdf", "1985-c.pdf"):
+        with open(os.path.join(inputs, name), "wb") as f:
+            f.write(f"%PDF-1.4\n{name}\n%%EOF\n".encode())
+
+    summary_path = os.path.join(tmp_path, "summary.json")
+    assert cli.main([inputs, "-o", os.path.join(tmp_path, "output"), "-w", "3", "--no-journal",
+                     "--memory-budget", "1", "--summary", summary_path]) == 0
+
+    # Nothing fits in 1 MB, so every file waited for the one before it to finish
+    spans = {}
+    with open(calls_path) as f:
+        for line in f:
+            name, start, end = line.split()
+            first, last = spans.get(name, (float("inf"), 0.0))
+            spans[name] = (min(first, float(start)), max(last, float(end)))
+    ordered = sorted(spans.values())
+    assert len(ordered) == 3
+    assert all(previous[1] <= following[0] for previous, following in zip(ordered, ordered[1:]))
+
+    with open(summary_path) as f:
+        summary = json.load(f)
+    peaks = [result["peak_rss_mb"] for result in summary["results"]]
+    assert all(peak > 0 for peak in peaks)
+    assert summary["peak_rss_mb"] == max(peaks)
@@ -0,0 +1,83 @@
+import multiprocessing
+import os
+import shutil
+
+import pytest
+from prometheus_client.parser import text_string_to_metric_families
+
+from benchmarks.corpus import build_corpus
+from src import ocr
+from src.core.image_processor import ImageProcessor
+from src.core.results import RegionResult
+from src.utils import cli, metrics
+from src.utils.tracing import span
+
+PAGES = [text for _, _, text, _ in build_corpus()]
+
+
+def read_samples(path):
+    with open(path) as f:
+        families = text_string_to_metric_families(f.read())
+        return {(sample.name, tuple(sorted(sample.labels.items()))): sample.value
+                for family in families for sample in family.samples}
+
+
+@pytest.fixture
+def metrics_dir(tmp_path):
+    yield metrics.enable(os.path.join(tmp_path, "metrics"))
+    metrics.disable()
+
+
+@pytest.mark.quick
+def test_spans_feed_the_metrics(tmp_path, metrics_dir):
+    with span("page", page=1) as page_span:
+        with span("tesseract", page=1, region=0):
+            pass
+        page_span.set(regions=4)
+    with pytest.raises(OSError), span("rasterize", page=2):
+        raise OSError("pdftoppm failed")
+    metrics.count_cache("journal", True, 2)
+    metrics.set_queue(3, 1, workers=2)
+
+    textfile = os.path.join(tmp_path, "ocr.prom")
+    metrics.write_textfile(textfile)
+    samples = read_samples(textfile)
+    assert samples[("ocr_pages_total", ())] == 1
+    assert samples[("ocr_regions_total", ())] == 4
+    assert samples[("ocr_tesseract_seconds_count", ())] == 1
+    assert samples[("ocr_stage_seconds_count", (("stage", "rasterize"),))] == 1
+    assert samples[("ocr_failures_total", (("stage", "rasterize"), ("type", "OSError")))] == 1
+    assert samples[("ocr_cache_requests_total", (("cache", "journal"), ("result", "hit")))] == 2
+    assert samples[("ocr_queue_depth", ())] == 3
+    assert samples[("ocr_workers", ())] == 2
+
+
+@pytest.mark.quick
+@pytest.mark.skipif(multiprocessing.get_start_method() != "fork", reason="The workers must inherit the fake OCR")
+def test_cli_writes_the_metrics_of_every_worker(tmp_path, monkeypatch):
+    def fake_ocr_page(pdf_path, page_number, split, profile):
+        return [RegionResult(PAGES[page_number % len(PAGES)], page=page_number)]
+
+    monkeypatch.setattr(ocr, "ocr_pdf_page", fake_ocr_page)
+    monkeypatch.setattr(ImageProcessor, "count_pages", staticmethod(lambda pdf_path: 3))
+    monkeypatch.setattr(cli, "set_tesseract_path", lambda: None)
+
+    inputs = os.path.join(tmp_path, "input")
+    os.makedirs(inputs)
+    for name, content in (("1982-a.pdf", b"%PDF-1.4\n1\n%%EOF\n"), ("1985-b.pdf", b"%PDF-1.4\n2\n%%EOF\n")):
+        with open(os.path.join(inputs, name), "wb") as f:
+            f.write(content)
+    shutil.copy(os.path.join(inputs, "1982-a.pdf"), os.path.join(inputs, "1982-copy.pdf"))
+
+    textfile = os.path.join(tmp_path, "ocr.prom")
+    assert cli.main([inputs, "-o", os.path.join(tmp_path, "output"), "-w", "2", "--no-journal",
+                     "--metrics-textfile", textfile]) == 0
+    assert not metrics.is_enabled() and metrics.METRICS_ENV not in os.environ
+
+    samples = read_samples(textfile)
+    assert samples[("ocr_files_total", (("status", "ok"),))] == 2
+    assert samples[("ocr_stage_seconds_count", (("stage", "file"),))] == 2
+    assert samples[("ocr_stage_seconds_count", (("stage", "write"),))] == 3  # The copy is written too
+    assert samples[("ocr_cache_requests_total", (("cache", "dedupe"), ("result", "hit")))] == 1
+    assert samples[("ocr_cache_requests_total", (("cache", "dedupe"), ("result", "miss")))] == 2
+    assert samples[("ocr_files_in_flight", ())] == 0
@@ -0,0 +1,32 @@
+import pandas as pd
+import pytest
+
+from src.utils.normalize import normalize_rows
+from src.utils.ocr_utils import make_dict
+
+
+def row(**fields):
+    entry = make_dict("1977")
+    entry.update(fields)
+    return entry
+
+
+@pytest.mark.quick
+def test_normalize_rows():
+    df = normalize_rows([
+        row(phone="(316) 685-9111", zip="67218", state="ks", staff="12", street="5800 E Pawnee,", fields="Aircraft.",
+            leftover="; ; . "),
+        row(phone="1-208-426-1000", zip="8372S-1234", state="Herts", doctorates="O", numTechsAndAuxs="1,200"),
+        row(phone="5551", zip="SW1", state="", staff="pic", leftover="x"),
+    ])
+
+    assert list(df["phone"]) == ["316-685-9111", "208-426-1000", "5551"]
+    assert list(df["zip"]) == ["67218", "83725-1234", "SW1"]
+    assert list(df["state"]) == ["KS", "", ""]
+    assert list(df["leftover"]) == ["", "Herts", "x"]
+    assert df["street"][0] == "5800 E Pawnee"
+    assert df["fields"][0] == "Aircraft"
+    assert str(df["staff"].dtype) == "Int64"
+    assert df["staff"][0] == 12 and pd.isna(df["staff"][2])
+    assert df["doctorates"][1] == 0
+    assert df["numTechsAndAuxs"][1] == 1200
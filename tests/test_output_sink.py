@@ -0,0 +1,63 @@
+import csv
+import os
+
+import pandas as pd
+import pytest
+
+from benchmarks.corpus import build_corpus
+from src.utils import output_sink
+from src.utils.ocr_utils import write_csv
+from src.utils.output_sink import OutputSink
+
+
+@pytest.mark.quick
+def test_failed_write_leaves_old_file(tmp_path):
+    path = os.path.join(tmp_path, "1985-page.csv")
+    write_csv([{"year": "1985", "title": "OLD"}], path)
+
+    def rows():
+        yield {"year": "1985", "title": "NEW"}
+        raise RuntimeError("OCR failed")
+
+    with pytest.raises(RuntimeError):
+        write_csv(rows(), path)
+    with open(path, newline="", encoding="utf-8") as f:
+        assert [row["title"] for row in csv.DictReader(f)] == ["OLD"]
+    assert os.listdir(tmp_path) == ["1985-page.csv"]
+
+
+@pytest.mark.quick
+def test_merged_output_matches_files(tmp_path):
+    files = [(f"{name}.csv", page) for name, _, page, _ in build_corpus()][:6]
+
+    per_file = OutputSink(os.path.join(tmp_path, "files")).export(files, max_workers=2)
+    merged = OutputSink(os.path.join(tmp_path, "merged"), merge_name="all.csv").export(files, max_workers=2)
+    assert all(result.ok for result in per_file + merged)
+    assert [result.rows for result in merged] == [result.rows for result in per_file]
+
+    expected = pd.concat([pd.read_csv(result.output_path, dtype=str) for result in per_file], ignore_index=True)
+    assert pd.read_csv(merged[0].output_path, dtype=str).equals(expected)
+
+    parquet = OutputSink(os.path.join(tmp_path, "merged"), merge_name="all.parquet").export(files, max_workers=2)
+    assert len(pd.read_parquet(parquet[0].output_path)) == len(expected)
+    assert sorted(os.listdir(os.path.join(tmp_path, "merged"))) == ["all.csv", "all.parquet"]
+
+
+@pytest.mark.quick
+def test_downloads_folder_is_resolved_once(monkeypatch):
+    calls = []
+
+    def check_output(command):
+        calls.append(command)
+        return b"/nonexistent"
+
+    monkeypatch.setattr(output_sink.platform, "system", lambda: "Linux")  # The platform that asks xdg-user-dir
+    monkeypatch.setattr(output_sink.subprocess, "check_output", check_output)
+    output_sink.downloads_folder.cache_clear()
+    sink = OutputSink()
+    paths = [sink.path_for(f"1985-page{i}.pdf") for i in range(5)] + [OutputSink().output_dir]
+    folders = {output_sink.downloads_folder(), output_sink.downloads_folder()}
+    output_sink.downloads_folder.cache_clear()
+
+    assert len(calls) == 1 and len(folders) == 1
+    assert paths[0].endswith("1985-page0.csv")
@@ -0,0 +1,69 @@
+import os
+
+import pytest
+
+from benchmarks.corpus import build_corpus
+from benchmarks.editions import accuracy, build_jobs
+from benchmarks.legacy_parser import legacy_parse_entry
+from src.utils.editions import DEFAULT_EDITION, get_edition
+from src.utils.ocr_utils import iter_rows, parse_entry, parse_file_to_csv, write_csv
+
+
+@pytest.mark.quick
+def test_parse_entry_matches_legacy():
+    for name, year, _, entries in build_corpus(copies=2):
+        for entry in entries:
+            expected = legacy_parse_entry(entry, year)
+            assert parse_entry(entry, year, edition=DEFAULT_EDITION) == expected, f"Parsed entry differs in {name}:\n{entry}"
+            if int(year) >= 1982:
+                assert parse_entry(entry, year) == expected, f"Parsed entry differs in {name}:\n{entry}"
+
+
+@pytest.mark.quick
+def test_edition_profiles_beat_default_on_their_layouts():
+    for year in ("1975", "1977", "1979"):
+        jobs = build_jobs(year, copies=1)
+        assert accuracy(get_edition(year), year, jobs) > accuracy(DEFAULT_EDITION, year, jobs), year
+
+
+@pytest.mark.quick
+def test_streamed_rows_match_whole_file(tmp_path):
+    for name, year, page, _ in build_corpus():
+        whole_path = os.path.join(tmp_path, "whole.csv")
+        streamed_path = os.path.join(tmp_path, "streamed.csv")
+
+        parse_file_to_csv(page, year, whole_path)
+        # Feed the page in small chunks, cutting through lines, blank lines and the header
+        write_csv(iter_rows((page[i:i + 7] for i in range(0, len(page), 7)), year), streamed_path)
+
+        with open(whole_path, encoding="utf-8") as whole, open(streamed_path, encoding="utf-8") as streamed:
+            assert whole.read() == streamed.read(), f"Streamed rows differ in {name}"
+
+
+@pytest.mark.quick
+def test_entries_shaped_like_the_scans():
+    # As Tesseract reads the PDFs: the 1975 address on one line, no period after the 1979 address before its tag
+    company = "A1 AAI CORPORATION\nP O Box 6767, Baltimore, MD 21204\n(301) 666-1400"
+    division = (
+        "A1.1 -Electronics Division (pf)\nP O Box 6767, Baltimore, MD 21204\n(301) 666-1400\n"
+        "Professional staff 119: engineering, 119; 198 technicians and auxiliaries.\n"
+        "Field of R&D: Applied research and development of training and simulation systems."
+    )
+    row, parent_code, parent_title = parse_entry(company, "1975")
+    assert (row["title"], row["street"], row["city"], row["state"], row["zip"]) == (
+        "AAI CORPORATION", "P O Box 6767", "Baltimore", "MD", "21204"
+    )
+    row, _, _ = parse_entry(division, "1975", parent_code, parent_title)
+    assert (row["code"], row["title"], row["tag"], row["street"], row["zip"], row["phone"], row["staff"]) == (
+        "A1.1", "AAI CORPORATION-Electronics Division", "pf", "P O Box 6767", "21204", "301-666-1400", "119"
+    )
+
+    row, _, _ = parse_entry(
+        "A33 ACRA ELECTRIC CORP, 3801 25th Ave, Schiller Park, IL 60176 (p)\n"
+        "Tel: (312) 678-8870. Professional Staff: 2; engineering 2; Technicians\n"
+        "& Auxiliaries 2. Field of R&D: Electrochemical development of inorganic, dielectric materials.",
+        "1979",
+    )
+    assert (row["title"], row["street"], row["city"], row["state"], row["zip"], row["phone"], row["tag"]) == (
+        "ACRA ELECTRIC CORP", "3801 25th Ave", "Schiller Park", "IL", "60176", "312-678-8870", "p"
+    )
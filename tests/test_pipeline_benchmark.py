@@ -0,0 +1,20 @@
+import pytest
+
+from benchmarks.pipeline import STAGES, compare
+
+
+def results(seconds, peak_rss_mb):
+    stages = {stage: {"seconds": seconds.get(stage, 1.0), "peak_rss_mb": peak_rss_mb.get(stage, 200.0)}
+              for stage in STAGES}
+    return {"wall_seconds": sum(stage["seconds"] for stage in stages.values()),
+            "peak_rss_mb": max(stage["peak_rss_mb"] for stage in stages.values()), "stages": stages}
+
+
+@pytest.mark.quick
+def test_compare_flags_regressions():
+    baseline = results({"parse": 0.002}, {})
+    candidate = results({"ocr": 1.3, "segment": 0.95, "parse": 0.004}, {"rasterize": 260.0, "write": 203.0})
+    regressed = {name for name, _, _, _, regressed in compare(baseline, candidate) if regressed}
+    # parse doubled and write grew 1.5%, but by less than the noise floors
+    assert regressed == {"ocr seconds", "rasterize peak MB", "total peak MB"}
+    assert not any(regressed for *_, regressed in compare(baseline, candidate, threshold=0.5))
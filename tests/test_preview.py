@@ -0,0 +1,69 @@
+import json
+import multiprocessing
+import os
+
+import pytest
+
+from benchmarks.corpus import build_corpus
+from src import ocr
+from src.core.image_processor import ImageProcessor
+from src.core.results import PreviewResult, RegionResult
+from src.ocr import sample_pages
+from src.utils import cli
+
+PAGES = [text for _, _, text, _ in build_corpus()]
+
+
+@pytest.mark.quick
+def test_sample_pages_and_estimate():
+    assert sample_pages(40, 3) == [1, 2, 3]
+    assert sample_pages(40, 3, spread=True) == [1, 21, 40]
+    assert sample_pages(9, 5, spread=True) == [1, 3, 5, 7, 9]
+    assert sample_pages(2, 5, spread=True) == [1, 2] and sample_pages(0, 3) == []
+
+    result = PreviewResult("a.pdf", [1, 21, 40], 40, [], [2.0, 3.0, 4.0], parallelism=4)
+    assert result.seconds_per_page == 3.0 and result.estimated_seconds == 30.0
+    assert result.to_dict()["estimated_seconds"] == 30.0
+
+
+@pytest.mark.quick
+@pytest.mark.skipif(multiprocessing.get_start_method() != "fork", reason="The workers must inherit the fake OCR")
+def test_preview_only_ocrs_the_sample(tmp_path, monkeypatch, capsys):
+    calls_path = os.path.join(tmp_path, "calls")
+
+    def fake_ocr_page(pdf_path, page_number, split, profile):
+        with open(calls_path, "a") as f:
+            f.write(f"{os.path.basename(pdf_path)} {page_number}\n")
+        return [RegionResult(PAGES[page_number % len(PAGES)], page=page_number)]
+
+    monkeypatch.setattr(ocr, "ocr_pdf_page", fake_ocr_page)
+    monkeypatch.setattr(ImageProcessor, "count_pages", staticmethod(lambda pdf_path: 30))
+    monkeypatch.setattr(cli, "set_tesseract_path", lambda: None)
+
+    inputs = os.path.join(tmp_path, "input")
+    os.makedirs(inputs)
+    for name in ("1982-a.pdf", "1985-b.pdf"):
+        with open(os.path.join(inputs, name), "wb") as f:
+            f.write(b"%PDF-1.4\n%%EOF\n")
+
+    output_dir = os.path.join(tmp_path, "output")
+    summary_path = os.path.join(tmp_path, "summary.json")
+    argv = [inputs, "-o", output_dir, "-w", "2", "--page-workers", "1", "--summary", summary_path]
+    assert cli.main(argv + ["--preview", "3", "--spread"]) == 0
+
+    with open(calls_path) as f:
+        assert sorted(f.read().split("\n")[:-1]) == [f"{name} {page}" for name in ("1982-a.pdf", "1985-b.pdf")
+                                                     for page in (1, 15, 30)]
+    assert not os.path.exists(output_dir)
+    printed = capsys.readouterr().out
+    assert f"# {os.path.join(inputs, '1982-a.pdf')}: pages 1, 15, 30 of 30" in printed
+    with open(summary_path) as f:
+        summary = json.load(f)
+    assert (summary["files"], summary["pages_sampled"], summary["pages"]) == (2, 6, 60)
+    assert summary["results"][0]["rows"] > 0 and summary["estimated_seconds"] >= 0
+    assert printed.count("\n") > summary["results"][0]["rows"] + summary["results"][1]["rows"]
+
+    # Without --summary the summary goes to stderr, so stdout only has the rows
+    assert cli.main(argv[:-2] + ["--preview", "1"]) == 0
+    captured = capsys.readouterr()
+    assert '"pages_sampled": 2' in captured.err and "pages_sampled" not in captured.out
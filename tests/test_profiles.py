@@ -0,0 +1,49 @@
+import copy
+import os
+
+import pytest
+
+from src.utils import profiles
+from src.utils.profiles import BLACKLIST, DEFAULT_PROFILE, PROFILES, WHITELIST, get_profile
+
+
+def uncached(name):
+    profile = copy.copy(PROFILES[name])
+    profile._tess_config = None  # Other tests may have built the shared profile's config already
+    return profile
+
+
+@pytest.mark.quick
+def test_get_profile():
+    assert get_profile() is PROFILES[DEFAULT_PROFILE]
+    assert get_profile("Fast") is PROFILES["fast"]
+    custom = copy.copy(PROFILES["accurate"])
+    assert get_profile(custom) is custom
+    with pytest.raises(ValueError, match="Unknown pipeline profile 'turbo'"):
+        get_profile("turbo")
+
+
+@pytest.mark.quick
+def test_tess_config_finds_tessdata_and_is_built_once(tmp_path, monkeypatch):
+    tessdata = os.path.join(tmp_path, "tessdata_best")
+    os.makedirs(tessdata)
+    open(os.path.join(tessdata, "eng.traineddata"), "w").close()
+    monkeypatch.setattr(profiles, "TESSDATA_DIRS", {"best": [os.path.join(tmp_path, "missing"), tessdata]})
+    for variable in ("TESSDATA_BEST_DIR", "TESSDATA_FAST_DIR"):
+        monkeypatch.delenv(variable, raising=False)
+
+    accurate = uncached("accurate")
+    config = accurate.tess_config()
+    assert config.startswith(f'--psm 6 --oem 1 --tessdata-dir "{tessdata}" ')
+    assert config.endswith(f"-c tessedit_char_whitelist={WHITELIST} -c tessedit_char_blacklist={BLACKLIST}")
+    # Cached, so moving the tessdata afterwards doesn't change the profile's config
+    monkeypatch.setattr(profiles, "TESSDATA_DIRS", {})
+    assert accurate.tess_config() is config
+
+    # The environment variable comes first, and a set that can't be found falls back to the default tessdata
+    monkeypatch.setenv("TESSDATA_BEST_DIR", tessdata)
+    assert uncached("accurate").tessdata_dir() == tessdata
+    monkeypatch.delenv("TESSDATA_BEST_DIR")
+    fast = uncached("fast")
+    assert fast.tessdata_dir() is None and "--tessdata-dir" not in fast.tess_config()
+    assert "--oem" not in uncached("balanced").tess_config()
@@ -0,0 +1,62 @@
+import json
+
+import numpy as np
+import pytest
+
+from benchmarks.corpus import build_corpus
+from src.core import image_processor
+from src.core.image_processor import ImageProcessor
+from src.core.results import RegionResult
+from src.utils.ocr_utils import iter_parsed, iter_rows
+
+TSV_HEADER = "level\tpage_num\tblock_num\tpar_num\tline_num\tword_num\tleft\ttop\twidth\theight\tconf\ttext"
+
+
+@pytest.mark.quick
+def test_region_round_trips_through_json():
+    region = RegionResult("A15 ABRAMS AERIAL", page=3, column=1, bbox=(410, 96, 380, 120), confidence=88.25)
+    restored = RegionResult.from_dict(json.loads(json.dumps(region.to_dict())))
+    assert restored.to_dict() == region.to_dict() and restored.bbox == (410, 96, 380, 120)
+    assert RegionResult.from_dict({"text": "A16"}).to_dict() == RegionResult("A16").to_dict()
+
+
+@pytest.mark.quick
+def test_ocr_region_reads_text_and_word_confidence(monkeypatch):
+    tsv_rows = [
+        "1\t1\t0\t0\t0\t0\t0\t0\t400\t120\t-1\t",  # Page, block and line rows have no word and no confidence
+        "5\t1\t1\t1\t1\t1\t10\t10\t90\t20\t91.5\tA15",
+        "5\t1\t1\t1\t1\t2\t110\t10\t150\t20\t80.5\tABRAMS",
+        "5\t1\t1\t1\t1\t3\t270\t10\t30\t20\t12.0\t ",
+    ]
+    outputs = {"txt": "A15 ABRAMS |nc\n", "tsv": "\n".join([TSV_HEADER, *tsv_rows]) + "\n"}
+
+    def run_tesseract(input_filename, output_filename_base, extension, lang, config=""):
+        assert extension == "txt tsv" and "tessedit_create_tsv=1" in config
+        for name, content in outputs.items():
+            with open(f"{output_filename_base}.{name}", "w", encoding="utf-8") as f:
+                f.write(content)
+
+    monkeypatch.setattr(image_processor.tesseract, "run_tesseract", run_tesseract)
+    processor = ImageProcessor(np.zeros((40, 40, 3), dtype=np.uint8))
+    assert processor.ocr_region(processor.image) == ("A15 ABRAMS 1nc\n", 86.0)
+
+    outputs["tsv"] = TSV_HEADER + "\n" + tsv_rows[0] + "\n"
+    assert processor.ocr_region(processor.image) == ("A15 ABRAMS 1nc\n", None)
+
+
+@pytest.mark.quick
+def test_entries_split_at_region_boundaries():
+    _, year, page, _ = next(corpus for corpus in build_corpus() if corpus[1] == "1988")
+    blocks = page.split("\n\n")
+    # One region per block, except an entry the column break cuts in two
+    lines = blocks[3].split("\n")
+    regions = (
+        [RegionResult(block, page=1) for block in blocks[:3]]
+        + [RegionResult("\n".join(lines[:2]), page=1), RegionResult("\n".join(lines[2:]), page=1, column=1)]
+        + [RegionResult(block, page=1, column=1) for block in blocks[4:]]
+    )
+
+    assert list(iter_rows(regions, year)) == list(iter_rows([page], year))
+    sources = [source for _, source in iter_parsed(regions, year)]
+    # A row comes from the region its entry starts in, never from the one continuing it
+    assert sources[3] is regions[3] and regions[4] not in sources
@@ -0,0 +1,143 @@
+import asyncio
+import io
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+import pytest
+
+from benchmarks.corpus import build_corpus
+from src.core.results import RegionResult
+from src.utils.ocr_utils import iter_rows
+from src.utils.server import JobService, Server, safe_filename
+
+PAGE_TEXT = build_corpus()[0][2]
+CLIENTS = {"a": "127.0.0.1", "b": "127.0.0.2"}  # Clients are told apart by their address
+
+
+def fake_ocr_page(pdf_path, page_number, split, profile):
+    time.sleep(0.01)
+    return [RegionResult(PAGE_TEXT, page=page_number)]
+
+
+def count_pages(pdf_path):
+    with open(pdf_path, "rb") as f:
+        return int(f.read().split()[1])  # The fake PDFs are "%PDF <pages>"
+
+
+async def request(port, method, path, body=b"", client="a", headers=None):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port, local_addr=(CLIENTS[client], 0))
+    headers = {"Content-Length": len(body), **(headers or {})}
+    writer.write(f"{method} {path} HTTP/1.1\r\n".encode()
+                 + "".join(f"{key}: {value}\r\n" for key, value in headers.items()).encode("latin-1")
+                 + b"\r\n" + body)
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    head, _, content = response.partition(b"\r\n\r\n")
+    return int(head.split()[1]), content
+
+
+async def request_head(port, method, path, body=b"", client="a"):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port, local_addr=(CLIENTS[client], 0))
+    writer.write(f"{method} {path} HTTP/1.1\r\nContent-Length: {len(body)}\r\n\r\n".encode() + body)
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    return response.partition(b"\r\n\r\n")[0].decode("latin-1").split("\r\n")
+
+
+async def wait_for(port, job_id, client="a"):
+    while True:
+        job = json.loads((await request(port, "GET", f"/jobs/{job_id}", client=client))[1])
+        if job["finished"] is not None:
+            return job
+        await asyncio.sleep(0.01)
+
+
+def run_service(tmp_path, scenario, **limits):
+    async def main():
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            service = JobService(str(tmp_path), executor, 2, count_pages=count_pages, ocr_page=fake_ocr_page, **limits)
+            server = await asyncio.start_server(Server(service).handle, "127.0.0.1", 0)
+            async with server:
+                try:
+                    return await scenario(service, server.sockets[0].getsockname()[1])
+                finally:
+                    await service.close()
+
+    return asyncio.run(main())
+
+
+@pytest.mark.quick
+def test_upload_progress_and_download(tmp_path):
+    async def scenario(service, port):
+        status, body = await request(port, "POST", "/jobs?name=1985-page.pdf", b"%PDF 3")
+        assert status == 202
+        job = await wait_for(port, json.loads(body)["id"])
+        assert (job["state"], job["pages"], job["pages_done"], job["progress"]) == ("done", 3, 3, 1.0)
+
+        status, csv = await request(port, "GET", f"/jobs/{job['id']}/result")
+        status_parquet, parquet = await request(port, "GET", f"/jobs/{job['id']}/result?format=parquet")
+        errors = [
+            (await request(port, "POST", "/jobs", b"not a pdf"))[0],
+            (await request(port, "GET", "/jobs/missing"))[0],
+            (await request(port, "GET", f"/jobs/{job['id']}/result?format=xlsx"))[0],
+        ]
+        listed = json.loads((await request(port, "GET", "/jobs", client="b"))[1])["jobs"]
+        return job, status, csv, status_parquet, parquet, errors, listed
+
+    job, status, csv, status_parquet, parquet, errors, listed = run_service(tmp_path, scenario)
+    expected = list(iter_rows([RegionResult(PAGE_TEXT, page=page) for page in (1, 2, 3)], "1985"))
+    frame = pd.read_csv(io.BytesIO(csv), dtype=str, keep_default_na=False)
+    assert status == 200 and job["rows"] == len(frame) == len(expected)
+    assert frame.to_dict("records") == [{key: row[key] for key in frame.columns} for row in expected]
+    assert status_parquet == 200 and len(pd.read_parquet(io.BytesIO(parquet))) == len(expected)
+    assert errors == [400, 404, 400]
+    assert listed == []  # Another client's jobs aren't listed
+
+
+@pytest.mark.quick
+def test_long_upload_does_not_starve_other_clients(tmp_path):
+    async def scenario(service, port):
+        long_jobs = [json.loads((await request(port, "POST", "/jobs", b"%PDF 30", client="a"))[1]) for _ in range(2)]
+        await asyncio.sleep(0.05)
+        states = [service.jobs[job["id"]].state for job in long_jobs]
+        refused = (await request(port, "POST", "/jobs", b"%PDF 1", client="a"))[0]
+        short_job = json.loads((await request(port, "POST", "/jobs", b"%PDF 2", client="b"))[1])
+        short_job = await wait_for(port, short_job["id"], client="b")
+        long_job = await wait_for(port, long_jobs[0]["id"])
+        return states, refused, short_job, long_job
+
+    states, refused, short_job, long_job = run_service(
+        tmp_path, scenario, max_running_per_client=1, max_queued_per_client=2,
+    )
+    # Client a runs one job at a time and can't queue a third, client b's short job finishes first
+    assert states == ["running", "queued"] and refused == 429
+    assert short_job["state"] == "done" and short_job["finished"] < long_job["finished"]
+
+
+@pytest.mark.quick
+def test_clients_only_reach_their_own_jobs_and_finished_jobs_expire(tmp_path):
+    async def scenario(service, port):
+        body = json.loads((await request(port, "POST", "/jobs?name=1985%0D%0ASet-Cookie:%20x=%22y.pdf", b"%PDF 1"))[1])
+        job = await wait_for(port, body["id"])
+        head = await request_head(port, "GET", f"/jobs/{job['id']}/result")
+        spoofed = [
+            (await request(port, "GET", f"/jobs/{job['id']}", client="b", headers={"X-Client-Id": "a"}))[0],
+            (await request(port, "GET", f"/jobs/{job['id']}/result", client="b"))[0],
+            json.loads((await request(port, "GET", "/jobs?all", client="b"))[1])["jobs"],
+        ]
+        bad_length = (await request(port, "POST", "/jobs", b"%PDF 1", headers={"Content-Length": "lots"}))[0]
+        service.prune(now=job["finished"] + service.job_ttl_seconds + 1)
+        expired = (await request(port, "GET", f"/jobs/{job['id']}"))[0]
+        return job, head, spoofed, bad_length, expired
+
+    job, head, spoofed, bad_length, expired = run_service(tmp_path, scenario, job_ttl_seconds=60)
+    assert job["name"] == "1985Set-Cookie: x=y.pdf"
+    assert not any(line.startswith("Set-Cookie") for line in head)
+    assert 'filename="1985Set-Cookie: x=y.csv"' in head[-1]
+    assert spoofed == [404, 404, []] and bad_length == 400
+    assert expired == 404 and not (tmp_path / job["id"]).exists()
+    assert safe_filename('../a\r\n"b\x00.pdf') == "ab.pdf"
@@ -0,0 +1,129 @@
+import multiprocessing
+import os
+import time
+
+import pandas as pd
+import pytest
+
+from benchmarks.corpus import build_corpus
+from src.core.image_processor import ImageProcessor
+from src.core.results import RegionResult
+from src.utils import task_queue
+from src.utils.ocr_utils import iter_rows
+from src.utils.task_queue import TaskQueue, work
+
+PAGES = [text for _, _, text, _ in build_corpus()]
+NAMES = ["1982-a.pdf", "1985-b.pdf", "1985-c.pdf", "1989-d.pdf"]
+
+
+def page_text(pdf_path, page_number):
+    return PAGES[(NAMES.index(os.path.basename(pdf_path)) * 5 + page_number) % len(PAGES)]
+
+
+@pytest.fixture
+def inputs(tmp_path, monkeypatch):
+    monkeypatch.setattr(ImageProcessor, "count_pages", staticmethod(lambda pdf_path: 5))
+    monkeypatch.setattr(task_queue, "set_tesseract_path", lambda: None)
+    paths = []
+    for name in NAMES:
+        paths.append(os.path.join(tmp_path, name))
+        with open(paths[-1], "wb") as f:
+            f.write(b"%PDF-1.4\n%%EOF\n")
+    return paths
+
+
+@pytest.mark.quick
+def test_expired_leases_go_to_other_workers(tmp_path, inputs):
+    with TaskQueue(os.path.join(tmp_path, "queue.sqlite"), lease_seconds=0.05, max_attempts=2) as queue:
+        assert queue.enqueue(inputs[:1]) == 1 and queue.enqueue(inputs[:1]) == 0
+        first = queue.claim("a", limit=2)
+        assert first == [(inputs[0], 1), (inputs[0], 2)]
+        queue.renew("a")
+        assert queue.claim("b") == [(inputs[0], 3)]
+
+        time.sleep(0.1)
+        assert queue.claim("b", limit=2) == first
+        # a's lease ran out, so its results are refused and b's are taken
+        assert not queue.complete("a", inputs[0], 1, [])
+        assert queue.complete("b", inputs[0], 1, [RegionResult("ACME", page=1)])
+        assert queue.file_regions(inputs[0])[0].text == "ACME"
+
+        queue.fail("b", inputs[0], 2, "RuntimeError: bad scan")
+        assert queue.status()["files"] == {"failed": 1}
+        # The rest of a PDF that failed isn't OCR'd
+        assert queue.claim("c") == [] and queue.finished()
+
+        queue.enqueue(inputs[1:2])
+        for _ in range(2):
+            assert queue.claim("c") == [(inputs[1], 1)]
+            time.sleep(0.1)
+        assert queue.claim("d") == []
+        error, = queue.connection.execute("SELECT error FROM files WHERE pdf_path = ?", (inputs[1],)).fetchone()
+        assert error == "Page 1: The lease ran out on every attempt"
+
+
+@pytest.mark.quick
+def test_unreadable_pdfs_fail_without_stopping_the_enqueue(tmp_path, inputs, monkeypatch):
+    def count_pages(pdf_path):
+        if pdf_path == inputs[1]:
+            raise RuntimeError("not a PDF")
+        return 5
+
+    monkeypatch.setattr(ImageProcessor, "count_pages", staticmethod(count_pages))
+    with TaskQueue(os.path.join(tmp_path, "queue.sqlite")) as queue:
+        assert queue.enqueue(inputs) == 3
+        assert queue.status() == {"tasks": {"queued": 15}, "files": {"queued": 3, "failed": 1}}
+        error, = queue.connection.execute("SELECT error FROM files WHERE pdf_path = ?", (inputs[1],)).fetchone()
+        assert error == "RuntimeError: not a PDF"
+        # It isn't counted again on the next run
+        assert queue.enqueue(inputs) == 0
+
+
+@pytest.mark.quick
+@pytest.mark.skipif(multiprocessing.get_start_method() != "fork", reason="The workers must inherit the fake OCR")
+def test_workers_split_the_queue(tmp_path, inputs, monkeypatch):
+    calls_path = os.path.join(tmp_path, "calls")
+    db_path = os.path.join(tmp_path, "queue.sqlite")
+    output_dir = os.path.join(tmp_path, "output")
+
+    def fake_ocr_page(pdf_path, page_number, split, profile):
+        time.sleep(0.01)
+        with open(calls_path, "a") as f:
+            f.write(f"{os.getpid()} {os.path.basename(pdf_path)} {page_number}\n")
+        return [RegionResult(page_text(pdf_path, page_number), page=page_number)]
+
+    monkeypatch.setattr(task_queue, "ocr_pdf_page", fake_ocr_page)
+    with TaskQueue(db_path) as queue:
+        queue.enqueue(inputs)
+
+    def crash():
+        with TaskQueue(db_path, lease_seconds=0.2) as queue:
+            queue.claim("crashed", limit=3)
+        os._exit(1)
+
+    context = multiprocessing.get_context("fork")
+    crasher = context.Process(target=crash)
+    crasher.start()
+    crasher.join()
+    workers = [context.Process(target=work, args=(db_path, output_dir), kwargs={"poll_seconds": 0.05})
+               for _ in range(3)]
+    for process in workers:
+        process.start()
+    for process in workers:
+        process.join()
+
+    with open(calls_path) as f:
+        calls = [line.split() for line in f]
+    # Every page is OCR'd once, the crashed worker's three included, and the work is shared
+    pages = sorted((name, int(page)) for _, name, page in calls)
+    assert pages == [(name, page) for name in NAMES for page in range(1, 6)]
+    assert len({pid for pid, _, _ in calls}) > 1
+    with TaskQueue(db_path) as queue:
+        assert queue.finished() and queue.status() == {"tasks": {"done": 20}, "files": {"written": 4}}
+
+    for pdf_path in inputs:
+        regions = [RegionResult(page_text(pdf_path, page), page=page) for page in range(1, 6)]
+        expected = list(iter_rows(regions, os.path.basename(pdf_path)[:4]))
+        name = os.path.basename(pdf_path).replace(".pdf", ".csv")
+        written = pd.read_csv(os.path.join(output_dir, name), dtype=str, keep_default_na=False)
+        assert written.to_dict("records") == [{key: row[key] for key in written.columns} for row in expected]
@@ -0,0 +1,70 @@
+import json
+import multiprocessing
+import os
+import threading
+
+import pytest
+
+from src.utils import tracing
+from src.utils.tracing import TRACE_ENV, export_chrome_trace, span, traced
+
+
+@pytest.fixture
+def trace_dir(tmp_path):
+    yield str(tmp_path)
+    tracing.disable()
+
+
+@traced("double")
+def double(x):
+    return x * 2
+
+
+@pytest.mark.quick
+def test_disabled_tracing_writes_nothing(trace_dir):
+    assert not tracing.is_enabled() and TRACE_ENV not in os.environ
+    first, second = span("rasterize", page=1), span("parse")
+    assert first is second  # One shared do-nothing span
+    with first as no_span:
+        no_span.set(rows=3)
+    assert double(2) == 4
+    assert os.listdir(trace_dir) == []
+
+
+def traced_child():
+    with span("page", file="b.pdf", page=2):
+        with span("tesseract", page=2, region=0):
+            pass
+
+
+@pytest.mark.quick
+@pytest.mark.skipif(multiprocessing.get_start_method() != "fork", reason="The child must inherit the tracer")
+def test_spans_of_every_process_are_merged(trace_dir):
+    tracing.enable(trace_dir, clear=True)
+    assert os.environ[TRACE_ENV] == trace_dir
+
+    with span("file", file="a.pdf") as file_span:
+        with pytest.raises(ValueError), span("rasterize", file="a.pdf", page=1):
+            raise ValueError("bad page")
+        thread = threading.Thread(target=double, args=(1,))
+        thread.start()
+        thread.join()
+        child = multiprocessing.get_context("fork").Process(target=traced_child)
+        child.start()
+        child.join()
+        file_span.set(rows=7)
+
+    with open(export_chrome_trace(trace_dir)) as f:
+        events = json.load(f)["traceEvents"]
+    names = {event["args"]["name"].split(" ")[0] for event in events if event["ph"] == "M"}
+    assert names == {"MainProcess", child.name}
+    spans = {event["name"]: event for event in events if event["ph"] == "X"}
+    assert set(spans) == {"file", "rasterize", "double", "page", "tesseract"}
+    assert spans["file"]["args"] == {"file": "a.pdf", "rows": 7}
+    assert spans["rasterize"]["args"]["error"] == "ValueError: bad page"
+    assert spans["page"]["pid"] == spans["tesseract"]["pid"] == child.pid != spans["file"]["pid"]
+    assert spans["double"]["tid"] != spans["file"]["tid"]
+    # Spans nest inside the spans open around them, even across processes
+    for inner, outer in (("rasterize", "file"), ("tesseract", "page"), ("page", "file")):
+        assert spans[outer]["ts"] <= spans[inner]["ts"]
+        assert spans[inner]["ts"] + spans[inner]["dur"] <= spans[outer]["ts"] + spans[outer]["dur"]
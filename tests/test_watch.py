@@ -0,0 +1,132 @@
+import os
+import threading
+
+import pytest
+
+from src.utils.cli import FileResult
+from src.utils import watch as watch_module
+from src.utils.watch import ProcessedRecord, Watcher, watch
+
+PDF = b"%PDF-1.4\n1 0 obj\n<<>>\nendobj\ntrailer\n<<>>\n%%EOF\n"
+
+
+def write(path, content):
+    with open(path, "wb") as f:
+        f.write(content)
+
+
+def list_files(inputs):
+    return sorted(os.path.join(inputs[0], name) for name in os.listdir(inputs[0]) if name.endswith(".pdf"))
+
+
+@pytest.mark.quick
+def test_files_are_picked_up_once_written(tmp_path):
+    inbox = os.path.join(tmp_path, "inbox")
+    os.makedirs(inbox)
+    record = ProcessedRecord(os.path.join(tmp_path, "record.sqlite"))
+    watcher = Watcher([inbox], list_files, record, settle_seconds=5)
+
+    partial = os.path.join(inbox, "1985-partial.pdf")
+    done = os.path.join(inbox, "1985-done.pdf")
+    write(partial, PDF[:20])
+    write(done, PDF)
+    assert watcher.poll(now=0) == []
+    assert watcher.poll(now=3) == []
+    # Only the file that ends like a PDF is ready once both stopped changing
+    ready = watcher.poll(now=6)
+    assert [path for path, _ in ready] == [done]
+    record.mark(done, ready[0][1], "hash")
+
+    write(partial, PDF + b"more")
+    watcher.poll(now=7)
+    assert watcher.poll(now=11) == []
+    write(partial, PDF)
+    stat = os.stat(partial)
+    os.utime(partial, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    assert watcher.poll(now=12) == []
+    assert [path for path, _ in watcher.poll(now=17)] == [partial]
+
+    record.close()
+    # A new watcher on the same record, as after a restart, doesn't pick the processed file up again
+    restarted = Watcher([inbox], list_files, ProcessedRecord(os.path.join(tmp_path, "record.sqlite")), 0)
+    restarted.poll(now=0)
+    assert [path for path, _ in restarted.poll(now=1)] == [partial]
+    restarted.record.close()
+
+
+@pytest.mark.quick
+def test_watch_skips_copies_and_reprocesses_changes(tmp_path):
+    inbox = os.path.join(tmp_path, "inbox")
+    output = os.path.join(tmp_path, "output")
+    os.makedirs(inbox)
+    write(os.path.join(inbox, "1985-a.pdf"), PDF)
+    write(os.path.join(inbox, "1985-copy.pdf"), PDF)
+    write(os.path.join(inbox, "1985-bad.pdf"), PDF + b"\n% bad\n%%EOF\n")
+    processed = []
+    stop = threading.Event()
+
+    def process(pdf_paths):
+        processed.append([os.path.basename(path) for path in pdf_paths])
+        for path in pdf_paths:
+            output_path = os.path.join(output, os.path.basename(path)[:-4] + ".csv")
+            if "bad" not in path:
+                write(output_path, b"year,title\n1985,ACME\n")
+            yield FileResult(path, output_path, rows=1, error="ValueError: bad" if "bad" in path else None)
+
+    def run(rounds):
+        polls = iter(range(rounds))
+        original_wait = stop.wait
+        stop.wait = lambda _: next(polls, None) is None and stop.set()
+        try:
+            return watch([inbox], list_files, output, process, interval=0, settle_seconds=0, stop=stop)
+        finally:
+            stop.wait = original_wait
+            stop.clear()
+
+    assert run(3) == 2
+    # Copies in a batch are left to process to OCR once, the failed file isn't tried again until it changes
+    assert processed == [["1985-a.pdf", "1985-bad.pdf", "1985-copy.pdf"]]
+
+    processed.clear()
+    write(os.path.join(inbox, "1985-a.pdf"), PDF + b"\n% edited\n%%EOF\n")
+    write(os.path.join(inbox, "1985-later.pdf"), PDF)
+    write(os.path.join(inbox, "1986-later.pdf"), PDF)
+    assert run(3) == 3
+    # After a restart only the changed file, the one that failed and the copy named for another year are processed.
+    # The later copy of the same year gets the output of the first one.
+    assert processed == [["1985-a.pdf", "1985-bad.pdf", "1986-later.pdf"]]
+    with open(os.path.join(output, "1985-later.csv"), "rb") as f:
+        assert f.read() == b"year,title\n1985,ACME\n"
+
+
+@pytest.mark.quick
+def test_watch_retries_unreadable_files_and_copies_of_failures(tmp_path, monkeypatch):
+    inbox = os.path.join(tmp_path, "inbox")
+    os.makedirs(inbox)
+    write(os.path.join(inbox, "1985-a.pdf"), PDF)
+    write(os.path.join(inbox, "1985-copy.pdf"), PDF)
+    write(os.path.join(inbox, "1985-moved.pdf"), PDF + b"\n% moved\n%%EOF\n")
+    processed = []
+    stop = threading.Event()
+
+    unreadable = {"1985-moved.pdf"}
+    file_sha256 = watch_module.file_sha256
+
+    def flaky_sha256(path):
+        if os.path.basename(path) in unreadable:
+            unreadable.clear()
+            raise FileNotFoundError(path)  # Renamed between the poll and the hash
+        return file_sha256(path)
+
+    monkeypatch.setattr(watch_module, "file_sha256", flaky_sha256)
+
+    def process(pdf_paths):
+        processed.append(sorted(os.path.basename(path) for path in pdf_paths))
+        for path in pdf_paths:
+            yield FileResult(path, rows=1, error="ValueError: bad" if path.endswith("1985-a.pdf") else None)
+
+    polls = iter(range(4))
+    monkeypatch.setattr(stop, "wait", lambda _: next(polls, None) is None and stop.set())
+    watch([inbox], list_files, os.path.join(tmp_path, "output"), process, interval=0, settle_seconds=0, stop=stop)
+    # The unreadable file is processed on the next poll
+    assert processed == [["1985-a.pdf", "1985-copy.pdf"], ["1985-moved.pdf"]]